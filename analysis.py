@@ -0,0 +1,88 @@
+"""Engine analysis in a background process, for the UI's "Analyse" mode.
+
+``AnalysisWorker`` owns one worker process with its own ``Engine``, which
+searches the position it was last given without a time limit. Every
+completed iteration is put on a queue that the UI drains from
+``root.after`` callbacks, so the Tk main loop never waits on the search and
+the worker can use a whole core. Each position gets a new search id; the
+engine polls the latest id in shared memory and drops its search as soon
+as it changes, and updates of superseded searches are discarded.
+"""
+import multiprocessing
+import queue
+
+from engine import Engine
+from moves import move_to_uci
+from parallel import deserialise_position, serialise_position
+
+
+def _analyse(requests, results, latest):
+    """Worker loop: search each requested position until it is superseded or solved."""
+    engine = Engine(tt_size_mb=64)  # Kept between positions, so moving on reuses the table
+    while True:
+        request = requests.get()
+        if request is None:
+            return
+        search_id, position = request
+        if search_id != latest.value:
+            continue  # Superseded before it started
+        board, move_generator = deserialise_position(position)
+        engine.stop_check = lambda: latest.value != search_id
+        engine.info_callback = lambda info: results.put({
+            'id': search_id,
+            'depth': info['depth'],
+            'score': info['score'],
+            'nodes': info['nodes'],
+            'nps': info['nps'],
+            'time': info['time'],
+            'pv': [move_to_uci(move) for move in info['pv']],
+        })
+        best_move = engine.search(board, move_generator)
+        if search_id == latest.value:
+            results.put({'id': search_id, 'bestmove': move_to_uci(best_move) if best_move else None})
+
+
+class AnalysisWorker:
+    def __init__(self):
+        # A fresh interpreter rather than a fork of the process running Tk
+        context = multiprocessing.get_context('spawn')
+        self.requests = context.Queue()
+        self.results = context.Queue()
+        self.latest = context.Value('q', 0)
+        self.search_id = 0
+        self.process = context.Process(target=_analyse, args=(self.requests, self.results, self.latest),
+                                       daemon=True)
+        self.process.start()
+
+    def analyse(self, board, move_generator):
+        """Drop the current search and start on this position."""
+        self.cancel()
+        self.requests.put((self.search_id, serialise_position(board, move_generator)))
+
+    def cancel(self):
+        """Stop the current search; its remaining updates will not be returned by poll."""
+        self.search_id += 1
+        self.latest.value = self.search_id
+
+    def poll(self):
+        """Updates of the current search that have arrived since the last call, without blocking.
+
+        Each is a dict with the iteration's depth, score (for the side to
+        move), nodes, nps, time and pv in UCI, or, once the search ends on
+        its own, its bestmove.
+        """
+        updates = []
+        while True:
+            try:
+                update = self.results.get_nowait()
+            except queue.Empty:
+                return updates
+            if update['id'] == self.search_id:
+                updates.append(update)
+
+    def close(self):
+        self.cancel()
+        self.requests.put(None)
+        self.process.join(timeout=1)
+        if self.process.is_alive():
+            self.process.terminate()
@@ -0,0 +1,145 @@
+"""Vectorised evaluation of many positions at once with NumPy.
+
+Positions are packed into an ``(N, 64)`` int8 array with the square order of
+``Board.board`` (row 0 is the 8th rank): 0 is empty, 1-6 are White's
+P, N, B, R, Q, K and -1 to -6 Black's. ``evaluate_batch`` returns the same
+centipawn scores as ``evaluation.evaluate`` for every row.
+
+Material and piece-square scores are a table lookup over the packed array.
+Mobility and king safety work on one 64-bit bitboard per piece type and
+position, using the same square numbering as ``bitboard.py``. Sliders are
+handled a direction at a time with an occluded (Kogge-Stone) fill of all
+pieces of a type together: in one direction the rays of two such pieces
+never overlap, so the population count of the union equals the sum of the
+per-piece counts the scalar evaluator takes.
+
+Requires NumPy 2.0 or later (``pip install numpy``).
+"""
+import numpy as np
+
+from evaluation import MOBILITY_WEIGHTS, PAWN_SHIELD_BONUS, SQUARE_SCORES
+
+PIECE_CODES = {'.': 0, 'P': 1, 'N': 2, 'B': 3, 'R': 4, 'Q': 5, 'K': 6,
+               'p': -1, 'n': -2, 'b': -3, 'r': -4, 'q': -5, 'k': -6}
+
+# Directions as (row step, column step)
+ORTHOGONAL = ((1, 0), (-1, 0), (0, 1), (0, -1))
+DIAGONAL = ((1, 1), (1, -1), (-1, 1), (-1, -1))
+KNIGHT_JUMPS = ((2, 1), (2, -1), (-2, 1), (-2, -1), (1, 2), (1, -2), (-1, 2), (-1, -2))
+SLIDER_DIRECTIONS = {'b': DIAGONAL, 'r': ORTHOGONAL, 'q': ORTHOGONAL + DIAGONAL}
+
+FULL = 0xFFFFFFFFFFFFFFFF
+COLUMN_0 = 0x0101010101010101
+
+
+def _column_mask(col_step):
+    """Squares a piece can land on after moving col_step columns without wrapping round the board."""
+    mask = FULL
+    for col in range(abs(col_step)):
+        mask &= ~((COLUMN_0 << col) if col_step > 0 else (COLUMN_0 << (7 - col))) & FULL
+    return np.uint64(mask)
+
+
+COLUMN_MASKS = {col_step: _column_mask(col_step) for col_step in range(-4, 5) if col_step}
+
+
+_BYTE_CODES = np.zeros(256, dtype=np.int8)
+for _piece, _code in PIECE_CODES.items():
+    _BYTE_CODES[ord(_piece)] = _code
+
+_SQUARE_TABLE = np.zeros(13 * 64, dtype=np.int32)  # Score of code + 6 on each square
+for _piece, _code in PIECE_CODES.items():
+    if _piece != '.':
+        _SQUARE_TABLE[(_code + 6) * 64:(_code + 7) * 64] = SQUARE_SCORES[_piece]
+_SQUARE_OFFSETS = np.arange(64, dtype=np.int32)
+
+
+def placement_from_fen(fen):
+    """Expand the piece placement field of a FEN into a 64-character string."""
+    placement = fen.split(' ', 1)[0].replace('/', '')
+    for digit in '12345678':
+        placement = placement.replace(digit, '.' * int(digit))
+    return placement
+
+
+def pack_fens(fens):
+    """Pack an iterable of FEN strings into an (N, 64) int8 array."""
+    data = ''.join(placement_from_fen(fen) for fen in fens).encode('ascii')
+    return _BYTE_CODES[np.frombuffer(data, dtype=np.uint8)].reshape(-1, 64)
+
+
+def pack_boards(boards):
+    """Pack Board (or BitBoard) objects into an (N, 64) int8 array."""
+    data = ''.join(board.get_piece(row, col) for board in boards
+                   for row in range(8) for col in range(8)).encode('ascii')
+    return _BYTE_CODES[np.frombuffer(data, dtype=np.uint8)].reshape(-1, 64)
+
+
+def to_bitboards(packed):
+    """Bitboards of every piece in every position: piece letter -> (N,) uint64 array."""
+    bitboards = {}
+    for piece, code in PIECE_CODES.items():
+        if piece != '.':
+            bits = np.packbits(packed == code, axis=1, bitorder='little')
+            bitboards[piece] = bits.view('<u8').ravel()
+    return bitboards
+
+
+def _shift(bits, row_step, col_step):
+    """Move every bit row_step rows and col_step columns, dropping those that leave the board."""
+    step = row_step * 8 + col_step
+    bits = bits << np.uint64(step) if step > 0 else bits >> np.uint64(-step)
+    return bits & COLUMN_MASKS[col_step] if col_step else bits
+
+
+def _slide(pieces, empty, row_step, col_step):
+    """Squares the pieces attack in one direction, up to and including the first blocker."""
+    if col_step:
+        empty = empty & COLUMN_MASKS[col_step]
+    pieces = pieces | empty & _shift(pieces, row_step, col_step)
+    empty = empty & _shift(empty, row_step, col_step)
+    pieces = pieces | empty & _shift(pieces, 2 * row_step, 2 * col_step)
+    empty = empty & _shift(empty, 2 * row_step, 2 * col_step)
+    pieces = pieces | empty & _shift(pieces, 4 * row_step, 4 * col_step)
+    return _shift(pieces, row_step, col_step)
+
+
+def _popcount(bits):
+    return np.bitwise_count(bits).astype(np.int64)
+
+
+def evaluate_batch(packed, white_to_move=None):
+    """Score every packed position in centipawns.
+
+    Scores are from White's point of view, or from the side to move's when a
+    boolean ``white_to_move`` array is given, matching ``evaluation.evaluate``.
+    """
+    packed = np.asarray(packed, dtype=np.int8).reshape(-1, 64)
+    scores = np.take(_SQUARE_TABLE, (packed.astype(np.int32) + 6) * 64 + _SQUARE_OFFSETS).sum(axis=1, dtype=np.int64)
+
+    bitboards = to_bitboards(packed)
+    white = bitboards['P'] | bitboards['N'] | bitboards['B'] | bitboards['R'] | bitboards['Q'] | bitboards['K']
+    black = bitboards['p'] | bitboards['n'] | bitboards['b'] | bitboards['r'] | bitboards['q'] | bitboards['k']
+    empty = ~(white | black)
+
+    for own, sign, case in ((white, 1, str.upper), (black, -1, str.lower)):
+        targets = ~own  # Empty or enemy-occupied
+        # Knight jumps are one-to-one, so each jump direction's count is a plain population count
+        knights = bitboards[case('n')]
+        moves = sum(_popcount(_shift(knights, row_step, col_step) & targets) for row_step, col_step in KNIGHT_JUMPS)
+        scores += sign * MOBILITY_WEIGHTS['n'] * moves
+        for kind, directions in SLIDER_DIRECTIONS.items():
+            pieces = bitboards[case(kind)]
+            moves = sum(_popcount(_slide(pieces, empty, row_step, col_step) & targets)
+                        for row_step, col_step in directions)
+            scores += sign * MOBILITY_WEIGHTS[kind] * moves
+
+    # King safety: own pawns on the three squares in front of each king
+    for king, pawns, row_step, sign in ((bitboards['K'], bitboards['P'], -1, 1),
+                                        (bitboards['k'], bitboards['p'], 1, -1)):
+        shield = _shift(king, row_step, -1) | _shift(king, row_step, 0) | _shift(king, row_step, 1)
+        scores += sign * PAWN_SHIELD_BONUS * _popcount(shield & pawns)
+
+    if white_to_move is not None:
+        scores = np.where(np.asarray(white_to_move, dtype=bool), scores, -scores)
+    return scores
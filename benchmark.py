@@ -0,0 +1,179 @@
+"""Benchmarks for the chess backends.
+
+Run ``python benchmark.py backends --depth 3`` to compare the list-of-lists
+``Board``/``MoveGenerator`` against the bitboard ``BitBoard``/``BitMoveGenerator``,
+``python benchmark.py engine --depth 4`` to time the search and
+``python benchmark.py parallel --workers 1 2 4 8`` for parallel speedup and
+``python benchmark.py eval --positions 10000`` to compare the NumPy batch
+evaluator with the scalar one.
+``python benchmark.py memory --games 1000`` reports bytes per live game for
+each backend and exits non-zero if one grew past its budget.
+"""
+import argparse
+import random
+import time
+import tracemalloc
+
+from engine import Engine, format_info
+from evaluation import evaluate_cells
+from parallel import ParallelSearch
+from perft import BACKENDS, POSITIONS, load_fen, perft, START_FEN
+
+ENGINE_POSITIONS = ('start', 'kiwipete', 'endgame-en-passant', 'middlegame')
+# Upper bound on bytes per live game: (fixed, per ply played); exceeding it fails the memory benchmark
+MEMORY_BUDGETS = {'list': (7000, 360), 'bitboard': (2000, 330), 'compact': (1200, 35)}
+
+
+def bench_backends(depth):
+    results = {}
+    for name in BACKENDS:
+        board, move_generator = load_fen(START_FEN, name)
+        start = time.perf_counter()
+        nodes = perft(board, move_generator, depth)
+        elapsed = time.perf_counter() - start
+        results[name] = nodes / elapsed
+        print(f"{name:>10}: {nodes} nodes in {elapsed:.2f}s ({nodes / elapsed:,.0f} nodes/s)")
+    print(f"{'speedup':>10}: {results['bitboard'] / results['list']:.1f}x")
+
+
+def bench_engine(depth, backend):
+    total_nodes = 0
+    total_time = 0.0
+    for name in ENGINE_POSITIONS:
+        board, move_generator = load_fen(POSITIONS[name][0], backend)
+        engine = Engine()
+        engine.search(board, move_generator, max_depth=depth)
+        info = engine.iterations[-1]
+        total_nodes += info['nodes']
+        total_time += info['time']
+        print(f"{name:<20} {format_info(info)}")
+    print(f"{'total':<20} {total_nodes} nodes in {total_time:.2f}s ({total_nodes / total_time:,.0f} nodes/s)")
+
+
+def bench_parallel(depth, worker_counts, backend):
+    """Time the parallel search against worker count; the serial Engine is the 1x reference."""
+    baseline = 0.0
+    nodes = 0
+    for name in ENGINE_POSITIONS:
+        board, move_generator = load_fen(POSITIONS[name][0], backend)
+        engine = Engine()
+        engine.search(board, move_generator, max_depth=depth)
+        baseline += engine.iterations[-1]['time']
+        nodes += engine.iterations[-1]['nodes']
+    print(f"{'serial':>11}: {baseline:7.2f}s  {nodes:>9} nodes  {nodes / baseline:>9,.0f} nodes/s  speedup 1.00x")
+    for workers in worker_counts:
+        elapsed = 0.0
+        nodes = 0
+        with ParallelSearch(workers, backend=backend) as search:
+            search.pool.submit(int).result()  # Start the pool before timing
+            for name in ENGINE_POSITIONS:
+                board, move_generator = load_fen(POSITIONS[name][0], backend)
+                search.search(board, move_generator, max_depth=depth)
+                elapsed += search.iterations[-1]['time']
+                nodes += search.iterations[-1]['nodes']
+        print(f"{workers:>3} workers: {elapsed:7.2f}s  {nodes:>9} nodes  "
+              f"{nodes / elapsed:>9,.0f} nodes/s  speedup {baseline / elapsed:.2f}x")
+
+
+def random_positions(count, seed=0, max_plies=80):
+    """Placements of positions reached by random playouts from the start position."""
+    rng = random.Random(seed)
+    positions = []
+    while len(positions) < count:
+        board, move_generator = load_fen(START_FEN)
+        for _ in range(rng.randrange(max_plies)):
+            moves = move_generator.generate_legal_moves(board.turn)
+            if not moves:
+                break
+            board.make_move(rng.choice(moves), move_generator)
+        positions.append([board.get_piece(row, col) for row in range(8) for col in range(8)])
+    return positions
+
+
+def bench_eval(count):
+    import numpy as np
+    from batch_eval import PIECE_CODES, evaluate_batch
+
+    positions = random_positions(count)
+    packed = np.array([[PIECE_CODES[piece] for piece in cells] for cells in positions], dtype=np.int8)
+
+    start = time.perf_counter()
+    expected = [evaluate_cells(cells) for cells in positions]
+    scalar_time = time.perf_counter() - start
+    start = time.perf_counter()
+    scores = evaluate_batch(packed)
+    batch_time = time.perf_counter() - start
+
+    mismatches = sum(1 for a, b in zip(expected, scores.tolist()) if a != b)
+    print(f"{'scalar':>10}: {count} positions in {scalar_time:.3f}s ({count / scalar_time:,.0f} positions/s)")
+    print(f"{'batch':>10}: {count} positions in {batch_time:.3f}s ({count / batch_time:,.0f} positions/s)")
+    print(f"{'speedup':>10}: {scalar_time / batch_time:.1f}x, {mismatches} mismatched scores")
+
+
+def bench_memory(games, plies):
+    """Bytes allocated per live game (board plus move generator) after ``plies`` random moves.
+
+    Returns whether every backend stayed within its ``MEMORY_BUDGETS`` entry.
+    """
+    passed = True
+    for name in BACKENDS:
+        rng = random.Random(0)
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        live = []
+        for _ in range(games):
+            board, move_generator = load_fen(START_FEN, name)
+            for _ in range(plies):
+                moves = move_generator.generate_legal_moves(board.turn)
+                if not moves:
+                    break
+                board.make_move(rng.choice(moves), move_generator)
+            live.append((board, move_generator))
+        used = tracemalloc.get_traced_memory()[0] - before
+        tracemalloc.stop()
+        fixed, per_ply = MEMORY_BUDGETS[name]
+        budget = fixed + per_ply * plies
+        status = 'ok' if used / games <= budget else f'FAIL (budget {budget:,})'
+        passed = passed and status == 'ok'
+        print(f"{name:>10}: {used / games:>9,.0f} bytes per game after {plies} plies  {status}")
+    return passed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    backends = subparsers.add_parser('backends', help="nodes per second of each board backend")
+    backends.add_argument('--depth', type=int, default=3)
+
+    engine = subparsers.add_parser('engine', help="fixed-depth search speed")
+    engine.add_argument('--depth', type=int, default=4)
+    engine.add_argument('--backend', choices=sorted(BACKENDS), default='list')
+
+    parallel = subparsers.add_parser('parallel', help="speedup of the parallel search against worker count")
+    parallel.add_argument('--depth', type=int, default=4)
+    parallel.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8, 16])
+    parallel.add_argument('--backend', choices=sorted(BACKENDS), default='list')
+
+    evaluation = subparsers.add_parser('eval', help="batch evaluation speed and agreement with the scalar one")
+    evaluation.add_argument('--positions', type=int, default=10000)
+
+    memory = subparsers.add_parser('memory', help="memory per live game for each backend")
+    memory.add_argument('--games', type=int, default=1000)
+    memory.add_argument('--plies', type=int, default=100)
+
+    args = parser.parse_args()
+    if args.command == 'backends':
+        bench_backends(args.depth)
+    elif args.command == 'engine':
+        bench_engine(args.depth, args.backend)
+    elif args.command == 'parallel':
+        bench_parallel(args.depth, args.workers, args.backend)
+    elif args.command == 'eval':
+        bench_eval(args.positions)
+    elif args.command == 'memory':
+        raise SystemExit(0 if bench_memory(args.games, args.plies) else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,795 @@
+"""Bitboard backend for the chess board and move generator.
+
+Squares are numbered ``row * 8 + col`` with row 0 being Black's back rank,
+so the same ``(row, col)`` coordinates and move tuples used by ``Board`` and
+``MoveGenerator`` work unchanged here.
+"""
+import profiling
+import zobrist
+from board import Board
+from evaluation import PIECE_VALUES
+from history import PositionHistory
+from move_generator import MoveGenerator
+
+FULL = (1 << 64) - 1
+FILE_A = sum(1 << (row * 8) for row in range(8))
+FILE_H = FILE_A << 7
+NOT_FILE_A = FULL ^ FILE_A
+NOT_FILE_H = FULL ^ FILE_H
+
+PIECES = 'PNBRQKpnbrqk'
+PIECE_INDEX = {piece: index for index, piece in enumerate(PIECES)}
+
+# Direction shifts: negative values move towards row 0 (White's forward direction)
+NORTH, SOUTH, EAST, WEST = -8, 8, 1, -1
+NORTH_EAST, NORTH_WEST, SOUTH_EAST, SOUTH_WEST = -7, -9, 9, 7
+ROOK_DIRECTIONS = (NORTH, SOUTH, EAST, WEST)
+BISHOP_DIRECTIONS = (NORTH_EAST, NORTH_WEST, SOUTH_EAST, SOUTH_WEST)
+
+
+def shift(bb, direction):
+    """Shift a bitboard one step in a direction, dropping bits that wrap around a file edge."""
+    if direction > 0:
+        bb = (bb << direction) & FULL
+    else:
+        bb >>= -direction
+    if direction in (EAST, NORTH_EAST, SOUTH_EAST):
+        bb &= NOT_FILE_A
+    elif direction in (WEST, NORTH_WEST, SOUTH_WEST):
+        bb &= NOT_FILE_H
+    return bb
+
+
+def iter_bits(bb):
+    """Yield the square index of every set bit."""
+    while bb:
+        lsb = bb & -bb
+        yield lsb.bit_length() - 1
+        bb ^= lsb
+
+
+def _build_step_attacks(steps):
+    table = []
+    for sq in range(64):
+        bit = 1 << sq
+        attacks = 0
+        for path in steps:
+            target = bit
+            for direction in path:
+                target = shift(target, direction)
+            attacks |= target
+        table.append(attacks)
+    return table
+
+
+def _build_rays():
+    rays = {}
+    for direction in ROOK_DIRECTIONS + BISHOP_DIRECTIONS:
+        table = []
+        for sq in range(64):
+            ray = 0
+            target = shift(1 << sq, direction)
+            while target:
+                ray |= target
+                target = shift(target, direction)
+            table.append(ray)
+        rays[direction] = table
+    return rays
+
+
+KNIGHT_ATTACKS = _build_step_attacks([
+    (NORTH, NORTH_EAST), (NORTH, NORTH_WEST), (SOUTH, SOUTH_EAST), (SOUTH, SOUTH_WEST),
+    (EAST, NORTH_EAST), (EAST, SOUTH_EAST), (WEST, NORTH_WEST), (WEST, SOUTH_WEST),
+])
+KING_ATTACKS = _build_step_attacks([(d,) for d in ROOK_DIRECTIONS + BISHOP_DIRECTIONS])
+WHITE_PAWN_ATTACKS = _build_step_attacks([(NORTH_EAST,), (NORTH_WEST,)])
+BLACK_PAWN_ATTACKS = _build_step_attacks([(SOUTH_EAST,), (SOUTH_WEST,)])
+RAYS = _build_rays()
+
+
+def nearest_square(blockers, direction):
+    """Square of the blocker closest to the ray's origin, for a non-empty set of blockers on one ray."""
+    if direction > 0:
+        return (blockers & -blockers).bit_length() - 1
+    return blockers.bit_length() - 1
+
+
+def sliding_attacks(sq, occupied, directions):
+    """Attacks of a slider on ``sq``, stopping at (and including) the first blocker on each ray."""
+    attacks = 0
+    for direction in directions:
+        ray = RAYS[direction][sq]
+        blockers = ray & occupied
+        if blockers:
+            ray ^= RAYS[direction][nearest_square(blockers, direction)]
+        attacks |= ray
+    return attacks
+
+
+class BitBoard:
+    def __init__(self):
+        # One bitboard per piece type and colour, indexed like PIECES
+        self.bitboards = [0] * 12
+        start = [
+            'rnbqkbnr',
+            'pppppppp',
+            '........',
+            '........',
+            '........',
+            '........',
+            'PPPPPPPP',
+            'RNBQKBNR',
+        ]
+        for row, line in enumerate(start):
+            for col, piece in enumerate(line):
+                if piece != '.':
+                    self.bitboards[PIECE_INDEX[piece]] |= 1 << (row * 8 + col)
+        self.update_occupancy()
+
+        self.white_king = (7, 4, 'K')
+        self.black_king = (0, 4, 'k')
+        self.white_king_has_moved = False
+        self.black_king_has_moved = False
+        self.white_rook1_has_moved = False
+        self.black_rook1_has_moved = False
+        self.white_rook2_has_moved = False
+        self.black_rook2_has_moved = False
+        self.ply_count = 0
+
+        self.turn = 'white'
+        self.en_passant = None  # Square behind a pawn that just moved two squares
+        self.debug_zobrist = zobrist.DEBUG
+        self.zobrist_key = zobrist.compute_key(self)
+        self.history = PositionHistory(self.zobrist_key)  # Key of every position, for repetitions
+        self.undo_stack = []  # One record of irreversible state per move, popped by undo_move
+        self.start_ply = 0  # Plies played before the position was set up, for the FEN move number
+
+    # FEN handling is shared with the list backend; only load_placement differs
+    from_fen = Board.__dict__['from_fen']
+    set_fen = Board.set_fen
+    to_fen = Board.to_fen
+
+    def load_placement(self, squares):
+        """Replace every piece from a 64-character string, '.' for empty, without updating the key."""
+        self.bitboards = [0] * 12
+        for sq, piece in enumerate(squares):
+            if piece != '.':
+                self.bitboards[PIECE_INDEX[piece]] |= 1 << sq
+        self.update_occupancy()
+        self.locate_kings(squares)
+
+    locate_kings = Board.locate_kings
+
+    @property
+    def board(self):
+        """List-of-lists view of the position, matching ``Board.board``."""
+        return [[self.get_piece(row, col) for col in range(8)] for row in range(8)]
+
+    def update_occupancy(self):
+        """Recompute the colour and total occupancy masks from the piece bitboards."""
+        bbs = self.bitboards
+        self.white = bbs[0] | bbs[1] | bbs[2] | bbs[3] | bbs[4] | bbs[5]
+        self.black = bbs[6] | bbs[7] | bbs[8] | bbs[9] | bbs[10] | bbs[11]
+        self.occupied = self.white | self.black
+
+    def print_board(self):
+        """Print the board for debugging purposes."""
+        for row in self.board:
+            print(' '.join(row))
+
+    def pieces(self, colour):
+        """(square, piece) of every piece of one colour, like ``Board.pieces``."""
+        first = 0 if colour == 'white' else 6
+        return [(sq, PIECES[index]) for index in range(first, first + 6) for sq in iter_bits(self.bitboards[index])]
+
+    @property
+    def material(self):
+        """Piece values without the king per colour, in centipawns, like ``Board.material``."""
+        bbs = self.bitboards
+        return {colour: sum(PIECE_VALUES[PIECES[index].lower()] * bin(bbs[index]).count('1')
+                            for index in range(first, first + 5))
+                for colour, first in (('white', 0), ('black', 6))}
+
+    def piece_at(self, sq):
+        """Return the piece on a square index, or '.' if it is empty."""
+        bit = 1 << sq
+        if self.white & bit:
+            offset = 0
+        elif self.black & bit:
+            offset = 6
+        else:
+            return '.'
+        bbs = self.bitboards
+        for index in range(offset, offset + 6):
+            if bbs[index] & bit:
+                return PIECES[index]
+        return '.'
+
+    def get_piece(self, row, col):
+        """Return the piece at a specific board position."""
+        return self.piece_at(row * 8 + col)
+
+    def set_piece(self, row, col, piece):
+        """Set a piece at a specific board position."""
+        sq = row * 8 + col
+        old_piece = self.piece_at(sq)
+        if old_piece != '.':
+            self.zobrist_key ^= zobrist.PIECE_KEYS[old_piece][sq]
+            self.bitboards[PIECE_INDEX[old_piece]] ^= 1 << sq
+        if piece != '.':
+            self.zobrist_key ^= zobrist.PIECE_KEYS[piece][sq]
+            self.bitboards[PIECE_INDEX[piece]] |= 1 << sq
+        self.update_occupancy()
+
+    # The castling flags are the same attributes on both backends
+    get_castling_flags = Board.get_castling_flags
+    set_castling_flags = Board.set_castling_flags
+
+    def verify_zobrist(self):
+        """Debug check that the incremental key matches a full recompute."""
+        expected = zobrist.compute_key(self)
+        if self.zobrist_key != expected:
+            raise RuntimeError(f"Zobrist key mismatch: {self.zobrist_key:#018x} != {expected:#018x}")
+
+    def move_bit(self, piece, from_sq, to_sq):
+        index = PIECE_INDEX[piece]
+        self.bitboards[index] ^= (1 << from_sq) | (1 << to_sq)
+        return zobrist.PIECE_KEYS[piece][from_sq] ^ zobrist.PIECE_KEYS[piece][to_sq]
+
+    def is_valid_move(self, move):
+        """Check if the move is within board bounds."""
+        from_row, from_col, to_row, to_col, *e = move
+        return 0 <= from_row < 8 and 0 <= from_col < 8 and 0 <= to_row < 8 and 0 <= to_col < 8
+
+    def make_move(self, move, move_generator):
+        """Make a move on the board."""
+        if not self.is_valid_move(move):
+            raise ValueError("Invalid move")
+
+        from_row, from_col, to_row, to_col, *e = move
+        from_sq = from_row * 8 + from_col
+        to_sq = to_row * 8 + to_col
+        piece = self.piece_at(from_sq)
+        captured_piece = self.piece_at(to_sq)
+        bbs = self.bitboards
+        piece_keys = zobrist.PIECE_KEYS
+
+        # Everything undo_move cannot work out from the board afterwards
+        self.undo_stack.append((
+            move, captured_piece, self.get_castling_flags(), self.ply_count, self.zobrist_key,
+            self.en_passant, move_generator, move_generator.en_pass_to_square,
+            move_generator.en_pass_from_squares, move_generator.en_pass_possible,
+        ))
+        move_generator.clear_en_pass()
+
+        key = self.zobrist_key
+        rights = zobrist.castling_rights(self)
+        if self.en_passant is not None:
+            key ^= zobrist.EN_PASSANT_KEYS[self.en_passant[1]]
+            self.en_passant = None
+
+        if captured_piece != '.':
+            bbs[PIECE_INDEX[captured_piece]] ^= 1 << to_sq
+            key ^= piece_keys[captured_piece][to_sq]
+        key ^= self.move_bit(piece, from_sq, to_sq)
+
+        # Handle pawn promotion and en passant
+        if piece == 'P' or piece == 'p':
+            if len(move) == 5:
+                bbs[PIECE_INDEX[piece]] ^= 1 << to_sq
+                bbs[PIECE_INDEX[move[4]]] |= 1 << to_sq
+                key ^= piece_keys[piece][to_sq] ^ piece_keys[move[4]][to_sq]
+
+            # en passant has happened
+            if from_col != to_col and captured_piece == '.':
+                enemy_pawn = 'p' if piece == 'P' else 'P'
+                bbs[PIECE_INDEX[enemy_pawn]] &= FULL ^ (1 << (from_row * 8 + to_col))
+                key ^= piece_keys[enemy_pawn][from_row * 8 + to_col]
+
+            # Eligible for en passant
+            if abs(from_row - to_row) == 2:
+                move_generator.generate_en_pass_moves(to_row, to_col, piece)
+                self.en_passant = ((from_row + to_row) // 2, to_col)
+                key ^= zobrist.EN_PASSANT_KEYS[to_col]
+
+        # Half-move clock for the 50 move rule: reset by pawn moves and captures
+        if piece == 'P' or piece == 'p' or captured_piece != '.':
+            self.ply_count = 0
+        else:
+            self.ply_count += 1
+
+        # Handle castling
+        if (piece == 'K' or piece == 'k') and abs(to_col - from_col) == 2:
+            rook = 'R' if piece == 'K' else 'r'
+            if to_col == 6:
+                key ^= self.move_bit(rook, from_row * 8 + 7, from_row * 8 + 5)
+                if from_row == 0:
+                    self.black_rook2_has_moved = True
+                else:
+                    self.white_rook2_has_moved = True
+            else:
+                key ^= self.move_bit(rook, from_row * 8, from_row * 8 + 3)
+                if from_row == 0:
+                    self.black_rook1_has_moved = True
+                else:
+                    self.white_rook1_has_moved = True
+
+        # Update king positions
+        if piece == 'k':
+            self.black_king = (to_row, to_col, 'k')
+            self.black_king_has_moved = True
+        elif piece == 'K':
+            self.white_king = (to_row, to_col, 'K')
+            self.white_king_has_moved = True
+
+        if piece == 'R' or piece == 'r':
+            if from_sq == 56:
+                self.white_rook1_has_moved = True
+            elif from_sq == 63:
+                self.white_rook2_has_moved = True
+            elif from_sq == 0:
+                self.black_rook1_has_moved = True
+            elif from_sq == 7:
+                self.black_rook2_has_moved = True
+
+        # A rook captured on its starting square can no longer castle either
+        if captured_piece == 'R' or captured_piece == 'r':
+            if to_sq == 56:
+                self.white_rook1_has_moved = True
+            elif to_sq == 63:
+                self.white_rook2_has_moved = True
+            elif to_sq == 0:
+                self.black_rook1_has_moved = True
+            elif to_sq == 7:
+                self.black_rook2_has_moved = True
+
+        self.update_occupancy()
+        key ^= zobrist.CASTLING_KEYS[rights] ^ zobrist.CASTLING_KEYS[zobrist.castling_rights(self)]
+        self.zobrist_key = key ^ zobrist.SIDE_KEY
+        self.turn = 'black' if self.turn == 'white' else 'white'
+        if self.debug_zobrist:
+            self.verify_zobrist()
+        self.history.push(self.zobrist_key, self.ply_count == 0)
+        return captured_piece
+
+    def undo_move(self):
+        """Take back the last move made with make_move."""
+        (move, captured_piece, flags, self.ply_count, key, self.en_passant, move_generator,
+         move_generator.en_pass_to_square, move_generator.en_pass_from_squares,
+         move_generator.en_pass_possible) = self.undo_stack.pop()
+        self.history.pop()
+
+        from_row, from_col, to_row, to_col, *e = move
+        from_sq = from_row * 8 + from_col
+        to_sq = to_row * 8 + to_col
+        bbs = self.bitboards
+        moved = self.piece_at(to_sq)
+        piece = moved
+        if len(move) == 5:
+            piece = 'p' if moved.islower() else 'P'
+
+        bbs[PIECE_INDEX[moved]] ^= 1 << to_sq
+        bbs[PIECE_INDEX[piece]] |= 1 << from_sq
+        if captured_piece != '.':
+            bbs[PIECE_INDEX[captured_piece]] |= 1 << to_sq
+        elif (piece == 'P' or piece == 'p') and from_col != to_col:
+            # Put back the pawn taken en passant
+            bbs[PIECE_INDEX['p' if piece == 'P' else 'P']] |= 1 << (from_row * 8 + to_col)
+
+        # Update king positions
+        if piece == 'k':
+            self.black_king = (from_row, from_col, 'k')
+        elif piece == 'K':
+            self.white_king = (from_row, from_col, 'K')
+
+        if (piece == 'K' or piece == 'k') and abs(to_col - from_col) == 2:
+            rook = 'R' if piece == 'K' else 'r'
+            if to_col == 6:
+                self.move_bit(rook, from_row * 8 + 5, from_row * 8 + 7)
+            else:
+                self.move_bit(rook, from_row * 8 + 3, from_row * 8)
+
+        self.update_occupancy()
+        self.set_castling_flags(flags)
+        self.zobrist_key = key
+        self.turn = 'black' if self.turn == 'white' else 'white'
+        if self.debug_zobrist:
+            self.verify_zobrist()
+
+    def check_game_state(self, ct, move_generator, move_cache=None):
+        has_moves = move_cache.has_moves(self, move_generator) if move_cache is not None else move_generator.moves_present(ct)
+        if not has_moves:
+            if move_generator.is_check(ct):
+                winner = 'White' if ct == 'black' else 'Black'
+                return f"{winner} won by Checkmate!"
+            else:
+                return "Draw by Stalemate"
+
+        if self.has_insufficient_material():
+            return "Draw by Insufficient Material!"
+
+        if self.is_tablebase_draw():
+            return "Draw by tablebase!"
+
+        if self.is_50_move_rule():
+            return "Draw by 50 move rule!"
+
+        if self.is_threefold_repetition():
+            return "Draw by threefold repetition!"
+
+    is_tablebase_draw = Board.is_tablebase_draw
+
+    def has_insufficient_material(self):
+        bbs = self.bitboards
+        pawns_and_majors = bbs[0] | bbs[3] | bbs[4] | bbs[6] | bbs[9] | bbs[10]
+        if pawns_and_majors:
+            return False
+        minors = bbs[1] | bbs[2] | bbs[7] | bbs[8]
+        return bin(minors).count('1') <= 1
+
+    def is_50_move_rule(self):
+        return self.ply_count >= 100
+
+    def get_board_state(self):
+        # The Zobrist key already covers pieces, castling rights, en passant and side to move
+        return self.zobrist_key
+
+    is_threefold_repetition = Board.is_threefold_repetition
+
+
+class BitMoveGenerator:
+    __slots__ = ('board', 'en_pass_to_square', 'en_pass_from_squares', 'en_pass_possible')
+
+    def __init__(self, board):
+        self.board = board
+
+        self.en_pass_to_square = ()
+        self.en_pass_from_squares = []
+        self.en_pass_possible = False
+        self.sync_en_passant()
+
+    sync_en_passant = MoveGenerator.sync_en_passant
+
+    def moves_present(self, ct):
+        context = self.compute_legal_context(ct)
+        bbs = self.board.bitboards
+        offset = 6 if ct == 'black' else 0
+        for index in range(offset, offset + 6):
+            piece = PIECES[index]
+            for sq in iter_bits(bbs[index]):
+                if self.legal_piece_moves(sq, piece, context):
+                    return True
+        return False
+
+    def generate_legal_moves(self, ct):
+        """Generate every legal move of one side.
+
+        Knight, slider and pawn targets are whole bitboards cut down by the
+        check and pin masks, and pawns are moved all at once by shifting
+        their bitboard; only king moves and en passant need an attack test
+        per move. Squares stay integers until the move tuples are built.
+        """
+        context = self.compute_legal_context(ct)
+        king_sq, check_mask, pins, _ = context
+        board = self.board
+        bbs = board.bitboards
+        white = ct == 'white'
+        offset = 0 if white else 6
+        moves = [move for move in self.generate_king_moves(king_sq >> 3, king_sq & 7, PIECES[offset + 5])
+                 if self.leaves_king_safe(move, ct)]
+        if not check_mask:
+            return moves  # Double check: only the king can move
+
+        occupied = board.occupied
+        allowed = check_mask & ~(board.white if white else board.black)
+        for index in range(offset + 1, offset + 5):
+            kind = index - offset
+            for sq in iter_bits(bbs[index]):
+                if kind == 1:
+                    targets = KNIGHT_ATTACKS[sq]
+                elif kind == 2:
+                    targets = sliding_attacks(sq, occupied, BISHOP_DIRECTIONS)
+                elif kind == 3:
+                    targets = sliding_attacks(sq, occupied, ROOK_DIRECTIONS)
+                else:
+                    targets = sliding_attacks(sq, occupied, ROOK_DIRECTIONS + BISHOP_DIRECTIONS)
+                targets &= allowed
+                if pins and sq in pins:
+                    targets &= pins[sq]
+                row, col = sq >> 3, sq & 7
+                while targets:
+                    lsb = targets & -targets
+                    to = lsb.bit_length() - 1
+                    moves.append((row, col, to >> 3, to & 7))
+                    targets ^= lsb
+
+        # Pawns: (targets, origin minus target) for pushes, double pushes and both captures
+        pawns = bbs[offset]
+        empty = FULL ^ occupied
+        if white:
+            enemy = board.black
+            single = (pawns >> 8) & empty
+            pawn_targets = (
+                (single, 8), (((single & (0xFF << 40)) >> 8) & empty, 16),
+                (((pawns & NOT_FILE_A) >> 9) & enemy, 9), (((pawns & NOT_FILE_H) >> 7) & enemy, 7),
+            )
+            promotion_row, promotions = 0, 'QRBN'
+        else:
+            enemy = board.white
+            single = (pawns << 8) & empty
+            pawn_targets = (
+                (single, -8), (((single & (0xFF << 16)) << 8) & empty, -16),
+                (((pawns & NOT_FILE_A) << 7) & enemy, -7), (((pawns & NOT_FILE_H) << 9) & enemy & FULL, -9),
+            )
+            promotion_row, promotions = 7, 'qrbn'
+        for targets, delta in pawn_targets:
+            targets &= check_mask
+            while targets:
+                lsb = targets & -targets
+                targets ^= lsb
+                to = lsb.bit_length() - 1
+                from_sq = to + delta
+                if pins and from_sq in pins and not pins[from_sq] & lsb:
+                    continue
+                if to >> 3 == promotion_row:
+                    for promoted in promotions:
+                        moves.append((from_sq >> 3, from_sq & 7, to >> 3, to & 7, promoted))
+                else:
+                    moves.append((from_sq >> 3, from_sq & 7, to >> 3, to & 7))
+
+        if self.en_pass_possible:
+            to_row, to_col = self.en_pass_to_square
+            for row, col in self.en_pass_from_squares:
+                if pawns >> (row * 8 + col) & 1:
+                    move = (row, col, to_row, to_col)
+                    if self.leaves_king_safe(move, ct):
+                        moves.append(move)
+        return moves
+
+    def legal_piece_moves(self, sq, piece, context):
+        """Legal moves of the piece on ``sq``.
+
+        Knights and sliders only generate targets inside the check and pin
+        masks; pawn and king moves are checked one by one.
+        """
+        if piece == 'P' or piece == 'p' or piece == 'K' or piece == 'k':
+            return [move for move in self.generate_piece_moves(sq >> 3, sq & 7, piece) if self.is_legal(move, context)]
+        mask = context[1]
+        if not mask:
+            return []  # Double check: only the king can move
+        return self.generate_piece_moves(sq >> 3, sq & 7, piece, mask & context[2].get(sq, FULL))
+
+    def generate_piece_moves(self, row, col, piece, mask=FULL):
+        """Generate moves for a specific piece; knight and slider targets are limited to ``mask``."""
+        sq = row * 8 + col
+        kind = piece.lower()
+        if kind == 'p':
+            return self.generate_pawn_moves(row, col, piece)
+        if kind == 'k':
+            return self.generate_king_moves(row, col, piece)
+        board = self.board
+        own = board.black if piece.islower() else board.white
+        if kind == 'n':
+            targets = KNIGHT_ATTACKS[sq]
+        elif kind == 'b':
+            targets = sliding_attacks(sq, board.occupied, BISHOP_DIRECTIONS)
+        elif kind == 'r':
+            targets = sliding_attacks(sq, board.occupied, ROOK_DIRECTIONS)
+        elif kind == 'q':
+            targets = sliding_attacks(sq, board.occupied, ROOK_DIRECTIONS + BISHOP_DIRECTIONS)
+        else:
+            return []
+        return [(row, col, to >> 3, to & 7) for to in iter_bits(targets & ~own & mask)]
+
+    def generate_pawn_moves(self, row, col, piece):
+        """Generate moves for a pawn with single-step shifts of the pawn's bit."""
+        board = self.board
+        bit = 1 << (row * 8 + col)
+        empty = FULL ^ board.occupied
+        if piece == 'P':
+            single = (bit >> 8) & empty
+            double = ((single & (0xFF << 40)) >> 8) & empty
+            captures = WHITE_PAWN_ATTACKS[row * 8 + col] & board.black
+            promotion_row, promotions = 0, 'QRBN'
+        else:
+            single = (bit << 8) & empty
+            double = ((single & (0xFF << 16)) << 8) & empty
+            captures = BLACK_PAWN_ATTACKS[row * 8 + col] & board.white
+            promotion_row, promotions = 7, 'qrbn'
+
+        moves = []
+        for to in iter_bits(single | captures):
+            if to >> 3 == promotion_row:
+                for promoted in promotions:
+                    moves.append((row, col, to >> 3, to & 7, promoted))
+            else:
+                moves.append((row, col, to >> 3, to & 7))
+        for to in iter_bits(double):
+            moves.append((row, col, to >> 3, to & 7))
+
+        # En pass moves if eligible
+        if self.en_pass_possible and (row, col) in self.en_pass_from_squares:
+            moves.append((row, col, self.en_pass_to_square[0], self.en_pass_to_square[1]))
+        return moves
+
+    def generate_en_pass_moves(self, row, col, piece):
+        self.en_pass_to_square = (row + 1, col) if piece == 'P' else (row - 1, col)
+        for dc in [-1, 1]:
+            if 0 <= col + dc < 8:
+                self.en_pass_from_squares.append((row, col + dc))
+        self.en_pass_possible = True
+
+    def clear_en_pass(self):
+        self.en_pass_to_square = ()
+        self.en_pass_from_squares = []
+        self.en_pass_possible = False
+
+    def generate_king_moves(self, row, col, piece):
+        """Generate moves for a king, including castling."""
+        board = self.board
+        sq = row * 8 + col
+        white = piece == 'K'
+        own = board.white if white else board.black
+        moves = [(row, col, to >> 3, to & 7) for to in iter_bits(KING_ATTACKS[sq] & ~own)]
+
+        if white:
+            king_moved = board.white_king_has_moved
+            rook1_moved = board.white_rook1_has_moved
+            rook2_moved = board.white_rook2_has_moved
+            rook = board.bitboards[PIECE_INDEX['R']]
+        else:
+            king_moved = board.black_king_has_moved
+            rook1_moved = board.black_rook1_has_moved
+            rook2_moved = board.black_rook2_has_moved
+            rook = board.bitboards[PIECE_INDEX['r']]
+
+        if king_moved or self.attacked(sq, not white):
+            return moves
+        base = row * 8
+        occupied = board.occupied
+        # long castling: b, c and d files empty, d file not attacked
+        if not rook1_moved and rook & (1 << base) and not occupied & (0b1110 << base) \
+                and not self.attacked(base + 3, not white):
+            moves.append((row, col, row, 2))
+        # short castling: f and g files empty, f file not attacked
+        if not rook2_moved and rook & (1 << (base + 7)) and not occupied & (0b1100000 << base) \
+                and not self.attacked(base + 5, not white):
+            moves.append((row, col, row, 6))
+        return moves
+
+    def is_square_attacked(self, square, by_colour):
+        """Check whether a piece of ``by_colour`` attacks ``square``, a (row, col) pair."""
+        row, col = square
+        return self.attacked(row * 8 + col, by_colour == 'white')
+
+    def attacked(self, sq, by_white, occupied=None, remove=0):
+        """Check whether square index ``sq`` is attacked by white (``by_white``) or black.
+
+        ``occupied`` overrides the occupancy used for sliding pieces and
+        ``remove`` clears enemy pieces (e.g. one about to be captured).
+        """
+        board = self.board
+        bbs = board.bitboards
+        if occupied is None:
+            occupied = board.occupied
+        keep = FULL ^ remove
+        if by_white:
+            pawns, knights, bishops, rooks, queens, king = bbs[0:6]
+            pawn_attacks = BLACK_PAWN_ATTACKS[sq]
+        else:
+            pawns, knights, bishops, rooks, queens, king = bbs[6:12]
+            pawn_attacks = WHITE_PAWN_ATTACKS[sq]
+        if pawn_attacks & pawns & keep or KNIGHT_ATTACKS[sq] & knights & keep or KING_ATTACKS[sq] & king:
+            return True
+        diagonal = (bishops | queens) & keep
+        if diagonal and sliding_attacks(sq, occupied, BISHOP_DIRECTIONS) & diagonal:
+            return True
+        straight = (rooks | queens) & keep
+        if straight and sliding_attacks(sq, occupied, ROOK_DIRECTIONS) & straight:
+            return True
+        return False
+
+    def compute_legal_context(self, ct):
+        """Find the check mask and pinned pieces of the side to move, as bitboards.
+
+        Returns (king square, check mask, {pinned square: mask of its pin ray},
+        side). Without a check the check mask is the whole board; in check it
+        holds the checker and the squares between it and the king; in double
+        check it is empty. Computed once per position and shared by every
+        call to ``is_legal``.
+        """
+        board = self.board
+        bbs = board.bitboards
+        white = ct == 'white'
+        king_row, king_col, king = board.white_king if white else board.black_king
+        king_sq = king_row * 8 + king_col
+        if white:
+            own = board.white
+            pawns, knights, bishops, rooks, queens = bbs[6:11]
+            pawn_attacks = WHITE_PAWN_ATTACKS[king_sq]
+        else:
+            own = board.black
+            pawns, knights, bishops, rooks, queens = bbs[0:5]
+            pawn_attacks = BLACK_PAWN_ATTACKS[king_sq]
+        checkers = (pawn_attacks & pawns) | (KNIGHT_ATTACKS[king_sq] & knights)
+        check_mask = checkers
+        pins = {}
+        occupied = board.occupied
+
+        # An enemy slider first on a ray from the king gives check; behind exactly one of our pieces it pins it
+        for directions, sliders in ((ROOK_DIRECTIONS, rooks | queens), (BISHOP_DIRECTIONS, bishops | queens)):
+            if not sliders:
+                continue
+            for direction in directions:
+                ray = RAYS[direction][king_sq]
+                if not ray & sliders:
+                    continue
+                nearest = nearest_square(ray & occupied, direction)
+                if sliders >> nearest & 1:
+                    checkers |= 1 << nearest
+                    check_mask |= ray ^ RAYS[direction][nearest]
+                elif own >> nearest & 1:
+                    beyond = RAYS[direction][nearest] & occupied
+                    if beyond:
+                        pinner = nearest_square(beyond, direction)
+                        if sliders >> pinner & 1:
+                            pins[nearest] = ray ^ RAYS[direction][pinner]
+
+        if not checkers:
+            check_mask = FULL
+        elif checkers & (checkers - 1):
+            check_mask = 0
+        return king_sq, check_mask, pins, ct
+
+    def is_legal(self, move, context):
+        """Check a pseudo-legal move against the position's check and pin masks."""
+        from_row, from_col, to_row, to_col, *e = move
+        from_sq = from_row * 8 + from_col
+        king_sq, check_mask, pins, ct = context
+        if from_sq == king_sq:
+            return self.leaves_king_safe(move, ct)
+        if from_col != to_col and self.board.bitboards[0 if ct == 'white' else 6] >> from_sq & 1 \
+                and not self.board.occupied >> (to_row * 8 + to_col) & 1:
+            # En passant lifts two pawns off the board at once, so test it directly
+            return self.leaves_king_safe(move, ct)
+        return bool(check_mask & pins.get(from_sq, FULL) & (1 << (to_row * 8 + to_col)))
+
+    def leaves_king_safe(self, move, ct):
+        """Check that a pseudo-legal move does not leave the mover's king attacked."""
+        board = self.board
+        white = ct == 'white'
+        from_row, from_col, to_row, to_col, *e = move
+        from_bit = 1 << (from_row * 8 + from_col)
+        to_sq = to_row * 8 + to_col
+        to_bit = 1 << to_sq
+        king_row, king_col, king = board.white_king if white else board.black_king
+        king_sq = king_row * 8 + king_col
+        if from_bit == 1 << king_sq:
+            king_sq = to_sq
+
+        removed = to_bit
+        occupied = (board.occupied ^ from_bit) | to_bit
+        piece_bbs = board.bitboards
+        pawn = piece_bbs[0 if white else 6]
+        if pawn & from_bit and from_col != to_col and not board.occupied & to_bit:
+            # en passant also lifts the captured pawn off the board
+            captured_bit = 1 << (from_row * 8 + to_col)
+            removed |= captured_bit
+            occupied ^= captured_bit
+        return not self.attacked(king_sq, not white, occupied, removed)
+
+    def filter_moves(self, moves, ct, context=None):
+        """Keep only the legal moves, using masks computed once for the position."""
+        if context is None:
+            context = self.compute_legal_context(ct)
+        return [move for move in moves if self.is_legal(move, context)]
+
+    def is_check(self, ct):
+        row, col, king = self.board.black_king if ct == 'black' else self.board.white_king
+        return self.attacked(row * 8 + col, ct == 'black')
+
+
+profiling.register(BitBoard, 'make_move', 'undo_move', 'check_game_state')
+profiling.register(BitMoveGenerator, 'moves_present', 'generate_legal_moves', 'generate_piece_moves',
+                   'generate_pawn_moves', 'generate_king_moves', 'compute_legal_context', 'filter_moves', 'is_check',
+                   'attacked')
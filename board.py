@@ -1,3 +1,61 @@
+import profiling
+import tablebase
+import zobrist
+from evaluation import PIECE_VALUES
+from history import PositionHistory
+
+PIECES = 'PNBRQKpnbrqk'
+
+
+def parse_fen(fen):
+    """Split a FEN string into (squares, castling flags, turn, en passant, half-move clock, start ply).
+
+    ``squares`` has 64 characters with '.' for empty, the castling flags use
+    the layout of Board.get_castling_flags and the start ply counts the plies
+    played before the position from its full-move number. The clocks may be
+    left out. A malformed field raises ValueError.
+    """
+    fields = fen.split()
+    if not 4 <= len(fields) <= 6:
+        raise ValueError(f"Invalid FEN, expected 4 to 6 fields: {fen!r}")
+    placement, turn, castling, en_passant, *clocks = fields
+    ranks = placement.split('/')
+    if len(ranks) != 8:
+        raise ValueError(f"Invalid FEN placement, expected 8 ranks: {placement}")
+    squares = ''
+    for rank in ranks:
+        row = ''
+        for char in rank:
+            if char in '12345678':
+                row += '.' * int(char)
+            elif char in PIECES:
+                row += char
+            else:
+                raise ValueError(f"Invalid FEN piece {char!r}: {placement}")
+        if len(row) != 8:
+            raise ValueError(f"Invalid FEN rank {rank!r}, expected 8 squares: {placement}")
+        squares += row
+    if turn not in ('w', 'b'):
+        raise ValueError(f"Invalid FEN side to move: {turn}")
+    if castling != '-' and (any(right not in 'KQkq' for right in castling) or len(set(castling)) != len(castling)):
+        raise ValueError(f"Invalid FEN castling rights: {castling}")
+    if en_passant != '-' and (len(en_passant) != 2 or en_passant[0] not in 'abcdefgh'
+                              or en_passant[1] != ('6' if turn == 'w' else '3')):
+        raise ValueError(f"Invalid FEN en passant square: {en_passant}")
+    if not all(clock.isdigit() for clock in clocks) or clocks[1:] == ['0']:
+        raise ValueError(f"Invalid FEN clocks: {' '.join(clocks)}")
+
+    white_king_moved = 'K' not in castling and 'Q' not in castling
+    black_king_moved = 'k' not in castling and 'q' not in castling
+    flags = (white_king_moved | black_king_moved << 1 | ('Q' not in castling) << 2 | ('q' not in castling) << 3
+             | ('K' not in castling) << 4 | ('k' not in castling) << 5)
+    turn = 'white' if turn == 'w' else 'black'
+    en_passant = None if en_passant == '-' else (8 - int(en_passant[1]), ord(en_passant[0]) - ord('a'))
+    ply_count = int(clocks[0]) if clocks else 0
+    move_number = int(clocks[1]) if len(clocks) > 1 else 1
+    return squares, flags, turn, en_passant, ply_count, 2 * (move_number - 1) + (turn == 'black')
+
+
 class Board:
     def __init__(self):
         # 8x8 chessboard initialized with starting positions for pieces
@@ -11,6 +69,7 @@ class Board:
             ['P', 'P', 'P', 'P', 'P', 'P', 'P', 'P'],  # White pawns
             ['R', 'N', 'B', 'Q', 'K', 'B', 'N', 'R']   # White pieces
         ]
+        self.index_pieces()
 
         self.white_king = (7, 4, 'K')
         self.black_king = (0, 4, 'k')
@@ -21,8 +80,93 @@ class Board:
         self.white_rook2_has_moved = False
         self.black_rook2_has_moved = False
         self.ply_count = 0
-        self.board_states = {}
-    
+
+        self.turn = 'white'
+        self.en_passant = None  # Square behind a pawn that just moved two squares
+        self.debug_zobrist = zobrist.DEBUG
+        self.zobrist_key = zobrist.compute_key(self)
+        self.history = PositionHistory(self.zobrist_key)  # Key of every position, for repetitions
+        self.undo_stack = []  # One record of irreversible state per move, popped by undo_move
+        self.start_ply = 0  # Plies played before the position was set up, for the FEN move number
+
+    @classmethod
+    def from_fen(cls, fen):
+        """Create a board set up from a FEN string."""
+        board = cls()
+        board.set_fen(fen)
+        return board
+
+    def set_fen(self, fen):
+        """Set up the position, castling rights, en passant square, clocks and side to move from a FEN string."""
+        squares, flags, turn, en_passant, ply_count, start_ply = parse_fen(fen)
+        self.load_placement(squares)
+        self.set_castling_flags(flags)
+        self.turn = turn
+        self.en_passant = en_passant
+        self.ply_count = ply_count
+        self.start_ply = start_ply
+        self.undo_stack = []
+        self.zobrist_key = zobrist.compute_key(self)
+        self.history = PositionHistory(self.zobrist_key)
+
+    def load_placement(self, squares):
+        """Replace every piece from a 64-character string, '.' for empty, without updating the key."""
+        self.board = [list(squares[row * 8:row * 8 + 8]) for row in range(8)]
+        self.locate_kings(squares)
+        self.index_pieces()
+
+    def index_pieces(self):
+        """Rebuild the piece lists and material counters from the board."""
+        # Piece letter -> squares (row * 8 + col) it stands on, kept up to date by every change to the board
+        self.piece_squares = {piece: set() for piece in PIECES}
+        self.material = {'white': 0, 'black': 0}  # Piece values without the king, in centipawns
+        for row in range(8):
+            for col in range(8):
+                piece = self.board[row][col]
+                if piece != '.':
+                    self.piece_squares[piece].add(row * 8 + col)
+                    self.material['black' if piece.islower() else 'white'] += PIECE_VALUES[piece.lower()]
+
+    def pieces(self, colour):
+        """(square, piece) of every piece of one colour, in a list that stays valid while the board changes."""
+        piece_squares = self.piece_squares
+        return [(sq, piece) for piece in ('PNBRQK' if colour == 'white' else 'pnbrqk') for sq in piece_squares[piece]]
+
+    def locate_kings(self, squares):
+        """Update the king positions from a 64-character placement string."""
+        if 'K' in squares:
+            sq = squares.index('K')
+            self.white_king = (sq // 8, sq % 8, 'K')
+        if 'k' in squares:
+            sq = squares.index('k')
+            self.black_king = (sq // 8, sq % 8, 'k')
+
+    def to_fen(self):
+        """Describe the position as a FEN string."""
+        rows = []
+        for row in range(8):
+            line = ''
+            empty = 0
+            for col in range(8):
+                piece = self.get_piece(row, col)
+                if piece == '.':
+                    empty += 1
+                    continue
+                if empty:
+                    line += str(empty)
+                    empty = 0
+                line += piece
+            rows.append(line + str(empty) if empty else line)
+
+        rights = zobrist.castling_rights(self)
+        castling = ''.join(flag for bit, flag in zip((zobrist.WHITE_SHORT, zobrist.WHITE_LONG, zobrist.BLACK_SHORT,
+                                                     zobrist.BLACK_LONG), 'KQkq') if rights & bit) or '-'
+        en_passant = '-'
+        if self.en_passant is not None:
+            en_passant = f"{'abcdefgh'[self.en_passant[1]]}{8 - self.en_passant[0]}"
+        move_number = (self.start_ply + len(self.undo_stack)) // 2 + 1
+        return f"{'/'.join(rows)} {self.turn[0]} {castling} {en_passant} {self.ply_count} {move_number}"
+
     def print_board(self):
         """Print the board for debugging purposes."""
         for row in self.board:
@@ -34,8 +178,38 @@ class Board:
 
     def set_piece(self, row, col, piece):
         """Set a piece at a specific board position."""
+        old_piece = self.board[row][col]
+        if old_piece != '.':
+            self.zobrist_key ^= zobrist.PIECE_KEYS[old_piece][row * 8 + col]
+            self.piece_squares[old_piece].remove(row * 8 + col)
+            self.material['black' if old_piece.islower() else 'white'] -= PIECE_VALUES[old_piece.lower()]
+        if piece != '.':
+            self.zobrist_key ^= zobrist.PIECE_KEYS[piece][row * 8 + col]
+            self.piece_squares[piece].add(row * 8 + col)
+            self.material['black' if piece.islower() else 'white'] += PIECE_VALUES[piece.lower()]
         self.board[row][col] = piece
 
+    def get_castling_flags(self):
+        """Pack the six king/rook moved flags into one small int."""
+        return (self.white_king_has_moved | self.black_king_has_moved << 1
+                | self.white_rook1_has_moved << 2 | self.black_rook1_has_moved << 3
+                | self.white_rook2_has_moved << 4 | self.black_rook2_has_moved << 5)
+
+    def set_castling_flags(self, flags):
+        """Unpack flags produced by get_castling_flags."""
+        self.white_king_has_moved = bool(flags & 1)
+        self.black_king_has_moved = bool(flags & 2)
+        self.white_rook1_has_moved = bool(flags & 4)
+        self.black_rook1_has_moved = bool(flags & 8)
+        self.white_rook2_has_moved = bool(flags & 16)
+        self.black_rook2_has_moved = bool(flags & 32)
+
+    def verify_zobrist(self):
+        """Debug check that the incremental key matches a full recompute."""
+        expected = zobrist.compute_key(self)
+        if self.zobrist_key != expected:
+            raise RuntimeError(f"Zobrist key mismatch: {self.zobrist_key:#018x} != {expected:#018x}")
+
     def is_valid_move(self, move):
         """Check if the move is within board bounds."""
         from_row, from_col, to_row, to_col, *e = move
@@ -45,46 +219,91 @@ class Board:
         """Make a move on the board."""
         if not self.is_valid_move(move):
             raise ValueError("Invalid move")
-        
-        move_generator.clear_en_pass()
 
         from_row, from_col, to_row, to_col, *e = move
         piece = self.board[from_row][from_col]
         captured_piece = self.board[to_row][to_col]
 
+        # Everything undo_move cannot work out from the board afterwards
+        self.undo_stack.append((
+            move, captured_piece, self.get_castling_flags(), self.ply_count, self.zobrist_key,
+            self.en_passant, move_generator, move_generator.en_pass_to_square,
+            move_generator.en_pass_from_squares, move_generator.en_pass_possible,
+        ))
+        move_generator.clear_en_pass()
+
+        # Zobrist key: XOR out what changes
+        piece_keys = zobrist.PIECE_KEYS
+        key = self.zobrist_key
+        rights = zobrist.castling_rights(self)
+        if self.en_passant is not None:
+            key ^= zobrist.EN_PASSANT_KEYS[self.en_passant[1]]
+            self.en_passant = None
+        key ^= piece_keys[piece][from_row * 8 + from_col] ^ piece_keys[piece][to_row * 8 + to_col]
+        if captured_piece != '.':
+            key ^= piece_keys[captured_piece][to_row * 8 + to_col]
+
         self.board[to_row][to_col] = piece
         self.board[from_row][from_col] = '.'
 
+        # Piece lists and material follow every piece that moves, is taken or promotes
+        piece_squares = self.piece_squares
+        piece_squares[piece].remove(from_row * 8 + from_col)
+        piece_squares[piece].add(to_row * 8 + to_col)
+        mover = 'black' if piece.islower() else 'white'
+        opponent = 'white' if mover == 'black' else 'black'
+        if captured_piece != '.':
+            piece_squares[captured_piece].remove(to_row * 8 + to_col)
+            self.material[opponent] -= PIECE_VALUES[captured_piece.lower()]
+
         # Handle pawn promotion and en passant
         if piece.lower() == 'p':
             if len(move) == 5:
                 self.board[to_row][to_col] = move[4]
+                key ^= piece_keys[piece][to_row * 8 + to_col] ^ piece_keys[move[4]][to_row * 8 + to_col]
+                piece_squares[piece].remove(to_row * 8 + to_col)
+                piece_squares[move[4]].add(to_row * 8 + to_col)
+                self.material[mover] += PIECE_VALUES[move[4].lower()] - PIECE_VALUES['p']
             
             # en passant has hapened
             if (abs(from_col - to_col) == 1 and captured_piece=='.'):
+                taken = self.board[from_row][to_col]
+                key ^= piece_keys[taken][from_row * 8 + to_col]
                 self.board[from_row][to_col] = '.'
+                piece_squares[taken].remove(from_row * 8 + to_col)
+                self.material[opponent] -= PIECE_VALUES['p']
             
             # Eligible for en passant
             if(abs(from_row-to_row)==2):
                 move_generator.generate_en_pass_moves(to_row, to_col, piece)
-            
-            if(captured_piece!='.'):
-                self.ply_count = 0
-            else:
-                self.ply_count+=1
+                self.en_passant = ((from_row + to_row) // 2, to_col)
+                key ^= zobrist.EN_PASSANT_KEYS[to_col]
+
+        # Half-move clock for the 50 move rule: reset by pawn moves and captures
+        if piece.lower() == 'p' or captured_piece != '.':
+            self.ply_count = 0
+        else:
+            self.ply_count += 1
         
         # Handle casteling
         if piece.lower() == 'k' and abs(to_col - from_col)==2:    
+            rook = self.board[from_row][7 if to_col == 6 else 0]
             if(to_col==6):
+                key ^= piece_keys[rook][from_row * 8 + 7] ^ piece_keys[rook][from_row * 8 + 5]
                 self.board[from_row][5] = self.board[from_row][7]
                 self.board[from_row][7]  = '.'
+                piece_squares[rook].remove(from_row * 8 + 7)
+                piece_squares[rook].add(from_row * 8 + 5)
                 if from_row == 0:
                     self.black_rook2_has_moved = True
                 else:
                     self.white_rook2_has_moved = True
             else:
+                key ^= piece_keys[rook][from_row * 8] ^ piece_keys[rook][from_row * 8 + 3]
                 self.board[from_row][3] = self.board[from_row][0]
                 self.board[from_row][0] = '.'
+                piece_squares[rook].remove(from_row * 8)
+                piece_squares[rook].add(from_row * 8 + 3)
                 if from_row == 0:
                     self.black_rook1_has_moved = True
                 else:
@@ -111,19 +330,57 @@ class Board:
             
             if from_row == 0 and from_col == 7:
                 self.black_rook2_has_moved = True
-    
-        return captured_piece  # Return captured piece for undo handling
 
-    def undo_move(self, move, captured_piece):
-        """move: old move"""
+        # A rook captured on its starting square can no longer castle either
+        if captured_piece.lower() == 'r':
+            if (to_row, to_col) == (7, 0):
+                self.white_rook1_has_moved = True
+            elif (to_row, to_col) == (7, 7):
+                self.white_rook2_has_moved = True
+            elif (to_row, to_col) == (0, 0):
+                self.black_rook1_has_moved = True
+            elif (to_row, to_col) == (0, 7):
+                self.black_rook2_has_moved = True
+
+        key ^= zobrist.CASTLING_KEYS[rights] ^ zobrist.CASTLING_KEYS[zobrist.castling_rights(self)]
+        self.zobrist_key = key ^ zobrist.SIDE_KEY
+        self.turn = 'black' if self.turn == 'white' else 'white'
+        if self.debug_zobrist:
+            self.verify_zobrist()
+        self.history.push(self.zobrist_key, self.ply_count == 0)
+
+        return captured_piece
+
+    def undo_move(self):
+        """Take back the last move made with make_move."""
+        (move, captured_piece, flags, self.ply_count, key, self.en_passant, move_generator,
+         move_generator.en_pass_to_square, move_generator.en_pass_from_squares,
+         move_generator.en_pass_possible) = self.undo_stack.pop()
+        self.history.pop()
+
         from_row, from_col, to_row, to_col, *e = move
-        piece = self.board[to_row][to_col]
+        moved = piece = self.board[to_row][to_col]
+        mover = 'black' if piece.islower() else 'white'
+        opponent = 'white' if mover == 'black' else 'black'
         if len(move)==5:
             piece = 'p' if(piece.islower()) else 'P'
+            self.material[mover] -= PIECE_VALUES[moved.lower()] - PIECE_VALUES['p']
             
     
         self.board[from_row][from_col] = piece
         self.board[to_row][to_col] = captured_piece
+        piece_squares = self.piece_squares
+        piece_squares[moved].remove(to_row * 8 + to_col)
+        piece_squares[piece].add(from_row * 8 + from_col)
+        if captured_piece != '.':
+            piece_squares[captured_piece].add(to_row * 8 + to_col)
+            self.material[opponent] += PIECE_VALUES[captured_piece.lower()]
+
+        # Put back a pawn taken en passant
+        if piece.lower() == 'p' and from_col != to_col and captured_piece == '.':
+            self.board[from_row][to_col] = 'p' if piece == 'P' else 'P'
+            piece_squares[self.board[from_row][to_col]].add(from_row * 8 + to_col)
+            self.material[opponent] += PIECE_VALUES['p']
 
         # Update king positions
         if(piece == 'k'):
@@ -132,15 +389,28 @@ class Board:
             self.white_king = (from_row, from_col, 'K')
         
         if piece.lower() == 'k' and abs(to_col - from_col)==2:    
+            rook = 'R' if piece == 'K' else 'r'
             if(to_col==6):
                 self.board[from_row][7] = self.board[from_row][5]
                 self.board[from_row][5] = '.'
+                piece_squares[rook].remove(from_row * 8 + 5)
+                piece_squares[rook].add(from_row * 8 + 7)
             else:
                 self.board[from_row][0] = self.board[from_row][3]
                 self.board[from_row][3] = '.'
+                piece_squares[rook].remove(from_row * 8 + 3)
+                piece_squares[rook].add(from_row * 8)
+
+        self.set_castling_flags(flags)
+        self.zobrist_key = key
+        self.turn = 'black' if self.turn == 'white' else 'white'
+        if self.debug_zobrist:
+            self.verify_zobrist()
     
-    def check_game_state(self, ct, move_generator):
-        if(not move_generator.moves_present(ct)):
+    def check_game_state(self, ct, move_generator, move_cache=None):
+        # A LegalMoveCache answers from the moves it keeps for the position when it has them
+        has_moves = move_cache.has_moves(self, move_generator) if move_cache is not None else move_generator.moves_present(ct)
+        if(not has_moves):
             if(move_generator.is_check(ct)):
                 winner = 'White' if ct=='black' else 'Black'
                 return f"{winner} won by Checkmate!"
@@ -150,6 +420,9 @@ class Board:
         if(self.has_insufficient_material()):
             return "Draw by Insufficient Material!"
 
+        if(self.is_tablebase_draw()):
+            return "Draw by tablebase!"
+
         if(self.is_50_move_rule()):
             return "Draw by 50 move rule!"
         
@@ -157,34 +430,26 @@ class Board:
             return "Draw by threefold repetition!"
         
     def has_insufficient_material(self):
-        pieces = [piece.lower() for row in self.board for piece in row if piece != '.']
-        if pieces == ['k', 'k']:
-            return True
-        if len(pieces) == 3 and ('b' in pieces or 'n' in pieces):
-            return True
-        return False
+        # Bare kings, or a single bishop or knight besides them
+        squares = self.piece_squares
+        if squares['P'] or squares['p'] or squares['R'] or squares['r'] or squares['Q'] or squares['q']:
+            return False
+        return len(squares['B']) + len(squares['N']) + len(squares['b']) + len(squares['n']) <= 1
     
+    def is_tablebase_draw(self):
+        # Drawn with best play according to the endgame tablebases, when they are installed
+        tablebases = tablebase.open_default()
+        return tablebases is not None and tablebases.probe(self) == (0, 0)
+
     def is_50_move_rule(self):
         return self.ply_count>=100
     
     def get_board_state(self):
-        # Convert the board and state into a unique string
-        board_string = ''.join([''.join(row) for row in self.board])
-        castling_info = f"{self.white_king_has_moved}{self.black_king_has_moved}" \
-                        f"{self.white_rook1_has_moved}{self.white_rook2_has_moved}" \
-                        f"{self.black_rook1_has_moved}{self.black_rook2_has_moved}"
-        return board_string + castling_info
-
-    def update_board_state(self):
-        state = self.get_board_state()
-        if state in self.board_states:
-            self.board_states[state] += 1
-        else:
-            self.board_states[state] = 1
+        # The Zobrist key already covers pieces, castling rights, en passant and side to move
+        return self.zobrist_key
 
     def is_threefold_repetition(self):
-        for state, count in self.board_states.items():
-            if count >= 3:
-                return True
-        return False
-        
+        return self.history.is_threefold_repetition()
+
+
+profiling.register(Board, 'make_move', 'undo_move', 'check_game_state')
@@ -1,10 +1,20 @@
 import tkinter as tk
 from tkinter import messagebox
-from PIL import Image, ImageTk
+from concurrent.futures import ThreadPoolExecutor
 from board import Board
 from move_generator import MoveGenerator
+from move_cache import LegalMoveCache
+from engine import Engine, MATE_SCORE, MAX_PLY
+from analysis import AnalysisWorker
+from parallel import deserialise_position, serialise_position
+from book import OpeningBook
+from sprites import SpriteCache, snap_size
+import profiling
 import os
 
+# Polyglot opening book the engine plays from while the position is in it
+BOOK_PATH = os.environ.get('CHESS_BOOK', 'book.bin')
+
 class ChessUI:
     def __init__(self, root, board, move_generator):
         self.root = root
@@ -17,42 +27,71 @@ class ChessUI:
         self.screen_height = 800
         self.square_size = self.screen_width // 8
         self.animation_speed = 10
-        # self.root.withdraw()  # Hide the main window initially
-        # self.show_game_mode_selection()
+        self.ai_colour = None  # Side played by the engine in "Human vs AI" mode
+        self.engine = Engine(time_limit=2, book=OpeningBook(BOOK_PATH) if os.path.exists(BOOK_PATH) else None)
+        self.engine.stop_check = lambda: self.closing
+        self.ai_executor = ThreadPoolExecutor(max_workers=1)  # Engine searches run off the Tk thread
+        self.ai_search = None  # Future of the engine's move while it is thinking
+        self.closing = False
+        self.sprites = SpriteCache()
+        self.last_move = None  # Shown by the previous move highlight
+        self.analysis = None  # Background AnalysisWorker in "Analyse" mode
+        self.moves_played = []  # Moves on the board, taken back by undo
+        self.redo_moves = []  # Moves taken back, most recent last, replayed by redo
+        self.moving = False  # A move is being animated; the board changes once it ends
+        self.move_cache = LegalMoveCache()  # Legal moves per position, for clicks and game-end checks
 
         self.setup_canvas()  # Initialize the chess UI
         self.load_images()
         self.draw_board()
-        self.draw_pieces()
+        self.update_canvas()
         # Position the main window at top-left corner
         self.root.geometry(f"{self.screen_width}x{self.screen_height}+0+0")
+        self.show_game_mode_selection()
 
     def setup_canvas(self):
         self.canvas = tk.Canvas(self.root, width=self.screen_width, height=self.screen_height)
-        self.canvas.pack()
+        self.canvas.pack(fill=tk.BOTH, expand=True)
         self.canvas.bind("<Button-1>", self.on_canvas_click)
+        self.canvas.bind("<Configure>", self.on_resize)
+        self.root.bind("<Control-z>", self.undo)
+        self.root.bind("<Left>", self.undo)
+        self.root.bind("<Control-y>", self.redo)
+        self.root.bind("<Right>", self.redo)
+        self.root.protocol("WM_DELETE_WINDOW", self.close)
+        # One canvas item per piece, keyed by square, and the piece each one shows
         self.piece_items = {}
+        self.drawn_pieces = {}
 
     def load_images(self):
-        image_folder = "images"
-        pieces = {
-            'K': 'white-king.png', 'Q': 'white-queen.png', 'R': 'white-rook.png',
-            'B': 'white-bishop.png', 'N': 'white-knight.png', 'P': 'white-pawn.png',
-            'k': 'black-king.png', 'q': 'black-queen.png', 'r': 'black-rook.png',
-            'b': 'black-bishop.png', 'n': 'black-knight.png', 'p': 'black-pawn.png',
-        }
-        self.piece_images = {}
-        for piece, filename in pieces.items():
-            image_path = os.path.join(image_folder, filename)
-            if os.path.exists(image_path):
-                pil_image = Image.open(image_path)
-                scaled_image = pil_image.resize((self.square_size, self.square_size), Image.Resampling.LANCZOS)
-                self.piece_images[piece] = ImageTk.PhotoImage(scaled_image)
-            else:
-                print(f"Warning: Missing image for piece '{piece}' at {image_path}")
+        # Scaled once per square size by the sprite cache, which also keeps them on disk
+        self.piece_images = self.sprites.photos_for(self.square_size)
+
+    def on_resize(self, event):
+        square_size = snap_size(min(event.width, event.height) // 8)
+        if square_size == self.square_size:
+            return
+        self.square_size = square_size
+        self.screen_width = self.screen_height = square_size * 8
+        self.load_images()
+        for (row, col), item in self.square_items.items():
+            x1 = col * square_size
+            y1 = row * square_size
+            self.canvas.coords(item, x1, y1, x1 + square_size, y1 + square_size)
+        for (row, col), item in self.piece_items.items():
+            self.canvas.itemconfigure(item, image=self.piece_images[self.drawn_pieces[(row, col)]])
+            self.canvas.coords(item, *self.get_square_coords(row, col))
+        self.selected_piece = None
+        self.remove_highlights()
+        if self.last_move:
+            self.highlight_prev_move(self.last_move)
 
     def draw_board(self):
+        # Everything but the pieces is created once, bottom to top: squares, last move and
+        # selection highlights, then (above the pieces) the move hints; highlights are shown
+        # and hidden rather than recreated
         colors = ['#739552', '#EBECD0']
+        self.square_items = {}
         for row in range(8):
             for col in range(8):
                 color = colors[(row + col) % 2]
@@ -60,17 +99,59 @@ class ChessUI:
                 y1 = row * self.square_size
                 x2 = x1 + self.square_size
                 y2 = y1 + self.square_size
-                self.canvas.create_rectangle(x1, y1, x2, y2, fill=color, outline='')
-
-    def draw_pieces(self):
-        for row in range(8):
-            for col in range(8):
-                piece = self.board.get_piece(row, col)
-                if piece != '.':
-                    image = self.piece_images[piece]
-                    x, y = self.get_square_coords(row, col)
-                    item = self.canvas.create_image(x, y, image=image, tags=piece)
-                    self.piece_items[(row, col)] = item
+                self.square_items[(row, col)] = self.canvas.create_rectangle(x1, y1, x2, y2, fill=color,
+                                                                             outline='', tags='square')
+        self.prev_move_items = [self.canvas.create_rectangle(0, 0, 0, 0, fill='#d6d653', outline='',
+                                                             state='hidden', tags='prev-highlight')
+                                for _ in range(2)]
+        self.selection_item = self.canvas.create_rectangle(0, 0, 0, 0, fill='#ffff33', outline='',
+                                                           state='hidden', tags='highlight')
+        self.hint_items = [self.create_hint_item() for _ in range(27)]  # Most moves a piece can have
+
+    def create_hint_item(self):
+        return self.canvas.create_oval(0, 0, 0, 0, state='hidden', tags=('highlight', 'hint'))
+
+    def update_canvas(self, squares=None):
+        """Bring the piece items on ``squares`` (every square by default) in line with the board."""
+        if squares is None:
+            squares = [(row, col) for row in range(8) for col in range(8)]
+        for row, col in squares:
+            piece = self.board.get_piece(row, col)
+            item = self.piece_items.get((row, col))
+            if piece == '.':
+                if item is not None:
+                    self.canvas.delete(item)
+                    del self.piece_items[(row, col)]
+                    del self.drawn_pieces[(row, col)]
+                continue
+            x, y = self.get_square_coords(row, col)
+            if item is None:
+                item = self.canvas.create_image(x, y, image=self.piece_images[piece], tags='piece')
+                self.canvas.tag_lower(item, 'hint')
+                self.piece_items[(row, col)] = item
+            else:
+                if self.drawn_pieces[(row, col)] != piece:
+                    self.canvas.itemconfigure(item, image=self.piece_images[piece])
+                self.canvas.coords(item, x, y)
+            self.drawn_pieces[(row, col)] = piece
+
+    def move_piece_item(self, from_square, to_square):
+        """Hand the item of a moved piece over to its new square, deleting the one it captured."""
+        captured_item = self.piece_items.pop(to_square, None)
+        if captured_item is not None:
+            self.canvas.delete(captured_item)
+        self.piece_items[to_square] = self.piece_items.pop(from_square)
+        self.drawn_pieces[to_square] = self.drawn_pieces.pop(from_square)
+
+    def move_squares(self, move, piece):
+        """Squares whose contents a move changes."""
+        from_row, from_col, to_row, to_col = move[:4]
+        squares = [(from_row, from_col), (to_row, to_col)]
+        if piece.lower() == 'p' and from_col != to_col:
+            squares.append((from_row, to_col))  # Where an en passant capture removes a pawn
+        elif piece.lower() == 'k' and abs(to_col - from_col) == 2:
+            squares += [(from_row, 7), (from_row, 5)] if to_col == 6 else [(from_row, 0), (from_row, 3)]
+        return squares
 
     def get_square_coords(self, row, col):
         x = col * self.square_size + self.square_size / 2
@@ -78,6 +159,8 @@ class ChessUI:
         return (x, y)
 
     def on_canvas_click(self, event):
+        if self.current_turn == self.ai_colour or self.ai_search is not None:
+            return  # Wait for the engine's reply
         x, y = event.x, event.y
         col, row = self.get_square_at_position(x, y)
         if row is None or col is None:
@@ -90,14 +173,14 @@ class ChessUI:
                 # Deselect previous piece and select new piece
                 self.remove_highlights()
                 self.selected_piece = (row, col)
-                self.valid_moves = self.move_generator.generate_piece_moves(row, col, piece)
-                self.valid_moves = self.move_generator.filter_moves(self.valid_moves, self.current_turn)
+                self.valid_moves = self.move_cache.piece_moves(self.board, self.move_generator, row, col)
                 self.highlight_moves(self.valid_moves)
             else:
                 move = (from_row, from_col, row, col)
                 sp = self.board.get_piece(from_row, from_col)
                 
-                if ((sp == 'P' and row == 0) or (sp == 'p' and row == 7)) and (from_row, from_col, row, col, 'Q') in self.valid_moves:
+                promotion = (from_row, from_col, row, col, 'Q' if sp == 'P' else 'q')
+                if ((sp == 'P' and row == 0) or (sp == 'p' and row == 7)) and promotion in self.valid_moves:
                     move = self.handle_pawn_promotion(move, sp)
                     
                 if move in self.valid_moves:
@@ -107,14 +190,14 @@ class ChessUI:
         else:
             if piece != '.' and self.is_piece_turn(piece):
                 self.selected_piece = (row, col)
-                self.valid_moves = self.move_generator.generate_piece_moves(row, col, piece)
-                self.valid_moves = self.move_generator.filter_moves(self.valid_moves, self.current_turn)
+                self.valid_moves = self.move_cache.piece_moves(self.board, self.move_generator, row, col)
                 self.highlight_moves(self.valid_moves)
             else:
                 self.selected_piece = None
                 self.remove_highlights()
 
     def highlight_moves(self, moves):
+        self.remove_highlights()
         if moves:
             # Highlight the starting square (from_row, from_col)
             from_row, from_col = moves[0][0], moves[0][1]
@@ -122,23 +205,14 @@ class ChessUI:
             y1 = from_row * self.square_size
             x2 = x1 + self.square_size
             y2 = y1 + self.square_size
-
-            # Draw the highlighted square
-            self.canvas.create_rectangle(
-                x1, y1, x2, y2, 
-                fill='#ffff33', 
-                outline='',  # No border
-                tags='highlight'
-            )
-
-            piece = self.board.get_piece(from_row, from_col)
-            if piece != '.':
-                image = self.piece_images[piece]
-                x, y = self.get_square_coords(from_row, from_col)
-                self.canvas.create_image(x, y, image=image, tags=piece)
-        for move in moves:
-            to_row, to_col = move[2], move[3]
-            
+            self.canvas.coords(self.selection_item, x1, y1, x2, y2)
+            self.canvas.itemconfigure(self.selection_item, state='normal')
+
+        # One hint per target square; promotions list the same square once per piece
+        targets = list(dict.fromkeys((move[2], move[3]) for move in moves))
+        while len(self.hint_items) < len(targets):
+            self.hint_items.append(self.create_hint_item())
+        for item, (to_row, to_col) in zip(self.hint_items, targets):
             # Center of the square
             x_center = to_col * self.square_size + self.square_size / 2
             y_center = to_row * self.square_size + self.square_size / 2
@@ -153,14 +227,9 @@ class ChessUI:
             y2 = y_center + radius
 
             if self.board.get_piece(to_row, to_col) == '.':
-                # Draw translucent circle
-                self.canvas.create_oval(
-                    x1, y1, x2, y2, 
-                    fill='#605D57', 
-                    outline='',  # No border
-                    stipple="gray25",  # Add transparency effect
-                    tags='highlight',
-                )
+                # Translucent circle
+                self.canvas.coords(item, x1, y1, x2, y2)
+                self.canvas.itemconfigure(item, fill='#605D57', outline='', width=1, stipple='gray25', state='normal')
             else:
                 # Calculate bounding box for the hollow circle
                 x1 = to_col * self.square_size + 5  # Leave a small margin
@@ -168,79 +237,61 @@ class ChessUI:
                 x2 = x1 + self.square_size - 10  # Adjust for the margin
                 y2 = y1 + self.square_size - 10
 
-                # Draw a hollow circle (outline only)
-                self.canvas.create_oval(
-                    x1, y1, x2, y2, 
-                    outline='#605D57',  # Circle color
-                    width=7,  # Circle border thickness
-                    tags='highlight'
-                )
-
-                piece = self.board.get_piece(from_row, from_col)
-                image = self.piece_images[piece]
-                x, y = self.get_square_coords(from_row, from_col)
-                self.canvas.create_image(x, y, image=image, tags=piece)
-
-
+                # Hollow circle (outline only) round the piece that can be taken
+                self.canvas.coords(item, x1, y1, x2, y2)
+                self.canvas.itemconfigure(item, fill='', outline='#605D57', width=7, stipple='', state='normal')
 
     def remove_highlights(self):
-        self.canvas.delete('highlight')
-    
-    def highlight_prev_move(self, move, piece):
-        # Highlight the starting square (from_row, from_col)
-        from_row, from_col = move[0], move[1]
-        x1 = from_col * self.square_size
-        y1 = from_row * self.square_size
-        x2 = x1 + self.square_size
-        y2 = y1 + self.square_size
-
-        # Draw the highlighted square
-        self.canvas.create_rectangle(
-            x1, y1, x2, y2, 
-            fill='#d6d653', 
-            outline='',  # No border
-            tags='prev-highlight'
-        )
-
-        # Highlight the ending square (from_row, from_col)
-        from_row, from_col = move[2], move[3]
-        x1 = from_col * self.square_size
-        y1 = from_row * self.square_size
-        x2 = x1 + self.square_size
-        y2 = y1 + self.square_size
-
-        # Draw the highlighted square
-        self.canvas.create_rectangle(
-            x1, y1, x2, y2, 
-            fill='#d6d653', 
-            outline='',  # No border
-            tags='prev-highlight'
-        )
-
-        image = self.piece_images[piece]
-        x, y = self.get_square_coords(from_row, from_col)
-        self.canvas.create_image(x, y, image=image, tags=piece)
-
-
+        self.canvas.itemconfigure('highlight', state='hidden')
+
+    def highlight_prev_move(self, move):
+        # Highlight the starting and ending squares
+        self.last_move = move
+        for item, (row, col) in zip(self.prev_move_items, (move[:2], move[2:4])):
+            x1 = col * self.square_size
+            y1 = row * self.square_size
+            x2 = x1 + self.square_size
+            y2 = y1 + self.square_size
+            self.canvas.coords(item, x1, y1, x2, y2)
+            self.canvas.itemconfigure(item, state='normal')
 
     def remove_prev_move(self):
-        self.canvas.delete('prev-highlight')
+        self.last_move = None
+        self.canvas.itemconfigure('prev-highlight', state='hidden')
 
     def make_move(self, move):
+        if self.analysis:
+            self.analysis.cancel()  # The position it is searching is about to change
+        if self.redo_moves and self.redo_moves[-1] == move:
+            self.redo_moves.pop()
+        else:
+            self.redo_moves = []  # A different move starts a new line
+        self.moving = True
         from_row, from_col, to_row, to_col, *e = move
         piece = self.board.get_piece(from_row, from_col)
         captured_piece = self.board.get_piece(to_row, to_col)
 
         def finalize_move():
-            # Update the board state and switch turns after animation
+            # Update the board state and switch turns after animation, then redraw
+            # only the squares the move changed
             self.remove_prev_move()
+            squares = self.move_squares(move, piece)
             self.board.make_move(move, self.move_generator)
-            self.update_canvas()
-            self.highlight_prev_move(move, piece)
+            self.moves_played.append(move)
+            self.moving = False
+            self.move_piece_item((from_row, from_col), (to_row, to_col))
+            if piece.lower() == 'k' and abs(to_col - from_col) == 2:
+                self.move_piece_item(squares[2], squares[3])
+            self.update_canvas(squares)
+            self.highlight_prev_move(move)
             self.switch_turn()
-            result = self.board.check_game_state(self.current_turn, self.move_generator)
+            result = self.board.check_game_state(self.current_turn, self.move_generator, self.move_cache)
             if result:
                 self.show_game_over(result)
+            elif self.current_turn == self.ai_colour:
+                self.root.after(50, self.play_ai_move)
+            elif self.analysis:
+                self.analysis.analyse(self.board, self.move_generator)
 
         if piece.lower() == 'k' and abs(to_col - from_col) == 2:
             # Castling animation
@@ -260,7 +311,8 @@ class ChessUI:
     def animate_move(self, from_row, from_col, to_row, to_col, piece):
         from_x, from_y = self.get_square_coords(from_row, from_col)
         to_x, to_y = self.get_square_coords(to_row, to_col)
-        piece_item = self.piece_items.pop((from_row, from_col))
+        piece_item = self.piece_items[(from_row, from_col)]
+        self.canvas.tag_raise(piece_item, 'piece')  # Slide over the other pieces
         total_steps = 10  # Adjust for smoother or faster animation
         dx = (to_x - from_x) / total_steps
         dy = (to_y - from_y) / total_steps
@@ -275,12 +327,8 @@ class ChessUI:
                 current_step += 1
                 self.root.after(self.animation_speed, move_piece)
             else:
-                # Finalize position
+                # Finalize position; finalize_move hands the item over to its new square
                 self.canvas.coords(piece_item, to_x, to_y)
-                self.piece_items[(to_row, to_col)] = piece_item
-                captured_item = self.piece_items.pop((to_row, to_col), None)
-                if captured_item:
-                    self.canvas.delete(captured_item)
 
         move_piece()
 
@@ -292,52 +340,87 @@ class ChessUI:
             rook_from_col, rook_to_col = 0, 3
         else:
             return
-        rook_piece = self.board.get_piece(from_row, rook_from_col)
-        king_item = self.piece_items.pop((from_row, from_col))
-        rook_item = self.piece_items.pop((from_row, rook_from_col))
+        king_item = self.piece_items[(from_row, from_col)]
+        rook_item = self.piece_items[(from_row, rook_from_col)]
         king_start_x, king_start_y = self.get_square_coords(from_row, from_col)
         king_target_x, king_target_y = self.get_square_coords(to_row, to_col)
         rook_start_x, rook_start_y = self.get_square_coords(from_row, rook_from_col)
         rook_target_x, rook_target_y = self.get_square_coords(to_row, rook_to_col)
-        king_dx = (king_target_x - king_start_x) / 10
-        king_dy = (king_target_y - king_start_y) / 10
-        rook_dx = (rook_target_x - rook_start_x) / 10
-        rook_dy = (rook_target_y - rook_start_y) / 10
-
-        def move_king(current_kx, current_ky):
-            if current_kx != king_target_x or current_ky != king_target_y:
-                current_kx += king_dx
-                current_ky += king_dy
-                self.canvas.coords(king_item, current_kx, current_ky)
-                self.root.after(10, move_king, current_kx, current_ky)
+        total_steps = 10
+        king_dx = (king_target_x - king_start_x) / total_steps
+        rook_dx = (rook_target_x - rook_start_x) / total_steps
+
+        # King and rook only slide along the rank, so only x changes
+        def move_pieces(step):
+            if step < total_steps:
+                self.canvas.coords(king_item, king_start_x + step * king_dx, king_start_y)
+                self.canvas.coords(rook_item, rook_start_x + step * rook_dx, rook_start_y)
+                self.root.after(self.animation_speed, move_pieces, step + 1)
             else:
+                # finalize_move hands the items over to their new squares
                 self.canvas.coords(king_item, king_target_x, king_target_y)
-                self.piece_items[(to_row, to_col)] = king_item
-                self.board.set_piece(to_row, to_col, king_piece)
-                self.board.set_piece(from_row, from_col, '.')
-
-        def move_rook(current_rx, current_ry):
-            if current_rx != rook_target_x or current_ry != rook_target_y:
-                current_rx += rook_dx
-                current_ry += rook_dy
-                self.canvas.coords(rook_item, current_rx, current_ry)
-                self.root.after(10, move_rook, current_rx, current_ry)
-            else:
                 self.canvas.coords(rook_item, rook_target_x, rook_target_y)
-                self.piece_items[(to_row, rook_to_col)] = rook_item
-                self.board.set_piece(to_row, rook_to_col, rook_piece)
-                self.board.set_piece(from_row, rook_from_col, '.')
-        move_king(king_start_x, king_start_y)
-        move_rook(rook_start_x, rook_start_y)
-
-    def update_canvas(self):
-        self.canvas.delete("all")
-        self.draw_board()
-        self.draw_pieces()
+        move_pieces(0)
+
+    def play_ai_move(self):
+        if self.current_turn != self.ai_colour or self.ai_search is not None:
+            return  # Taken back before the engine got to move, or already thinking
+        if self.redo_moves:
+            # After a takeback, replay the engine's earlier move rather than search again
+            self.make_move(self.redo_moves[-1])
+            return
+        # The engine searches a copy in a worker thread, so the board on screen never changes under it
+        # and the window keeps redrawing; poll_ai_move plays its move from the Tk thread
+        board, move_generator = deserialise_position(serialise_position(self.board, self.move_generator))
+        self.ai_search = self.ai_executor.submit(self.engine.search, board, move_generator)
+        self.root.after(50, self.poll_ai_move)
+
+    def poll_ai_move(self):
+        if not self.ai_search.done():
+            self.root.after(50, self.poll_ai_move)
+            return
+        move = self.ai_search.result()
+        self.ai_search = None
+        if move and not self.closing:
+            self.make_move(move)
+
+    def undo(self, event=None):
+        # Against the engine, go back to the player's previous turn
+        if self.moving or self.ai_search is not None or not self.moves_played:
+            return
+        self.take_back()
+        if self.current_turn == self.ai_colour:
+            if self.moves_played:
+                self.take_back()
+            else:
+                self.root.after(50, self.play_ai_move)
+        if self.analysis:
+            self.analysis.analyse(self.board, self.move_generator)
+
+    def redo(self, event=None):
+        if self.moving or self.ai_search is not None or not self.redo_moves or self.current_turn == self.ai_colour:
+            return
+        self.selected_piece = None
+        self.remove_highlights()
+        self.make_move(self.redo_moves[-1])
+
+    def take_back(self):
+        # The board restores the position and its repetition counts; redraw the squares involved
+        move = self.moves_played.pop()
+        piece = self.board.get_piece(move[2], move[3])
+        self.board.undo_move()
+        self.redo_moves.append(move)
+        self.update_canvas(self.move_squares(move, piece))
+        self.switch_turn()
+        self.selected_piece = None
+        self.remove_highlights()
+        if self.moves_played:
+            self.highlight_prev_move(self.moves_played[-1])
+        else:
+            self.remove_prev_move()
 
     def switch_turn(self):
         self.current_turn = 'black' if self.current_turn == 'white' else 'white'
-        self.board.update_board_state()
 
     def show_game_over(self, result):
         messagebox.showinfo("Game Over", result)
@@ -365,13 +448,6 @@ class ChessUI:
         # Function to start Human vs Human game
         def start_human_vs_human():
             selection_window.destroy()  # Close the selection window
-            self.setup_canvas()  # Initialize the chess UI
-            self.load_images()
-            self.draw_board()
-            self.draw_pieces()
-            # Position the main window at top-left corner
-            self.root.geometry(f"{self.screen_width}x{self.screen_height}+0+0")
-            self.root.deiconify()  # Show the main window
 
         # Function to handle Human vs AI selection
         def start_human_vs_ai():
@@ -383,23 +459,26 @@ class ChessUI:
             color_window.grab_set()
             self.center_window(color_window, 300, 200)
 
-            def show_coming_soon():
-                messagebox.showinfo("Coming Soon", "AI functionality is coming soon!")
+            def play_as(colour):
+                self.ai_colour = 'black' if colour == 'white' else 'white'
                 color_window.destroy()
-                selection_window.deiconify()
+                selection_window.destroy()
+                if self.current_turn == self.ai_colour:
+                    self.root.after(50, self.play_ai_move)
 
             # Button for playing as white
-            white_button = tk.Button(color_window, text="Play as White", command=show_coming_soon, width=15)
+            white_button = tk.Button(color_window, text="Play as White", command=lambda: play_as('white'), width=15)
             white_button.pack(pady=10)
 
             # Button for playing as black
-            black_button = tk.Button(color_window, text="Play as Black", command=show_coming_soon, width=15)
+            black_button = tk.Button(color_window, text="Play as Black", command=lambda: play_as('black'), width=15)
             black_button.pack(pady=10)
 
-        # Function to handle Analyse selection
+        # Function to handle Analyse selection: both sides are played on the board
+        # while the engine analyses in the background
         def start_analyse():
-            messagebox.showinfo("Coming Soon", "Analyse functionality is coming soon!")
-            selection_window.deiconify()
+            selection_window.destroy()
+            self.start_analysis()
 
         # Create buttons for each game mode
         human_vs_human_button = tk.Button(selection_window, text="Human vs Human", command=start_human_vs_human, width=20)
@@ -411,6 +490,41 @@ class ChessUI:
         analyse_button = tk.Button(selection_window, text="Analyse", command=start_analyse, width=20)
         analyse_button.pack(pady=10)
 
+    def start_analysis(self):
+        self.analysis_label = tk.Label(self.root, text="Analysing...", anchor='w', justify=tk.LEFT,
+                                       font=("Courier", 11), height=2)
+        self.analysis_label.pack(side=tk.BOTTOM, fill=tk.X, before=self.canvas)
+        self.root.geometry(f"{self.screen_width}x{self.screen_height + 40}")
+        self.analysis = AnalysisWorker()
+        self.analysis.analyse(self.board, self.move_generator)
+        self.root.after(100, self.poll_analysis)
+
+    def poll_analysis(self):
+        # Runs on the Tk thread every 100 ms; never waits for the worker
+        for update in self.analysis.poll():
+            if 'bestmove' in update:
+                self.analysis_label.config(text=f"{self.analysis_label.cget('text')}\nbest move {update['bestmove']}")
+            else:
+                self.analysis_label.config(text=self.format_analysis(update))
+        self.root.after(100, self.poll_analysis)
+
+    def format_analysis(self, update):
+        score = update['score'] if self.current_turn == 'white' else -update['score']  # White's point of view
+        if abs(score) >= MATE_SCORE - MAX_PLY:
+            moves = (MATE_SCORE - abs(score) + 1) // 2
+            score_text = f"#{moves}" if score > 0 else f"#-{moves}"
+        else:
+            score_text = f"{score / 100:+.2f}"
+        return (f"depth {update['depth']}  {score_text}  {update['nodes']:,} nodes  {update['nps']:,.0f} nps\n"
+                f"{' '.join(update['pv'])}")
+
+    def close(self):
+        self.closing = True  # Also stops a search in progress
+        self.ai_executor.shutdown(wait=True)
+        if self.analysis:
+            self.analysis.close()
+        self.root.destroy()
+
     def center_window(self, window, width, height):
         # Function to center a window on the screen
         screen_width = window.winfo_screenwidth()
@@ -442,11 +556,8 @@ class ChessUI:
         button_frame.rowconfigure(0, weight=1)
         button_frame.rowconfigure(1, weight=1)
 
-        # Load and display images for promotion choices
-        promotion_pieces = {'Q': 'white-queen.png', 'R': 'white-rook.png',
-                            'B': 'white-bishop.png', 'N': 'white-knight.png'}
-        if piece.islower():  # Adjust image paths for black pieces
-            promotion_pieces = {key.lower(): value.replace('white', 'black') for key, value in promotion_pieces.items()}
+        # Display the promotion choices, from the sprite cache
+        promotion_pieces = 'QRBN' if piece.isupper() else 'qrbn'
 
         # Variable to store the selected piece
         selected_piece_var = tk.StringVar()
@@ -459,12 +570,9 @@ class ChessUI:
         # Create buttons with images in a grid
         row_idx = 0
         col_idx = 0
-        for idx, (piece_key, image_name) in enumerate(promotion_pieces.items()):
-            image_path = os.path.join("images", image_name)
-            if os.path.exists(image_path):
-                pil_image = Image.open(image_path)
-                scaled_image = pil_image.resize((110, 110), Image.Resampling.LANCZOS)
-                img = ImageTk.PhotoImage(scaled_image)
+        for piece_key in promotion_pieces:
+            img = self.sprites.photo(piece_key, 110)
+            if img is not None:
                 btn = tk.Button(button_frame, image=img, command=lambda p=piece_key: promote_and_remove(p),
                                 borderwidth=0, highlightthickness=0, height=128, width=128)
                 btn.image = img  # Keep a reference to avoid garbage collection
@@ -473,8 +581,6 @@ class ChessUI:
                 if col_idx >= 2:
                     col_idx = 0
                     row_idx += 1
-            else:
-                print(f"Warning: Missing promotion image at {image_path}")
 
         # Wait for the user to select a promotion piece
         self.root.wait_variable(selected_piece_var)
@@ -486,6 +592,8 @@ class ChessUI:
         return move
 
 
+profiling.register(ChessUI, 'on_canvas_click', 'make_move')
+
 
 if __name__ == '__main__':
     root = tk.Tk()
@@ -0,0 +1,285 @@
+"""Compact board backend for hosting many games in one process.
+
+``CompactBoard`` has the same API as ``Board`` but keeps a game in a few
+flat buffers instead of nested lists, tuples and dicts:
+
+- ``squares``: a 64-byte ``bytearray`` mailbox of ASCII piece letters;
+- ``state``: one small int holding the six castling flags (the layout of
+  ``Board.get_castling_flags``), the en passant file and the side to move;
+- ``undo_moves``/``undo_keys``: one packed 64-bit word and the previous key
+  per move made, in ``array('Q')`` buffers;
+- ``history``: a ``PositionHistory`` of the Zobrist keys, with the
+  repetition counts since the last capture or pawn move.
+
+The class uses ``__slots__``, so instances carry no ``__dict__``. King
+positions, castling flags, the en passant square and the side to move are
+properties over these fields, so ``MoveGenerator`` works unchanged.
+
+Packed undo word layout (bit ranges):
+    0-15   move (see moves.encode_move)
+    16-23  captured piece letter
+    24-34  state before the move
+    35-    half-move clock before the move
+"""
+from array import array
+
+import profiling
+import zobrist
+from board import Board, parse_fen
+from evaluation import PIECE_VALUES
+from history import PositionHistory
+from moves import decode_move, encode_move
+
+EMPTY = ord('.')
+# Bits of CompactBoard.state above the castling flags
+EN_PASSANT_SHIFT = 6  # En passant file + 1, 0 if there is none
+EN_PASSANT_MASK = 15 << EN_PASSANT_SHIFT
+BLACK_TO_MOVE = 1 << 10
+CASTLING_MASK = 63
+PROMOTED_PAWN = {ord(piece): ord('P' if piece.isupper() else 'p') for piece in 'NBRQnbrq'}
+# Corner square -> castling flag cleared when a rook leaves or is captured on it
+ROOK_FLAGS = {56: 4, 0: 8, 63: 16, 7: 32}
+START_SQUARES = (b'rnbqkbnr' b'pppppppp' + b'.' * 32 + b'PPPPPPPP' b'RNBQKBNR')
+
+
+def _flag(bit):
+    """Property exposing one castling flag bit of ``state`` as a boolean attribute."""
+    def get(self):
+        return bool(self.state & bit)
+
+    def set(self, value):
+        self.state = self.state | bit if value else self.state & ~bit
+    return property(get, set)
+
+
+class CompactBoard:
+    __slots__ = ('squares', 'state', 'ply_count', 'zobrist_key', 'start_ply', 'undo_moves', 'undo_keys',
+                 'history', 'move_generator')
+
+    debug_zobrist = zobrist.DEBUG
+
+    white_king_has_moved = _flag(1)
+    black_king_has_moved = _flag(2)
+    white_rook1_has_moved = _flag(4)
+    black_rook1_has_moved = _flag(8)
+    white_rook2_has_moved = _flag(16)
+    black_rook2_has_moved = _flag(32)
+
+    def __init__(self):
+        self.squares = bytearray(START_SQUARES)
+        self.state = 0
+        self.ply_count = 0
+        self.start_ply = 0  # Plies played before the position was set up, for the FEN move number
+        self.undo_moves = array('Q')
+        self.undo_keys = array('Q')
+        self.move_generator = None  # Generator passed to the last make_move, resynced by undo_move
+        self.zobrist_key = zobrist.compute_key(self)
+        self.history = PositionHistory(self.zobrist_key)  # Key of every position, for repetitions
+
+    # Shared with the list backend: they only use the public attributes
+    from_fen = Board.__dict__['from_fen']
+    to_fen = Board.to_fen
+    print_board = Board.print_board
+    verify_zobrist = Board.verify_zobrist
+    is_valid_move = Board.is_valid_move
+    check_game_state = Board.check_game_state
+    is_50_move_rule = Board.is_50_move_rule
+    is_tablebase_draw = Board.is_tablebase_draw
+    get_board_state = Board.get_board_state
+    is_threefold_repetition = Board.is_threefold_repetition
+
+    def set_fen(self, fen):
+        """Set up the position, castling rights, en passant square, clocks and side to move from a FEN string."""
+        squares, flags, turn, en_passant, self.ply_count, self.start_ply = parse_fen(fen)
+        self.load_placement(squares)
+        self.state = flags
+        self.turn = turn
+        self.en_passant = en_passant
+        self.undo_moves = array('Q')
+        self.undo_keys = array('Q')
+        self.zobrist_key = zobrist.compute_key(self)
+        self.history = PositionHistory(self.zobrist_key)
+
+    def load_placement(self, squares):
+        """Replace every piece from a 64-character string, '.' for empty, without updating the key."""
+        self.squares[:] = squares.encode('ascii')
+
+    @property
+    def board(self):
+        """List-of-lists view of the position, matching ``Board.board``."""
+        squares = self.squares.decode('ascii')
+        return [list(squares[row * 8:row * 8 + 8]) for row in range(8)]
+
+    def pieces(self, colour):
+        """(square, piece) of every piece of one colour, like ``Board.pieces``; found by scanning the mailbox."""
+        is_black = colour == 'black'
+        return [(sq, chr(piece)) for sq, piece in enumerate(self.squares)
+                if piece != EMPTY and chr(piece).islower() == is_black]
+
+    @property
+    def material(self):
+        """Piece values without the king per colour, in centipawns, like ``Board.material``."""
+        squares = self.squares
+        return {'white': sum(PIECE_VALUES[kind] * squares.count(kind.upper().encode()) for kind in 'pnbrq'),
+                'black': sum(PIECE_VALUES[kind] * squares.count(kind.encode()) for kind in 'pnbrq')}
+
+    @property
+    def white_king(self):
+        sq = self.squares.find(b'K')
+        return (sq >> 3, sq & 7, 'K') if sq >= 0 else None
+
+    @property
+    def black_king(self):
+        sq = self.squares.find(b'k')
+        return (sq >> 3, sq & 7, 'k') if sq >= 0 else None
+
+    @property
+    def turn(self):
+        return 'black' if self.state & BLACK_TO_MOVE else 'white'
+
+    @turn.setter
+    def turn(self, colour):
+        self.state = self.state | BLACK_TO_MOVE if colour == 'black' else self.state & ~BLACK_TO_MOVE
+
+    @property
+    def en_passant(self):
+        """Square behind a pawn that just moved two squares; its row follows from the side to move."""
+        file = (self.state & EN_PASSANT_MASK) >> EN_PASSANT_SHIFT
+        if not file:
+            return None
+        return (5 if self.state & BLACK_TO_MOVE else 2, file - 1)
+
+    @en_passant.setter
+    def en_passant(self, square):
+        self.state = self.state & ~EN_PASSANT_MASK | (square[1] + 1 << EN_PASSANT_SHIFT if square else 0)
+
+    @property
+    def undo_stack(self):
+        """One packed record per move made; only its length is part of the shared board API."""
+        return self.undo_moves
+
+    def get_castling_flags(self):
+        return self.state & CASTLING_MASK
+
+    def set_castling_flags(self, flags):
+        self.state = self.state & ~CASTLING_MASK | flags
+
+    def get_piece(self, row, col):
+        """Return the piece at a specific board position."""
+        return chr(self.squares[row * 8 + col])
+
+    def set_piece(self, row, col, piece):
+        """Set a piece at a specific board position."""
+        sq = row * 8 + col
+        old_piece = chr(self.squares[sq])
+        if old_piece != '.':
+            self.zobrist_key ^= zobrist.PIECE_KEYS[old_piece][sq]
+        if piece != '.':
+            self.zobrist_key ^= zobrist.PIECE_KEYS[piece][sq]
+        self.squares[sq] = ord(piece)
+
+    def make_move(self, move, move_generator):
+        """Make a move on the board."""
+        if not self.is_valid_move(move):
+            raise ValueError("Invalid move")
+
+        from_row, from_col, to_row, to_col, *e = move
+        from_sq = from_row * 8 + from_col
+        to_sq = to_row * 8 + to_col
+        squares = self.squares
+        piece = chr(squares[from_sq])
+        captured_piece = chr(squares[to_sq])
+        state = self.state
+
+        self.undo_moves.append(encode_move(move) | squares[to_sq] << 16 | state << 24 | self.ply_count << 35)
+        self.undo_keys.append(self.zobrist_key)
+        self.move_generator = move_generator
+        move_generator.clear_en_pass()
+
+        piece_keys = zobrist.PIECE_KEYS
+        key = self.zobrist_key ^ zobrist.CASTLING_KEYS[zobrist.castling_rights(self)]
+        if state & EN_PASSANT_MASK:
+            key ^= zobrist.EN_PASSANT_KEYS[((state & EN_PASSANT_MASK) >> EN_PASSANT_SHIFT) - 1]
+            state &= ~EN_PASSANT_MASK
+        key ^= piece_keys[piece][from_sq] ^ piece_keys[piece][to_sq]
+        if captured_piece != '.':
+            key ^= piece_keys[captured_piece][to_sq]
+        squares[to_sq] = squares[from_sq]
+        squares[from_sq] = EMPTY
+
+        kind = piece.lower()
+        if kind == 'p':
+            if e:
+                squares[to_sq] = ord(e[0])
+                key ^= piece_keys[piece][to_sq] ^ piece_keys[e[0]][to_sq]
+            if from_col != to_col and captured_piece == '.':
+                # En passant: the captured pawn stands beside the moving one
+                taken_sq = from_row * 8 + to_col
+                key ^= piece_keys[chr(squares[taken_sq])][taken_sq]
+                squares[taken_sq] = EMPTY
+            if abs(from_row - to_row) == 2:
+                move_generator.generate_en_pass_moves(to_row, to_col, piece)
+                state |= to_col + 1 << EN_PASSANT_SHIFT
+                key ^= zobrist.EN_PASSANT_KEYS[to_col]
+        elif kind == 'k':
+            state |= 1 if piece == 'K' else 2
+            if abs(to_col - from_col) == 2:
+                rook_from, rook_to = (from_sq + 3, from_sq + 1) if to_col == 6 else (from_sq - 4, from_sq - 1)
+                rook = chr(squares[rook_from])
+                key ^= piece_keys[rook][rook_from] ^ piece_keys[rook][rook_to]
+                squares[rook_to] = squares[rook_from]
+                squares[rook_from] = EMPTY
+                state |= ROOK_FLAGS.get(rook_from, 0)
+        elif kind == 'r':
+            state |= ROOK_FLAGS.get(from_sq, 0)
+        if captured_piece.lower() == 'r':
+            state |= ROOK_FLAGS.get(to_sq, 0)
+
+        # Half-move clock for the 50 move rule: reset by pawn moves and captures
+        self.ply_count = 0 if kind == 'p' or captured_piece != '.' else self.ply_count + 1
+        self.state = state ^ BLACK_TO_MOVE
+        self.zobrist_key = key ^ zobrist.CASTLING_KEYS[zobrist.castling_rights(self)] ^ zobrist.SIDE_KEY
+        if self.debug_zobrist:
+            self.verify_zobrist()
+        self.history.push(self.zobrist_key, self.ply_count == 0)
+        return captured_piece
+
+    def undo_move(self):
+        """Take back the last move made with make_move."""
+        word = self.undo_moves.pop()
+        self.zobrist_key = self.undo_keys.pop()
+        self.history.pop()
+        move = decode_move(word & 0xFFFF)
+        captured = (word >> 16) & 0xFF
+        self.state = (word >> 24) & 0x7FF
+        self.ply_count = word >> 35
+
+        from_row, from_col, to_row, to_col = move[:4]
+        from_sq = from_row * 8 + from_col
+        to_sq = to_row * 8 + to_col
+        squares = self.squares
+        piece = squares[to_sq]
+        if len(move) == 5:
+            piece = PROMOTED_PAWN[piece]
+        squares[from_sq] = piece
+        squares[to_sq] = captured
+
+        kind = chr(piece).lower()
+        if kind == 'p' and from_col != to_col and captured == EMPTY:
+            squares[from_row * 8 + to_col] = ord('p' if piece == ord('P') else 'P')
+        elif kind == 'k' and abs(to_col - from_col) == 2:
+            rook_from, rook_to = (from_sq + 3, from_sq + 1) if to_col == 6 else (from_sq - 4, from_sq - 1)
+            squares[rook_from] = squares[rook_to]
+            squares[rook_to] = EMPTY
+        self.move_generator.sync_en_passant()
+        if self.debug_zobrist:
+            self.verify_zobrist()
+
+    def has_insufficient_material(self):
+        pieces = self.squares.replace(b'.', b'').lower()
+        if pieces == b'kk':
+            return True
+        return len(pieces) == 3 and (b'b' in pieces or b'n' in pieces)
+
+
+profiling.register(CompactBoard, 'make_move', 'undo_move', 'check_game_state')
@@ -0,0 +1,314 @@
+"""Negamax alpha-beta search with iterative deepening.
+
+    python engine.py --time 5
+    python engine.py --book book.bin
+    python engine.py --depth 4 --fen "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1"
+"""
+import argparse
+import time
+
+import profiling
+import tablebase
+from evaluation import PIECE_VALUES, evaluate
+from moves import move_to_uci
+from transposition import EXACT, LOWER, UPPER, TranspositionTable
+
+MATE_SCORE = 100000
+INFINITY = 1000000
+MAX_PLY = 128
+
+
+class SearchAborted(Exception):
+    """Raised inside the search when the time or node budget runs out."""
+
+
+def format_info(info):
+    """Format one iteration's report in the style of a UCI info line."""
+    score = info['score']
+    if abs(score) >= MATE_SCORE - MAX_PLY:
+        plies = MATE_SCORE - abs(score)
+        score_text = f"mate {(plies + 1) // 2 if score > 0 else -((plies + 1) // 2)}"
+    else:
+        score_text = f"cp {score}"
+    pv = ' '.join(move_to_uci(move) for move in info['pv'])
+    return (f"depth {info['depth']} score {score_text} nodes {info['nodes']} "
+            f"nps {info['nps']:.0f} hashfull {info['hashfull']} time {info['time']:.2f} pv {pv}")
+
+
+def score_to_tt(score, ply):
+    """Store mate scores relative to the node rather than the root."""
+    if score >= MATE_SCORE - MAX_PLY:
+        return score + ply
+    if score <= -MATE_SCORE + MAX_PLY:
+        return score - ply
+    return score
+
+
+def score_from_tt(score, ply):
+    if score >= MATE_SCORE - MAX_PLY:
+        return score - ply
+    if score <= -MATE_SCORE + MAX_PLY:
+        return score + ply
+    return score
+
+
+class Engine:
+    def __init__(self, max_depth=64, time_limit=None, node_limit=None, info_callback=None, tt_size_mb=16,
+                 book=None, tablebases=None):
+        self.max_depth = max_depth
+        self.time_limit = time_limit  # Seconds per search
+        self.node_limit = node_limit
+        self.info_callback = info_callback
+        self.stop_check = None  # Callable polled with the limits; the search stops once it returns True
+        self.book = book  # book.OpeningBook consulted before searching, or None
+        # Endgame tables probed at the root and in the tree; the installed ones by default
+        self.tablebases = tablebases if tablebases is not None else tablebase.open_default()
+
+        self.nodes = 0
+        self.iterations = []
+        self.pv_table = [[] for _ in range(MAX_PLY + 1)]
+        self.previous_pv = []
+        self.killers = [[None, None] for _ in range(MAX_PLY + 1)]
+        self.tt = TranspositionTable(tt_size_mb)
+
+    def new_game(self):
+        """Forget everything learned about the previous game's positions."""
+        self.tt.clear()
+
+    def search(self, board, move_generator, max_depth=None, time_limit=None, node_limit=None):
+        """Search the position and return the best move, or None if there is no legal move."""
+        max_depth = max_depth or self.max_depth
+        self.start_search(time_limit, node_limit)
+        if self.book is not None:
+            move = self.book.choose(board, move_generator)
+            if move is not None:
+                return move
+        if self.tablebases is not None:
+            move = self.tablebases.best_move(board, move_generator)
+            if move is not None:
+                return move
+
+        moves = move_generator.generate_legal_moves(board.turn)
+        if not moves:
+            return None
+        best_move = moves[0]
+        root_stack_size = len(board.undo_stack)
+
+        for depth in range(1, max_depth + 1):
+            try:
+                score = self.negamax(board, move_generator, depth, -INFINITY, INFINITY, 0)
+            except SearchAborted:
+                # Unwind the moves the interrupted iteration left on the board
+                while len(board.undo_stack) > root_stack_size:
+                    board.undo_move()
+                break
+
+            self.previous_pv = list(self.pv_table[0])
+            if self.previous_pv:
+                best_move = self.previous_pv[0]
+            elapsed = time.perf_counter() - self.start_time
+            info = {
+                'depth': depth,
+                'score': score,
+                'nodes': self.nodes,
+                'time': elapsed,
+                'nps': self.nodes / elapsed if elapsed else 0,
+                'hashfull': self.tt.hashfull(),
+                'pv': self.previous_pv,
+            }
+            self.iterations.append(info)
+            if self.info_callback:
+                self.info_callback(info)
+
+            if abs(score) >= MATE_SCORE - MAX_PLY:
+                break  # A forced mate will not change with more depth
+            if self.deadline and time.perf_counter() > self.start_time + (self.deadline - self.start_time) / 2:
+                break  # The next iteration would not finish in the remaining time
+        return best_move
+
+    def start_search(self, time_limit=None, node_limit=None, age_table=True):
+        """Reset the counters and budgets before a new search.
+
+        ``age_table`` starts a new transposition table generation; a parallel
+        worker searching several root moves of one iteration passes False for
+        all but the first.
+        """
+        time_limit = time_limit if time_limit is not None else self.time_limit
+        self.node_limit = node_limit if node_limit is not None else self.node_limit
+        self.start_time = time.perf_counter()
+        self.deadline = self.start_time + time_limit if time_limit else None
+        self.nodes = 0
+        self.iterations = []
+        self.previous_pv = []
+        self.killers = [[None, None] for _ in range(MAX_PLY + 1)]
+        if age_table:
+            self.tt.new_search()
+
+    def check_limits(self):
+        if self.deadline and time.perf_counter() > self.deadline:
+            raise SearchAborted
+        if self.node_limit and self.nodes >= self.node_limit:
+            raise SearchAborted
+        if self.stop_check is not None and self.stop_check():
+            raise SearchAborted
+
+    def negamax(self, board, move_generator, depth, alpha, beta, ply):
+        self.nodes += 1
+        if self.nodes & 255 == 0:
+            self.check_limits()
+        self.pv_table[ply] = []
+
+        if ply > 0 and (board.ply_count >= 100 or board.history.repetitions() >= 2):
+            return 0  # Draw by the 50 move rule or by repeating a position
+        if ply > 0 and self.tablebases is not None:
+            result = self.tablebases.probe(board)
+            if result is not None:
+                outcome, plies = result
+                return outcome * (MATE_SCORE - ply - plies)
+        if depth <= 0 or ply >= MAX_PLY:
+            return self.quiescence(board, move_generator, alpha, beta, ply)
+
+        key = board.zobrist_key
+        entry = self.tt.probe(key)
+        tt_move = None
+        if entry is not None:
+            tt_depth, bound, tt_score, tt_move = entry
+            if ply > 0 and tt_depth >= depth:
+                tt_score = score_from_tt(tt_score, ply)
+                if bound == EXACT:
+                    return tt_score
+                if bound == LOWER and tt_score >= beta:
+                    return tt_score
+                if bound == UPPER and tt_score <= alpha:
+                    return tt_score
+
+        ct = board.turn
+        moves = move_generator.generate_legal_moves(ct)
+        if not moves:
+            return -MATE_SCORE + ply if move_generator.is_check(ct) else 0
+
+        original_alpha = alpha
+        best_score = -INFINITY
+        best_move = None
+        for move in self.order_moves(board, moves, ply, tt_move):
+            board.make_move(move, move_generator)
+            score = -self.negamax(board, move_generator, depth - 1, -beta, -alpha, ply + 1)
+            board.undo_move()
+
+            if score > best_score:
+                best_score = score
+                best_move = move
+            if score > alpha:
+                alpha = score
+                self.pv_table[ply] = [move] + self.pv_table[ply + 1]
+                if alpha >= beta:
+                    if not self.is_capture(board, move) and move != self.killers[ply][0]:
+                        self.killers[ply] = [move, self.killers[ply][0]]
+                    break
+
+        if best_score >= beta:
+            bound = LOWER
+        elif best_score > original_alpha:
+            bound = EXACT
+        else:
+            bound = UPPER
+        self.tt.store(key, depth, bound, score_to_tt(best_score, ply), best_move)
+        return best_score
+
+    def quiescence(self, board, move_generator, alpha, beta, ply):
+        """Search captures only, so the static evaluation is never taken mid-exchange."""
+        self.nodes += 1
+        if self.nodes & 255 == 0:
+            self.check_limits()
+        self.pv_table[ply] = []
+
+        stand_pat = evaluate(board)
+        if stand_pat >= beta or ply >= MAX_PLY:
+            return stand_pat
+        alpha = max(alpha, stand_pat)
+
+        captures = [move for move in move_generator.generate_legal_moves(board.turn) if self.is_capture(board, move)]
+        for move in self.order_moves(board, captures, ply):
+            board.make_move(move, move_generator)
+            score = -self.quiescence(board, move_generator, -beta, -alpha, ply + 1)
+            board.undo_move()
+            if score >= beta:
+                return score
+            if score > alpha:
+                alpha = score
+        return alpha
+
+    def is_capture(self, board, move):
+        """Captures, en passant and promotions all change material."""
+        from_row, from_col, to_row, to_col, *e = move
+        if e or board.get_piece(to_row, to_col) != '.':
+            return True
+        return from_col != to_col and board.get_piece(from_row, from_col).lower() == 'p'
+
+    def order_moves(self, board, moves, ply, tt_move=None):
+        """Hash move and previous principal variation first, then captures by MVV-LVA, then killer moves."""
+        pv_move = self.previous_pv[ply] if ply < len(self.previous_pv) else None
+        killers = self.killers[ply]
+        get_piece = board.get_piece
+
+        def score(move):
+            if move == tt_move:
+                return 200000
+            if move == pv_move:
+                return 100000
+            from_row, from_col, to_row, to_col, *promotion = move
+            victim = get_piece(to_row, to_col)
+            value = 0
+            if promotion:
+                value += PIECE_VALUES[promotion[0].lower()]
+            if victim != '.':
+                value += 10 * PIECE_VALUES[victim.lower()] - PIECE_VALUES[get_piece(from_row, from_col).lower()] // 10
+            if value:
+                return 10000 + value
+            if move == killers[0]:
+                return 9000
+            if move == killers[1]:
+                return 8000
+            return 0
+
+        return sorted(moves, key=score, reverse=True)
+
+
+profiling.register(Engine, 'search')
+
+
+def main():
+    from book import OpeningBook
+    from perft import BACKENDS, START_FEN, load_fen
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--fen', default=START_FEN)
+    parser.add_argument('--depth', type=int, default=64)
+    parser.add_argument('--time', type=float, default=None, help="seconds to search")
+    parser.add_argument('--nodes', type=int, default=None, help="node budget")
+    parser.add_argument('--backend', choices=sorted(BACKENDS), default='list')
+    parser.add_argument('--hash', type=int, default=16, help="transposition table size in MB")
+    parser.add_argument('--book', help="Polyglot opening book to play from before searching")
+    parser.add_argument('--tablebases', help="tablebase file (default: $CHESS_TABLEBASES or tablebases.bin, if present)")
+    args = parser.parse_args()
+    if args.time is None and args.nodes is None and args.depth == 64:
+        args.time = 5
+
+    board, move_generator = load_fen(args.fen, args.backend)
+    book = OpeningBook(args.book) if args.book else None
+    tablebases = tablebase.Tablebases(args.tablebases) if args.tablebases else None
+    engine = Engine(info_callback=lambda info: print(format_info(info), flush=True), tt_size_mb=args.hash,
+                    book=book, tablebases=tablebases)
+    best_move = engine.search(board, move_generator, args.depth, args.time, args.nodes)
+    if book is not None:
+        book.close()
+    if best_move and not engine.iterations:
+        print("book or tablebase move, no search")
+    stats = engine.tt.stats()
+    print(f"hash: {stats['hit_rate']:.1%} hits, {stats['collision_rate']:.1%} collisions, "
+          f"{stats['fill']:.1%} full")
+    print(f"bestmove {move_to_uci(best_move) if best_move else '(none)'}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""Streaming reader for EPD and FEN files.
+
+Lines are read and parsed one at a time, so test suites of any size can be
+iterated without loading them into memory. Files ending in ``.gz``, ``.bz2``
+or ``.xz`` are decompressed on the fly.
+
+    for fen, opcodes in read_epd('wac.epd'):
+        board = Board.from_fen(fen)
+        print(opcodes.get('id'), opcodes.get('bm'))
+"""
+import bz2
+import gzip
+import lzma
+import re
+
+OPENERS = {'.gz': gzip.open, '.bz2': bz2.open, '.xz': lzma.open}
+
+# Opcodes whose operands are a list of moves; every other opcode maps to one string
+MOVE_LIST_OPCODES = {'am', 'bm', 'pm', 'pv', 'sm'}
+
+OPERATION = re.compile(r'\s*([A-Za-z][A-Za-z0-9_]*)((?:\s+(?:"[^"]*"|[^\s;"]+))*)\s*(?:;|$)')
+SEPARATOR = re.compile(r'[\s;]*')
+OPERAND = re.compile(r'"([^"]*)"|([^\s;"]+)')
+
+
+def parse_epd(line):
+    """Split one EPD or FEN line into (fen, opcodes).
+
+    The FEN always has all six fields; EPD lines take the clocks from their
+    ``hmvc`` and ``fmvn`` opcodes when present.
+    """
+    fields = line.split(None, 4)
+    if len(fields) < 4:
+        raise ValueError(f"Not an EPD or FEN line: {line!r}")
+    rest = fields[4] if len(fields) > 4 else ''
+    clocks = rest.split(None, 2)
+    if len(clocks) >= 2 and clocks[0].isdigit() and clocks[1].isdigit():
+        # A full FEN, possibly followed by operations
+        halfmove, fullmove = clocks[0], clocks[1]
+        rest = clocks[2] if len(clocks) > 2 else ''
+    else:
+        halfmove, fullmove = '0', '1'
+
+    opcodes = {}
+    position = 0
+    while True:
+        position = SEPARATOR.match(rest, position).end()
+        if position == len(rest):
+            break
+        match = OPERATION.match(rest, position)
+        if match is None or match.end() == position:
+            raise ValueError(f"Malformed EPD operations: {rest[position:]!r}")
+        position = match.end()
+        opcode = match.group(1)
+        operands = [operand.group(1) if operand.group(1) is not None else operand.group(2)
+                    for operand in OPERAND.finditer(match.group(2))]
+        opcodes[opcode] = operands if opcode in MOVE_LIST_OPCODES else ' '.join(operands)
+
+    halfmove = opcodes.get('hmvc', halfmove)
+    fullmove = opcodes.get('fmvn', fullmove)
+    return ' '.join(fields[:4] + [halfmove, fullmove]), opcodes
+
+
+def open_lines(path):
+    """Open a text file for reading, decompressing it if its suffix asks for it; a UTF-8 BOM is skipped."""
+    for suffix, opener in OPENERS.items():
+        if str(path).endswith(suffix):
+            return opener(path, 'rt', encoding='utf-8-sig', errors='replace')
+    return open(path, encoding='utf-8-sig', errors='replace')
+
+
+def read_epd(source):
+    """Yield (fen, opcodes) for every position in a file path or an iterable of lines.
+
+    Blank lines and lines starting with '#' are skipped.
+    """
+    if isinstance(source, str) or hasattr(source, '__fspath__'):
+        with open_lines(source) as lines:
+            yield from read_epd(lines)
+        return
+    for line in source:
+        line = line.strip()
+        if line and not line.startswith('#'):
+            yield parse_epd(line)
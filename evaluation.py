@@ -0,0 +1,184 @@
+"""Static evaluation: material, piece-square tables, mobility and king safety.
+
+Scores are in centipawns from White's point of view unless stated otherwise.
+Tables are written from White's side with row 0 being the 8th rank, the same
+orientation as ``Board.board``; Black uses them mirrored vertically.
+"""
+
+PIECE_VALUES = {'p': 100, 'n': 320, 'b': 330, 'r': 500, 'q': 900, 'k': 0}
+
+PIECE_SQUARE_TABLES = {
+    'p': [
+        0, 0, 0, 0, 0, 0, 0, 0,
+        50, 50, 50, 50, 50, 50, 50, 50,
+        10, 10, 20, 30, 30, 20, 10, 10,
+        5, 5, 10, 25, 25, 10, 5, 5,
+        0, 0, 0, 20, 20, 0, 0, 0,
+        5, -5, -10, 0, 0, -10, -5, 5,
+        5, 10, 10, -20, -20, 10, 10, 5,
+        0, 0, 0, 0, 0, 0, 0, 0,
+    ],
+    'n': [
+        -50, -40, -30, -30, -30, -30, -40, -50,
+        -40, -20, 0, 0, 0, 0, -20, -40,
+        -30, 0, 10, 15, 15, 10, 0, -30,
+        -30, 5, 15, 20, 20, 15, 5, -30,
+        -30, 0, 15, 20, 20, 15, 0, -30,
+        -30, 5, 10, 15, 15, 10, 5, -30,
+        -40, -20, 0, 5, 5, 0, -20, -40,
+        -50, -40, -30, -30, -30, -30, -40, -50,
+    ],
+    'b': [
+        -20, -10, -10, -10, -10, -10, -10, -20,
+        -10, 0, 0, 0, 0, 0, 0, -10,
+        -10, 0, 5, 10, 10, 5, 0, -10,
+        -10, 5, 5, 10, 10, 5, 5, -10,
+        -10, 0, 10, 10, 10, 10, 0, -10,
+        -10, 10, 10, 10, 10, 10, 10, -10,
+        -10, 5, 0, 0, 0, 0, 5, -10,
+        -20, -10, -10, -10, -10, -10, -10, -20,
+    ],
+    'r': [
+        0, 0, 0, 0, 0, 0, 0, 0,
+        5, 10, 10, 10, 10, 10, 10, 5,
+        -5, 0, 0, 0, 0, 0, 0, -5,
+        -5, 0, 0, 0, 0, 0, 0, -5,
+        -5, 0, 0, 0, 0, 0, 0, -5,
+        -5, 0, 0, 0, 0, 0, 0, -5,
+        -5, 0, 0, 0, 0, 0, 0, -5,
+        0, 0, 0, 5, 5, 0, 0, 0,
+    ],
+    'q': [
+        -20, -10, -10, -5, -5, -10, -10, -20,
+        -10, 0, 0, 0, 0, 0, 0, -10,
+        -10, 0, 5, 5, 5, 5, 0, -10,
+        -5, 0, 5, 5, 5, 5, 0, -5,
+        0, 0, 5, 5, 5, 5, 0, -5,
+        -10, 5, 5, 5, 5, 5, 0, -10,
+        -10, 0, 5, 0, 0, 0, 0, -10,
+        -20, -10, -10, -5, -5, -10, -10, -20,
+    ],
+    'k': [
+        -30, -40, -40, -50, -50, -40, -40, -30,
+        -30, -40, -40, -50, -50, -40, -40, -30,
+        -30, -40, -40, -50, -50, -40, -40, -30,
+        -30, -40, -40, -50, -50, -40, -40, -30,
+        -20, -30, -30, -40, -40, -30, -30, -20,
+        -10, -20, -20, -20, -20, -20, -20, -10,
+        20, 20, 0, 0, 0, 0, 20, 20,
+        20, 30, 10, 0, 0, 10, 30, 20,
+    ],
+}
+
+
+# Centipawns per square a piece can move to (empty or enemy-occupied)
+MOBILITY_WEIGHTS = {'n': 4, 'b': 5, 'r': 3, 'q': 1}
+# Centipawns per own pawn on the three squares in front of the king
+PAWN_SHIELD_BONUS = 10
+
+ORTHOGONAL = ((1, 0), (-1, 0), (0, 1), (0, -1))
+DIAGONAL = ((1, 1), (1, -1), (-1, 1), (-1, -1))
+KNIGHT_JUMPS = ((2, 1), (2, -1), (-2, 1), (-2, -1), (1, 2), (1, -2), (-1, 2), (-1, -2))
+
+
+def _build_rays(directions):
+    """Squares along each direction from every square, nearest first."""
+    rays = []
+    for sq in range(64):
+        square_rays = []
+        for dr, dc in directions:
+            ray = []
+            r, c = sq // 8 + dr, sq % 8 + dc
+            while 0 <= r < 8 and 0 <= c < 8:
+                ray.append(r * 8 + c)
+                r += dr
+                c += dc
+            square_rays.append(ray)
+        rays.append(square_rays)
+    return rays
+
+
+def _build_jumps(offsets):
+    return [[(sq // 8 + dr) * 8 + sq % 8 + dc for dr, dc in offsets
+             if 0 <= sq // 8 + dr < 8 and 0 <= sq % 8 + dc < 8] for sq in range(64)]
+
+
+ORTHOGONAL_RAYS = _build_rays(ORTHOGONAL)
+DIAGONAL_RAYS = _build_rays(DIAGONAL)
+KNIGHT_SQUARES = _build_jumps(KNIGHT_JUMPS)
+# White's shield is the row above the king (towards row 0), Black's the row below
+PAWN_SHIELD_SQUARES = {
+    'K': _build_jumps(((-1, -1), (-1, 0), (-1, 1))),
+    'k': _build_jumps(((1, -1), (1, 0), (1, 1))),
+}
+SLIDER_RAYS = {
+    'b': lambda sq: DIAGONAL_RAYS[sq],
+    'r': lambda sq: ORTHOGONAL_RAYS[sq],
+    'q': lambda sq: ORTHOGONAL_RAYS[sq] + DIAGONAL_RAYS[sq],
+}
+
+
+def _build_square_scores():
+    """Material plus table bonus for every piece and square, signed for White."""
+    scores = {}
+    for kind, table in PIECE_SQUARE_TABLES.items():
+        value = PIECE_VALUES[kind]
+        scores[kind.upper()] = [value + table[sq] for sq in range(64)]
+        scores[kind] = [-(value + table[(7 - sq // 8) * 8 + sq % 8]) for sq in range(64)]
+    return scores
+
+
+SQUARE_SCORES = _build_square_scores()
+
+
+def mobility(cells, sq, piece):
+    """Number of squares a knight or slider on ``sq`` can move to, ignoring pins."""
+    is_white = piece.isupper()
+    count = 0
+    kind = piece.lower()
+    if kind == 'n':
+        for target_sq in KNIGHT_SQUARES[sq]:
+            target = cells[target_sq]
+            if target == '.' or target.isupper() != is_white:
+                count += 1
+        return count
+    for ray in SLIDER_RAYS[kind](sq):
+        for target_sq in ray:
+            target = cells[target_sq]
+            if target == '.':
+                count += 1
+                continue
+            if target.isupper() != is_white:
+                count += 1
+            break
+    return count
+
+
+def evaluate_cells(cells, pieces=None):
+    """Score a flat list of 64 pieces ('.' for empty) from White's point of view.
+
+    ``pieces`` lists the (square, piece) pairs to score, when the caller
+    already has them; by default every non-empty cell is found.
+    """
+    if pieces is None:
+        pieces = [(sq, piece) for sq, piece in enumerate(cells) if piece != '.']
+    score = 0
+    for sq, piece in pieces:
+        score += SQUARE_SCORES[piece][sq]
+        kind = piece.lower()
+        if kind in MOBILITY_WEIGHTS:
+            bonus = MOBILITY_WEIGHTS[kind] * mobility(cells, sq, piece)
+            score += bonus if piece.isupper() else -bonus
+        elif kind == 'k':
+            pawn = 'P' if piece == 'K' else 'p'
+            shield = sum(1 for target_sq in PAWN_SHIELD_SQUARES[piece][sq] if cells[target_sq] == pawn)
+            score += PAWN_SHIELD_BONUS * shield if piece == 'K' else -PAWN_SHIELD_BONUS * shield
+    return score
+
+
+def evaluate(board):
+    """Score the position in centipawns from the side to move's point of view."""
+    get_piece = board.get_piece
+    cells = [get_piece(row, col) for row in range(8) for col in range(8)]
+    score = evaluate_cells(cells, board.pieces('white') + board.pieces('black'))
+    return score if board.turn == 'white' else -score
@@ -0,0 +1,71 @@
+"""Position history of a game, for repetition detection and takeback.
+
+``PositionHistory`` records the Zobrist key of every position from the
+start of the game, one per ply. A capture or pawn move can never be undone
+on the board, so no position before it can occur again; the history is cut
+into stretches at those moves, and only the last stretch is looked at.
+The current stretch keeps a count per key, so:
+
+- ``push`` (after make_move) is O(1), and so is ``pop`` (after undo_move)
+  unless it takes back the move that began the stretch, when the counts of
+  the previous stretch are rebuilt from its keys;
+- ``repetitions`` is a dict lookup, cheap enough for every search node;
+- ``reversible_keys`` is all a worker needs to carry on the same game.
+
+Earlier stretches cost only their keys and one index each.
+"""
+from array import array
+
+
+class PositionHistory:
+    __slots__ = ('keys', 'starts', 'counts')
+
+    def __init__(self, key, reversible_keys=()):
+        """Start a history at a position, optionally preceded by keys of the same stretch."""
+        self.keys = array('Q', reversible_keys)
+        self.keys.append(key)
+        self.starts = array('I', [0])  # Index in keys of the first position of each stretch
+        self.counts = {}  # Key -> occurrences within the current stretch
+        self._count_stretch()
+
+    def __len__(self):
+        return len(self.keys)
+
+    def _count_stretch(self):
+        counts = self.counts = {}
+        for known in self.keys[self.starts[-1]:]:
+            counts[known] = counts.get(known, 0) + 1
+
+    def push(self, key, irreversible):
+        """Record the position after a move; ``irreversible`` for captures and pawn moves."""
+        if irreversible:
+            self.starts.append(len(self.keys))
+            self.counts = {key: 1}
+        else:
+            counts = self.counts
+            counts[key] = counts.get(key, 0) + 1
+        self.keys.append(key)
+
+    def pop(self):
+        """Forget the position after the last move, when it is taken back."""
+        key = self.keys.pop()
+        if self.starts[-1] == len(self.keys) and len(self.starts) > 1:
+            self.starts.pop()
+            self._count_stretch()
+            return
+        counts = self.counts
+        if counts[key] == 1:
+            del counts[key]
+        else:
+            counts[key] -= 1
+
+    def repetitions(self):
+        """How many times the current position has occurred, counting this time."""
+        return self.counts[self.keys[-1]]
+
+    def is_threefold_repetition(self):
+        return self.repetitions() >= 3
+
+    def reversible_keys(self):
+        """Keys since the last capture or pawn move, excluding the current position."""
+        return self.keys[self.starts[-1]:-1]
@@ -0,0 +1,137 @@
+"""Load generator for server.py: plays many concurrent random games and reports throughput.
+
+Each simulated game opens two connections, one per side, and both play
+random legal moves from the move lists the server sends. The latency of a
+move is the time from sending it to receiving the server's "moved" reply.
+
+    python loadgen.py --games 1000 --duration 30
+    python loadgen.py --unix /tmp/chess.sock --games 200 --plies 80
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+
+
+class Connection:
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.events = asyncio.Queue()
+        self.reader_task = asyncio.get_running_loop().create_task(self.read_events())
+
+    @classmethod
+    async def open(cls, host, port, unix_path):
+        if unix_path:
+            reader, writer = await asyncio.open_unix_connection(unix_path, limit=1 << 20)
+        else:
+            reader, writer = await asyncio.open_connection(host, port, limit=1 << 20)
+        return cls(reader, writer)
+
+    async def read_events(self):
+        while True:
+            line = await self.reader.readline()
+            if not line:
+                await self.events.put({'event': 'closed'})
+                return
+            await self.events.put(json.loads(line))
+
+    async def send(self, request):
+        self.writer.write(json.dumps(request).encode() + b'\n')
+        await self.writer.drain()
+
+    async def expect(self, *events):
+        """Wait for the next event of one of the given kinds, skipping others."""
+        while True:
+            event = await self.events.get()
+            if event['event'] in events or event['event'] in ('closed', 'error'):
+                return event
+
+    async def close(self):
+        self.reader_task.cancel()
+        self.writer.close()
+
+
+class LoadGenerator:
+    def __init__(self, host='127.0.0.1', port=8765, unix_path=None, max_plies=60, seed=None):
+        self.host = host
+        self.port = port
+        self.unix_path = unix_path
+        self.max_plies = max_plies
+        self.rng = random.Random(seed)
+        self.latencies = []
+        self.games = 0
+        self.errors = 0
+
+    async def play_game(self):
+        white = await Connection.open(self.host, self.port, self.unix_path)
+        black = await Connection.open(self.host, self.port, self.unix_path)
+        players = {'white': white, 'black': black}
+        try:
+            await white.send({'op': 'new', 'colour': 'white'})
+            created = await white.expect('created')
+            game_id = created['game']
+            await black.send({'op': 'join', 'game': game_id})
+            state = await white.expect('started')
+            await black.expect('started')
+            for ply in range(self.max_plies):
+                if state['state'] is not None or not state['moves']:
+                    break
+                mover = players[state['turn']]
+                other = players['black' if state['turn'] == 'white' else 'white']
+                start = time.perf_counter()
+                await mover.send({'op': 'move', 'game': game_id, 'move': self.rng.choice(state['moves']), 'id': ply})
+                reply = await mover.expect('moved', 'ended')
+                self.latencies.append(time.perf_counter() - start)
+                if reply['event'] != 'moved':
+                    self.errors += reply['event'] == 'error'
+                    return
+                await other.expect('moved')
+                state = reply
+            else:
+                await white.send({'op': 'resign', 'game': game_id})
+            self.games += 1
+        finally:
+            await white.close()
+            await black.close()
+
+    async def run_worker(self, deadline):
+        while time.perf_counter() < deadline:
+            await self.play_game()
+
+    async def run(self, concurrent_games, duration):
+        start = time.perf_counter()
+        await asyncio.gather(*(self.run_worker(start + duration) for _ in range(concurrent_games)))
+        return time.perf_counter() - start
+
+    def report(self, elapsed):
+        latencies = sorted(self.latencies)
+        count = len(latencies)
+        if not count:
+            print("No moves played")
+            return
+        print(f"{self.games} games, {count} moves in {elapsed:.1f}s ({count / elapsed:,.0f} moves/s), "
+              f"{self.errors} errors")
+        print(f"latency p50 {latencies[count // 2] * 1000:.2f} ms  p99 {latencies[int(count * 0.99)] * 1000:.2f} ms  "
+              f"max {latencies[-1] * 1000:.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--unix', help="connect to this Unix socket path instead of TCP")
+    parser.add_argument('--games', type=int, default=100, help="games played at the same time")
+    parser.add_argument('--duration', type=float, default=10, help="seconds to keep starting games")
+    parser.add_argument('--plies', type=int, default=60, help="plies before a game is resigned")
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+
+    generator = LoadGenerator(args.host, args.port, args.unix, args.plies, args.seed)
+    elapsed = asyncio.run(generator.run(args.games, args.duration))
+    generator.report(elapsed)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+"""Legal moves of recently seen positions, keyed by Zobrist key.
+
+A position's legal moves are generated once, grouped by origin square, and
+kept in an LRU cache. Game-end detection (``Board.check_game_state``) and
+the UI's click handling both read from it, so selecting a piece, selecting
+it again or coming back to a position after a takeback costs a dict lookup
+instead of move generation. The key covers the pieces, castling rights, en
+passant file and side to move, which is everything the legal moves depend
+on.
+"""
+from collections import OrderedDict
+
+import profiling
+
+
+class LegalMoveCache:
+    def __init__(self, max_positions=1024):
+        self.max_positions = max_positions
+        self.entries = OrderedDict()  # Key -> {(row, col): [legal moves from that square]}, oldest first
+        self.hits = 0
+        self.misses = 0
+
+    def moves_by_square(self, board, move_generator):
+        """Legal moves of the side to move grouped by origin square; shared, so not to be modified."""
+        key = board.zobrist_key
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry
+        self.misses += 1
+        entry = {}
+        for move in move_generator.generate_legal_moves(board.turn):
+            entry.setdefault(move[:2], []).append(move)
+        self.entries[key] = entry
+        if len(self.entries) > self.max_positions:
+            self.entries.popitem(last=False)
+        return entry
+
+    def piece_moves(self, board, move_generator, row, col):
+        """Legal moves of the piece on (row, col), empty unless it belongs to the side to move."""
+        return self.moves_by_square(board, move_generator).get((row, col), [])
+
+    def has_moves(self, board, move_generator):
+        return bool(self.moves_by_square(board, move_generator))
+
+    def clear(self):
+        self.entries.clear()
+
+
+profiling.register(LegalMoveCache, 'moves_by_square')
@@ -1,20 +1,68 @@
+import profiling
+
+QUEEN_DIRECTIONS = ((1, 0), (-1, 0), (0, 1), (0, -1), (1, 1), (-1, -1), (1, -1), (-1, 1))
+KNIGHT_OFFSETS = ((2, 1), (2, -1), (-2, 1), (-2, -1), (1, 2), (1, -2), (-1, 2), (-1, -2))
+
+
+def _build_steps(offsets):
+    """Per square (row * 8 + col), the (row, col) squares one offset away that are on the board."""
+    return [tuple((row + dr, col + dc) for dr, dc in offsets if 0 <= row + dr < 8 and 0 <= col + dc < 8)
+            for row in range(8) for col in range(8)]
+
+
+def _build_rays():
+    """Per square, one ray of (row, col) squares per QUEEN_DIRECTIONS entry, nearest first, to the edge."""
+    rays = []
+    for row in range(8):
+        for col in range(8):
+            square_rays = []
+            for dr, dc in QUEEN_DIRECTIONS:
+                ray = []
+                r, c = row + dr, col + dc
+                while 0 <= r < 8 and 0 <= c < 8:
+                    ray.append((r, c))
+                    r += dr
+                    c += dc
+                square_rays.append(tuple(ray))
+            rays.append(tuple(square_rays))
+    return rays
+
+
+# Attack tables indexed by row * 8 + col, built once instead of offset by offset on every call
+KNIGHT_ATTACKS = _build_steps(KNIGHT_OFFSETS)
+KING_ATTACKS = _build_steps(QUEEN_DIRECTIONS)
+PAWN_ATTACKS = {'P': _build_steps(((-1, -1), (-1, 1))), 'p': _build_steps(((1, -1), (1, 1)))}
+RAYS = _build_rays()  # The first four rays of a square are straight lines, the last four diagonals
+
+
 class MoveGenerator:
+    __slots__ = ('board', 'en_pass_to_square', 'en_pass_from_squares', 'en_pass_possible')
+
     def __init__(self, board):
         self.board = board
 
         self.en_pass_to_square = ()
         self.en_pass_from_squares = []
         self.en_pass_possible = False
+        self.sync_en_passant()
+
+    def sync_en_passant(self):
+        """Set up en passant captures from the board's en passant square, e.g. after loading a FEN."""
+        self.clear_en_pass()
+        if self.board.en_passant is not None:
+            row, col = self.board.en_passant
+            # The pawn that just moved two squares stands one row beyond the target square
+            if self.board.turn == 'white':
+                self.generate_en_pass_moves(row + 1, col, 'p')
+            else:
+                self.generate_en_pass_moves(row - 1, col, 'P')
 
     def moves_present(self, ct):
-        temp_is_lower = ct == 'black'  # Check color once instead of repeatedly.
-        for i in range(8):
-            for j in range(8):
-                piece = self.board.get_piece(i, j)
-                if piece!='.' and piece.islower() == temp_is_lower:  # Match piece with current turn.
-                    piece_moves = self.generate_piece_moves(i, j, piece)
-                    if any(self.filter_moves(piece_moves, ct)):  # Stop if valid move exists.
-                        return True
+        context = self.compute_legal_context(ct)  # Checks and pins are shared by every piece.
+        for sq, piece in self.board.pieces(ct):  # The side's own pieces, not all 64 squares
+            piece_moves = self.generate_piece_moves(sq >> 3, sq & 7, piece)
+            if any(self.filter_moves(piece_moves, ct, context)):  # Stop if valid move exists.
+                return True
         return False
 
 
@@ -92,150 +140,274 @@ class MoveGenerator:
 
     def generate_rook_moves(self, row, col, piece):
         """Generate moves for a rook."""
-        return self.generate_linear_moves(row, col, piece, [(1, 0), (-1, 0), (0, 1), (0, -1)])
+        return self.generate_linear_moves(row, col, piece, RAYS[row * 8 + col][:4])
 
     def generate_knight_moves(self, row, col, piece):
         """Generate moves for a knight."""
-        knight_moves = [
-            (2, 1), (2, -1), (-2, 1), (-2, -1),
-            (1, 2), (1, -2), (-1, 2), (-1, -2)
-        ]
+        get_piece = self.board.get_piece
+        is_lower = piece.islower()
         moves = []
-        for dr, dc in knight_moves:
-            r, c = row + dr, col + dc
-            if 0 <= r < 8 and 0 <= c < 8 and (self.board.get_piece(r, c) == '.' or self.board.get_piece(r, c).islower() != piece.islower()):
+        for r, c in KNIGHT_ATTACKS[row * 8 + col]:
+            target = get_piece(r, c)
+            if target == '.' or target.islower() != is_lower:
                 moves.append((row, col, r, c))
         return moves
 
     def generate_bishop_moves(self, row, col, piece):
         """Generate moves for a bishop."""
-        return self.generate_linear_moves(row, col, piece, [(1, 1), (-1, -1), (1, -1), (-1, 1)])
+        return self.generate_linear_moves(row, col, piece, RAYS[row * 8 + col][4:])
 
     def generate_queen_moves(self, row, col, piece):
         """Generate moves for a queen."""
-        return self.generate_linear_moves(row, col, piece, [(1, 0), (-1, 0), (0, 1), (0, -1), (1, 1), (-1, -1), (1, -1), (-1, 1)])
+        return self.generate_linear_moves(row, col, piece, RAYS[row * 8 + col])
 
     def generate_king_moves(self, row, col, piece):
         """Generate moves for a king."""
-        king_moves = [
-            (1, 0), (-1, 0), (0, 1), (0, -1),
-            (1, 1), (-1, -1), (1, -1), (-1, 1)
-        ]
+        get_piece = self.board.get_piece
+        is_lower = piece.islower()
         moves = []
-        for dr, dc in king_moves:
-            r, c = row + dr, col + dc
-            if 0 <= r < 8 and 0 <= c < 8 and (self.board.get_piece(r, c) == '.' or self.board.get_piece(r, c).islower() != piece.islower()):
+        for r, c in KING_ATTACKS[row * 8 + col]:
+            target = get_piece(r, c)
+            if target == '.' or target.islower() != is_lower:
                 moves.append((row, col, r, c))
         
-        # Generate casteling Moves
+        # Generate casteling Moves; whether the king passes through check is left to filter_moves
         if piece.islower() != True:
             king_moved = self.board.white_king_has_moved
             rook1_moved = self.board.white_rook1_has_moved
             rook2_moved = self.board.white_rook2_has_moved
+            rook = 'R'
         else: 
             king_moved = self.board.black_king_has_moved
             rook1_moved = self.board.black_rook1_has_moved
             rook2_moved = self.board.black_rook2_has_moved
-        
-        ct = 'white' if piece.lower() != True else 'black'
-        if not king_moved and (not self.is_check(ct)):
+            rook = 'r'
+
+        if not king_moved:
+            get_piece = self.board.get_piece
             # long casteling move:
-            if (not rook1_moved) and ((row, col, row, 3) in moves) and  self.board.get_piece(row, 2)=='.':
+            if (not rook1_moved) and get_piece(row, 0) == rook and get_piece(row, 1) == get_piece(row, 2) == get_piece(row, 3) == '.':
                 moves.append((row, col, row, 2))
             
             # short casteling move
-            if (not rook2_moved) and ((row, col, row, 5) in moves) and  self.board.get_piece(row, 6)=='.':
+            if (not rook2_moved) and get_piece(row, 7) == rook and get_piece(row, 5) == get_piece(row, 6) == '.':
                 moves.append((row, col, row, 6))
         return moves
 
-    def generate_linear_moves(self, row, col, piece, directions):
-        """Generate linear moves for rooks, bishops, and queens."""
+    def generate_linear_moves(self, row, col, piece, rays):
+        """Generate linear moves for rooks, bishops, and queens along precomputed rays."""
+        get_piece = self.board.get_piece
+        is_lower = piece.islower()
         moves = []
-        for dr, dc in directions:
-            r, c = row + dr, col + dc
-            while 0 <= r < 8 and 0 <= c < 8:
-                target = self.board.get_piece(r, c)
+        for ray in rays:
+            for r, c in ray:
+                target = get_piece(r, c)
                 if target == '.':
                     moves.append((row, col, r, c))
-                elif target.islower() != piece.islower():
-                    moves.append((row, col, r, c))
-                    break  # Stop after capturing
-                elif piece.lower() == 'k':
-                    moves.append((row, col, r, c))
-                else:
-                    break  # Blocked by same-color piece
-                r += dr
-                c += dc  # Move in the same direction
+                    continue
+                if target.islower() != is_lower:
+                    moves.append((row, col, r, c))  # Stop after capturing
+                break  # Blocked
         return moves
-    
-    def generate_king_radar(self, ct):
-        """Generates radar of the king"""
-        king_all_moves = []
-        row, col, king = self.board.black_king if ct == 'black' else self.board.white_king
-        rowx, colx, kingx = self.board.white_king if ct == 'black' else self.board.black_king
-
-        king_all_moves += self.generate_queen_moves(row, col, king)
-        king_all_moves += self.generate_knight_moves(row, col, king)
-        if (row, col, rowx, colx) in king_all_moves:
-            king_all_moves.remove((row, col, rowx, colx))
-        return king_all_moves
-
-    def filter_moves(self, moves, ct):
-        """Check for Possible Checks"""
-        i = 0
-        while(i<len(moves)):
-            move = moves[i]
-            # Store en pass state and king state and rook state
-            en_pass_to_square = self.en_pass_to_square
-            en_pass_from_squares = self.en_pass_from_squares
-            en_pass_possible = self.en_pass_possible
-            white_king_has_moved = self.board.white_king_has_moved 
-            black_king_has_moved = self.board.black_king_has_moved
-            white_rook1_has_moved = self.board.white_rook1_has_moved 
-            black_rook1_has_moved = self.board.black_rook1_has_moved
-            white_rook2_has_moved = self.board.white_rook2_has_moved
-            black_rook2_has_moved = self.board.black_rook2_has_moved
-            ply_count = self.board.ply_count
-
-            # simulate move
-            captured_piece = self.board.make_move(move, self)
-
-            # check for the validity
-            if(self.is_check(ct)):
-                if self.board.get_piece(move[2], move[3]).lower() == 'k' and move in [(0, 4, 0, 5), (0, 4, 0, 3), (7, 4, 7, 5), (7, 4, 7, 3)]:
-                    temp = (move[0], move[1], move[0], move[3] + (move[3] - move[1]))
-                    if temp in moves:
-                        moves.remove(temp)
-                moves.pop(i)
+
+    def compute_legal_context(self, ct):
+        """Find the checkers, pinned pieces and opponent-attacked squares of the side to move.
+
+        Computed once per position and shared by every call to ``is_legal``.
+        """
+        get_piece = self.board.get_piece
+        is_lower = ct == 'black'
+        king_row, king_col, king = self.board.black_king if is_lower else self.board.white_king
+        checkers = []
+        check_mask = None
+        pins = {}
+
+        # Walk the eight rays from the king: an enemy slider is a checker if nothing
+        # stands in between, and pins our piece if exactly one of ours does.
+        king_sq = king_row * 8 + king_col
+        for index, ray in enumerate(RAYS[king_sq]):
+            slider = 'r' if index < 4 else 'b'
+            pinned = None
+            for length, (r, c) in enumerate(ray, 1):
+                target = get_piece(r, c)
+                if target != '.':
+                    if target.islower() == is_lower:
+                        if pinned:
+                            break
+                        pinned = (r, c)
+                    else:
+                        if target.lower() in ('q', slider):
+                            if pinned:
+                                pins[pinned] = set(ray[:length])
+                            else:
+                                checkers.append((r, c))
+                                check_mask = set(ray[:length])
+                        break
+
+        # Knight and pawn checks
+        enemy_knight = 'N' if is_lower else 'n'
+        for r, c in KNIGHT_ATTACKS[king_sq]:
+            if get_piece(r, c) == enemy_knight:
+                checkers.append((r, c))
+                check_mask = {(r, c)}
+        enemy_pawn = 'P' if is_lower else 'p'
+        for r, c in PAWN_ATTACKS['p' if is_lower else 'P'][king_sq]:  # Where a pawn of the king's colour would capture
+            if get_piece(r, c) == enemy_pawn:
+                checkers.append((r, c))
+                check_mask = {(r, c)}
+
+        if len(checkers) > 1:
+            check_mask = set()  # Double check: only king moves can help
+
+        return {
+            'king': (king_row, king_col),
+            'checkers': checkers,
+            'check_mask': check_mask,
+            'pins': pins,
+            'attacked': self.attacked_squares(not is_lower, (king_row, king_col)),
+        }
+
+    def attacked_squares(self, by_lower, ignore=None):
+        """Return the set of squares attacked by one colour.
+
+        ``ignore`` is treated as empty, so the defending king cannot hide
+        behind itself when stepping back along a checking ray.
+        """
+        get_piece = self.board.get_piece
+        attacked = set()
+        for sq, piece in self.board.pieces('black' if by_lower else 'white'):
+            kind = piece.lower()
+            if kind == 'p':
+                attacked.update(PAWN_ATTACKS[piece][sq])
+            elif kind == 'n':
+                attacked.update(KNIGHT_ATTACKS[sq])
+            elif kind == 'k':
+                attacked.update(KING_ATTACKS[sq])
             else:
-                i+=1
-            
-            self.board.undo_move(move, captured_piece)
-
-            #restore en pass state and king state and rook state
-            self.en_pass_to_square = en_pass_to_square
-            self.en_pass_from_squares = en_pass_from_squares
-            self.en_pass_possible = en_pass_possible
-            self.board.white_king_has_moved = white_king_has_moved 
-            self.board.black_king_has_moved = black_king_has_moved
-            self.board.white_rook1_has_moved = white_rook1_has_moved
-            self.board.black_rook1_has_moved = black_rook1_has_moved
-            self.board.white_rook2_has_moved = white_rook2_has_moved
-            self.board.black_rook2_has_moved = black_rook2_has_moved
-            self.board.ply_count = ply_count
-            
-        return moves
+                rays = RAYS[sq]
+                if kind == 'r':
+                    rays = rays[:4]
+                elif kind == 'b':
+                    rays = rays[4:]
+                for ray in rays:
+                    for r, c in ray:
+                        attacked.add((r, c))
+                        if get_piece(r, c) != '.' and (r, c) != ignore:
+                            break
+        return attacked
 
-    def is_check(self, ct):
-        king_all_moves = self.generate_king_radar(ct)
-        for from_row, from_col, to_row, to_col in king_all_moves:
-            test_piece = self.board.get_piece(to_row, to_col)
-            king = self.board.get_piece(from_row, from_col)
-            if test_piece !='.' and test_piece.islower() != king.islower():
-                test_piece_moves = self.generate_piece_moves(to_row, to_col, test_piece)
-                for i in test_piece_moves:
-                    if (i[2], i[3]) == (from_row, from_col):
-                        """King is in direct check"""
+    def is_legal(self, move, context):
+        """Check a pseudo-legal move against the position's check and pin masks."""
+        from_row, from_col, to_row, to_col, *e = move
+        king_row, king_col = context['king']
+        attacked = context['attacked']
+
+        if (from_row, from_col) == (king_row, king_col):
+            if abs(to_col - from_col) == 2:
+                # Castling: not out of, through, or into check
+                return not context['checkers'] and (from_row, (from_col + to_col) // 2) not in attacked \
+                    and (to_row, to_col) not in attacked
+            return (to_row, to_col) not in attacked
+
+        check_mask = context['check_mask']
+        piece = self.board.get_piece(from_row, from_col)
+        en_pass = piece.lower() == 'p' and from_col != to_col and self.board.get_piece(to_row, to_col) == '.'
+        if check_mask is not None and (to_row, to_col) not in check_mask:
+            # En passant can also resolve a check by removing the checking pawn
+            if not (en_pass and (from_row, to_col) in check_mask):
+                return False
+
+        pin = context['pins'].get((from_row, from_col))
+        if pin is not None and (to_row, to_col) not in pin:
+            return False
+
+        if en_pass:
+            return not self.en_pass_exposes_king(move, context)
+        return True
+
+    def en_pass_exposes_king(self, move, context):
+        """En passant lifts two pawns off the board at once, so test the rays directly."""
+        from_row, from_col, to_row, to_col, *e = move
+        board = self.board
+        piece = board.get_piece(from_row, from_col)
+        captured = board.get_piece(from_row, to_col)
+        board.set_piece(from_row, from_col, '.')
+        board.set_piece(from_row, to_col, '.')
+        board.set_piece(to_row, to_col, piece)
+        exposed = self.is_attacked_by_slider(context['king'], piece.islower())
+        board.set_piece(to_row, to_col, '.')
+        board.set_piece(from_row, to_col, captured)
+        board.set_piece(from_row, from_col, piece)
+        return exposed
+
+    def is_attacked_by_slider(self, square, is_lower):
+        """Check whether an enemy rook, bishop or queen sees ``square``."""
+        get_piece = self.board.get_piece
+        row, col = square
+        for index, ray in enumerate(RAYS[row * 8 + col]):
+            slider = 'r' if index < 4 else 'b'
+            for r, c in ray:
+                target = get_piece(r, c)
+                if target != '.':
+                    if target.islower() != is_lower and target.lower() in ('q', slider):
                         return True
+                    break
+        return False
+
+    def is_square_attacked(self, square, by_colour):
+        """Check whether a piece of ``by_colour`` attacks ``square``, a (row, col) pair.
 
+        Knight, king and pawn attackers come from the attack tables; each
+        ray is walked only as far as its first piece.
+        """
+        get_piece = self.board.get_piece
+        row, col = square
+        sq = row * 8 + col
+        if by_colour == 'white':
+            pawn, knight, bishop, rook, queen, king = 'PNBRQK'
+            pawn_squares = PAWN_ATTACKS['p'][sq]  # A white pawn attacks sq from where a black one on sq would
+        else:
+            pawn, knight, bishop, rook, queen, king = 'pnbrqk'
+            pawn_squares = PAWN_ATTACKS['P'][sq]
+        for r, c in KNIGHT_ATTACKS[sq]:
+            if get_piece(r, c) == knight:
+                return True
+        for r, c in pawn_squares:
+            if get_piece(r, c) == pawn:
+                return True
+        for r, c in KING_ATTACKS[sq]:
+            if get_piece(r, c) == king:
+                return True
+        for index, ray in enumerate(RAYS[sq]):
+            slider = rook if index < 4 else bishop
+            for r, c in ray:
+                target = get_piece(r, c)
+                if target != '.':
+                    if target == slider or target == queen:
+                        return True
+                    break
         return False
+
+    def filter_moves(self, moves, ct, context=None):
+        """Keep only the legal moves, using masks computed once for the position."""
+        if context is None:
+            context = self.compute_legal_context(ct)
+        return [move for move in moves if self.is_legal(move, context)]
+
+    def generate_legal_moves(self, ct):
+        """Generate every legal move of one side."""
+        context = self.compute_legal_context(ct)
+        moves = []
+        for sq, piece in self.board.pieces(ct):
+            moves += self.filter_moves(self.generate_piece_moves(sq >> 3, sq & 7, piece), ct, context)
+        return moves
+
+    def is_check(self, ct):
+        row, col, king = self.board.black_king if ct == 'black' else self.board.white_king
+        return self.is_square_attacked((row, col), 'white' if ct == 'black' else 'black')
+
+
+profiling.register(MoveGenerator, 'moves_present', 'generate_legal_moves', 'generate_piece_moves',
+                   'generate_pawn_moves', 'generate_rook_moves', 'generate_knight_moves', 'generate_bishop_moves',
+                   'generate_queen_moves', 'generate_king_moves', 'generate_linear_moves', 'compute_legal_context',
+                   'filter_moves', 'is_check', 'is_square_attacked')
@@ -0,0 +1,100 @@
+"""16-bit move encoding and UCI conversion.
+
+Board and generator code passes moves around as tuples
+``(from_row, from_col, to_row, to_col[, promotion])``. The 16-bit form is
+for storage: the transposition table and the compact backend's undo
+records pack moves into one integer instead:
+
+    bits 0-5    from square (row * 8 + col)
+    bits 6-11   to square
+    bits 12-15  flags
+
+The flags follow the usual layout: bit 3 marks a promotion, bit 2 a
+capture and, for promotions, bits 0-1 give the piece (knight, bishop, rook,
+queen); otherwise bits 0-1 mark a double pawn push (1) or a castle to the
+king side (2) or queen side (3), and en passant is a capture with value 1.
+The flags beyond the promotion piece need the board the move is played on;
+``encode_move`` leaves them clear when called without one.
+
+Move generation does not use this form. In CPython, filling an
+``array('H')`` costs about three times as much as building a list of tuples,
+and a list of ints over one and a half times, so the generators keep
+returning tuples.
+"""
+QUIET, DOUBLE_PUSH, KING_CASTLE, QUEEN_CASTLE = 0, 1, 2, 3
+CAPTURE = 4
+EN_PASSANT = CAPTURE | 1
+PROMOTION = 8
+PROMOTION_PIECES = 'nbrq'
+
+FILES = 'abcdefgh'
+
+
+def encode_move(move, board=None):
+    """Pack a move tuple into 16 bits; with the board the move is played on, also set the capture/special flags."""
+    from_row, from_col, to_row, to_col, *promotion = move
+    from_sq = from_row * 8 + from_col
+    to_sq = to_row * 8 + to_col
+    flags = PROMOTION | PROMOTION_PIECES.index(promotion[0].lower()) if promotion else QUIET
+    if board is not None:
+        piece = board.get_piece(from_row, from_col).lower()
+        if board.get_piece(to_row, to_col) != '.':
+            flags |= CAPTURE
+        elif piece == 'p' and from_col != to_col:
+            flags = EN_PASSANT
+        elif piece == 'p' and abs(to_row - from_row) == 2:
+            flags = DOUBLE_PUSH
+        elif piece == 'k' and abs(to_col - from_col) == 2:
+            flags = KING_CASTLE if to_col == 6 else QUEEN_CASTLE
+    return from_sq | to_sq << 6 | flags << 12
+
+
+def decode_move(code):
+    """Unpack a 16-bit move into a tuple; the promotion piece's case follows the promotion rank."""
+    from_sq, to_sq, flags = code & 63, (code >> 6) & 63, code >> 12
+    move = (from_sq >> 3, from_sq & 7, to_sq >> 3, to_sq & 7)
+    if flags & PROMOTION:
+        piece = PROMOTION_PIECES[flags & 3]
+        move += (piece.upper() if to_sq >> 3 == 0 else piece,)
+    return move
+
+
+def move_flags(code):
+    return code >> 12
+
+
+def is_capture(code):
+    return bool(code >> 12 & CAPTURE)
+
+
+def is_promotion(code):
+    return bool(code >> 12 & PROMOTION)
+
+
+def is_castle(code):
+    return code >> 12 in (KING_CASTLE, QUEEN_CASTLE)
+
+
+def move_to_uci(move):
+    """Format a move tuple or 16-bit move as UCI text, e.g. (6, 4, 4, 4) -> 'e2e4'."""
+    if isinstance(move, int):
+        move = decode_move(move)
+    from_row, from_col, to_row, to_col, *promotion = move
+    text = f"{FILES[from_col]}{8 - from_row}{FILES[to_col]}{8 - to_row}"
+    if promotion:
+        text += promotion[0].lower()
+    return text
+
+
+def uci_to_move(text):
+    """Parse UCI text such as 'e7e8q' into a move tuple; raises ValueError if it is malformed."""
+    if len(text) not in (4, 5) or text[0] not in FILES or text[2] not in FILES \
+            or text[1] not in '12345678' or text[3] not in '12345678':
+        raise ValueError(f"Invalid UCI move: {text!r}")
+    move = (8 - int(text[1]), FILES.index(text[0]), 8 - int(text[3]), FILES.index(text[2]))
+    if len(text) == 5:
+        piece = text[4].lower()
+        if piece not in PROMOTION_PIECES:
+            raise ValueError(f"Invalid UCI move: {text!r}")
+        move += (piece.upper() if move[2] == 0 else piece,)
+    return move
@@ -0,0 +1,191 @@
+"""Root-splitting parallel search over a process pool.
+
+Python threads cannot run the search on more than one core, so each worker
+is a separate process with its own ``Engine`` and transposition table. At
+every iteration the first (principal variation) root move is searched
+alone to establish a bound, then the remaining root moves are spread over
+the workers with that bound as their window ("young brothers wait").
+
+    python parallel.py --workers 4 --time 10
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import zobrist
+from engine import INFINITY, MATE_SCORE, MAX_PLY, Engine, SearchAborted, format_info
+from history import PositionHistory
+from moves import move_to_uci
+from perft import BACKENDS, START_FEN, load_fen
+
+
+def serialise_position(board, move_generator):
+    """Pack a position into a small tuple of plain values that pickles quickly."""
+    placement = ''.join(board.get_piece(row, col) for row in range(8) for col in range(8))
+    return (
+        placement, board.get_castling_flags(), board.ply_count, board.turn, board.en_passant,
+        move_generator.en_pass_to_square, tuple(move_generator.en_pass_from_squares),
+        move_generator.en_pass_possible, tuple(board.history.reversible_keys()),
+    )
+
+
+def deserialise_position(data, backend='list'):
+    """Rebuild a board and move generator from serialise_position output."""
+    (placement, flags, ply_count, turn, en_passant, en_pass_to_square, en_pass_from_squares,
+     en_pass_possible, reversible_keys) = data
+    board_cls, generator_cls = BACKENDS[backend]
+    board = board_cls()
+    board.load_placement(placement)
+    board.set_castling_flags(flags)
+    board.ply_count = ply_count
+    board.turn = turn
+    board.en_passant = en_passant
+    board.zobrist_key = zobrist.compute_key(board)
+    board.history = PositionHistory(board.zobrist_key, reversible_keys)
+
+    move_generator = generator_cls(board)
+    move_generator.en_pass_to_square = en_pass_to_square
+    move_generator.en_pass_from_squares = list(en_pass_from_squares)
+    move_generator.en_pass_possible = en_pass_possible
+    return board, move_generator
+
+
+_worker_engine = None
+_worker_backend = 'list'
+_worker_iteration = None  # Iteration of the last root move searched, to age the table once per iteration
+
+
+def _init_worker(tt_size_mb, backend):
+    global _worker_engine, _worker_backend
+    _worker_engine = Engine(tt_size_mb=tt_size_mb)
+    _worker_backend = backend
+
+
+def _search_root_move(position, move, depth, alpha, beta, pv, iteration, time_left, sent, node_limit):
+    """Search one root move in a worker.
+
+    ``time_left`` is the seconds the search had left when the task was sent
+    at ``sent`` (``time.time()``), or None without a time limit.
+    Returns (move, score, pv, nodes, hashfull); score is None if the budget ran out.
+    """
+    global _worker_iteration
+    board, move_generator = deserialise_position(position, _worker_backend)
+    engine = _worker_engine
+    engine.start_search(node_limit=node_limit, age_table=iteration != _worker_iteration)
+    _worker_iteration = iteration
+    if time_left is not None:
+        # perf_counter() is only comparable within a process; the wall clock just accounts for the queueing
+        engine.deadline = engine.start_time + time_left - max(time.time() - sent, 0.0)
+    engine.previous_pv = [None] + list(pv[1:]) if pv and pv[0] == move else []
+    board.make_move(move, move_generator)
+    try:
+        score = -engine.negamax(board, move_generator, depth - 1, -beta, -alpha, 1)
+    except SearchAborted:
+        return move, None, [], engine.nodes, engine.tt.hashfull()
+    return move, score, [move] + engine.pv_table[1], engine.nodes, engine.tt.hashfull()
+
+
+class ParallelSearch:
+    def __init__(self, workers=None, tt_size_mb=16, backend='list', info_callback=None):
+        self.workers = workers or os.cpu_count() or 1
+        self.backend = backend
+        self.info_callback = info_callback
+        self.iterations = []
+        self.iteration = 0  # Counts every iteration of every search, so workers know when a new one starts
+        self.pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                        initargs=(tt_size_mb, backend))
+
+    def close(self):
+        self.pool.shutdown(cancel_futures=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _submit(self, position, move, depth, alpha, pv, deadline, node_limit):
+        time_left = deadline - time.perf_counter() if deadline else None
+        return self.pool.submit(_search_root_move, position, move, depth, alpha, INFINITY, pv,
+                                self.iteration, time_left, time.time(), node_limit)
+
+    def search(self, board, move_generator, max_depth=64, time_limit=None, node_limit=None):
+        """Iteratively deepen, splitting the root moves over the pool; returns the best move."""
+        start = time.perf_counter()
+        deadline = start + time_limit if time_limit else None
+        position = serialise_position(board, move_generator)
+        moves = move_generator.generate_legal_moves(board.turn)
+        if not moves:
+            return None
+        self.iterations = []
+        best_move = moves[0]
+        pv = []
+        nodes = 0
+        hashfull = 0
+
+        for depth in range(1, max_depth + 1):
+            self.iteration += 1
+            # Principal variation move first, alone, to get a bound for its brothers
+            ordered = [pv[0]] + [move for move in moves if move != pv[0]] if pv else list(moves)
+            first = self._submit(position, ordered[0], depth, -INFINITY, pv, deadline, node_limit)
+            move, alpha, best_pv, searched, hashfull = first.result()
+            nodes += searched
+            if alpha is None:
+                break
+
+            futures = [self._submit(position, move, depth, alpha, pv, deadline, node_limit) for move in ordered[1:]]
+            aborted = False
+            for future in futures:
+                move, score, line, searched, worker_hashfull = future.result()
+                nodes += searched
+                hashfull = max(hashfull, worker_hashfull)
+                if score is None:
+                    aborted = True
+                elif score > alpha:
+                    alpha, best_pv = score, line
+            if aborted:
+                break
+
+            pv = best_pv
+            best_move = pv[0]
+            elapsed = time.perf_counter() - start
+            info = {
+                'depth': depth,
+                'score': alpha,
+                'nodes': nodes,
+                'time': elapsed,
+                'nps': nodes / elapsed if elapsed else 0,
+                'hashfull': hashfull,  # Fullest worker table
+                'pv': pv,
+            }
+            self.iterations.append(info)
+            if self.info_callback:
+                self.info_callback(info)
+            if abs(alpha) >= MATE_SCORE - MAX_PLY:
+                break
+            if deadline and time.perf_counter() > start + (deadline - start) / 2:
+                break
+        return best_move
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--fen', default=START_FEN)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--depth', type=int, default=64)
+    parser.add_argument('--time', type=float, default=None, help="seconds to search")
+    parser.add_argument('--backend', choices=sorted(BACKENDS), default='list')
+    args = parser.parse_args()
+    if args.time is None and args.depth == 64:
+        args.time = 10
+
+    board, move_generator = load_fen(args.fen, args.backend)
+    with ParallelSearch(args.workers, backend=args.backend,
+                        info_callback=lambda info: print(format_info(info), flush=True)) as search:
+        best_move = search.search(board, move_generator, args.depth, args.time)
+    print(f"bestmove {move_to_uci(best_move) if best_move else '(none)'}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,167 @@
+"""Perft: count the leaf nodes of the legal move tree to check and time the move generator.
+
+    python perft.py suite --depth 3
+    python perft.py perft 4
+    python perft.py divide 3 --fen "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1"
+    python perft.py suite --epd perftsuite.epd
+"""
+import argparse
+import time
+
+from board import Board
+from move_generator import MoveGenerator
+from moves import move_to_uci
+from bitboard import BitBoard, BitMoveGenerator
+from compact import CompactBoard
+from epd import read_epd
+
+BACKENDS = {
+    'list': (Board, MoveGenerator),
+    'bitboard': (BitBoard, BitMoveGenerator),
+    'compact': (CompactBoard, MoveGenerator),
+}
+
+START_FEN = 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1'
+
+# name: (fen, node counts for depth 1, 2, 3, ...)
+POSITIONS = {
+    'start': (START_FEN, [20, 400, 8902, 197281, 4865609]),
+    'kiwipete': ('r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1',
+                 [48, 2039, 97862, 4085603]),
+    'endgame-en-passant': ('8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1', [14, 191, 2812, 43238, 674624]),
+    'promotions': ('r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1', [6, 264, 9467, 422333]),
+    'promotion-check': ('rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8', [44, 1486, 62379, 2103487]),
+    'middlegame': ('r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10', [46, 2079, 89890]),
+    'ep-avoid-illegal-1': ('3k4/3p4/8/K1P4r/8/8/8/8 b - - 0 1', [18, 92, 1670, 10138]),
+    'ep-avoid-illegal-2': ('8/8/4k3/8/2p5/8/B2P2K1/8 w - - 0 1', [13, 102, 1266, 10276]),
+    'ep-capture-checks': ('8/8/1k6/2b5/2pP4/8/5K2/8 b - d3 0 1', [15, 126, 1928, 13931]),
+    'short-castle-check': ('5k2/8/8/8/8/8/8/4K2R w K - 0 1', [15, 66, 1198, 6399]),
+    'long-castle-check': ('3k4/8/8/8/8/8/8/R3K3 w Q - 0 1', [16, 71, 1286, 7418]),
+    'castle-rights': ('r3k2r/1b4bq/8/8/8/8/7B/R3K2R w KQkq - 0 1', [26, 1141, 27826, 1274206]),
+    'castle-prevented': ('r3k2r/8/3Q4/8/8/5q2/8/R3K2R b KQkq - 0 1', [44, 1494, 50509, 1720476]),
+    'promote-out-of-check': ('2K2r2/4P3/8/8/8/8/8/3k4 w - - 0 1', [11, 133, 1442, 19174]),
+    'discovered-check': ('8/8/1P2K3/8/2n5/1q6/8/5k2 b - - 0 1', [29, 165, 5160, 31961]),
+    'promote-give-check': ('4k3/1P6/8/8/8/8/K7/8 w - - 0 1', [9, 40, 472, 2661]),
+    'underpromote-check': ('8/P1k5/K7/8/8/8/8/8 w - - 0 1', [6, 27, 273, 1329]),
+    'self-stalemate': ('K1k5/8/P7/8/8/8/8/8 w - - 0 1', [2, 6, 13, 63]),
+    'stalemate-checkmate-1': ('8/k1P5/8/1K6/8/8/8/8 w - - 0 1', [10, 25, 268, 926]),
+    'stalemate-checkmate-2': ('8/8/2k5/5q2/5n2/8/5K2/8 b - - 0 1', [37, 183, 6559, 23527]),
+}
+
+def load_fen(fen, backend='list'):
+    """Set up a board and move generator from a FEN string."""
+    board_cls, generator_cls = BACKENDS[backend]
+    board = board_cls.from_fen(fen)
+    return board, generator_cls(board)
+
+
+def legal_moves(board, move_generator, ct):
+    """Collect the legal moves of one side."""
+    return move_generator.generate_legal_moves(ct)
+
+
+def perft(board, move_generator, depth, ct=None):
+    """Count the leaf nodes of the legal move tree ``depth`` plies deep."""
+    if ct is None:
+        ct = board.turn
+    moves = legal_moves(board, move_generator, ct)
+    if depth <= 1:
+        return len(moves) if depth == 1 else 1
+    nodes = 0
+    next_turn = 'black' if ct == 'white' else 'white'
+    for move in moves:
+        board.make_move(move, move_generator)
+        nodes += perft(board, move_generator, depth - 1, next_turn)
+        board.undo_move()
+    return nodes
+
+
+def divide(board, move_generator, depth, ct=None):
+    """Return the perft count below each root move, keyed by UCI move text."""
+    if ct is None:
+        ct = board.turn
+    next_turn = 'black' if ct == 'white' else 'white'
+    counts = {}
+    for move in legal_moves(board, move_generator, ct):
+        board.make_move(move, move_generator)
+        counts[move_to_uci(move)] = perft(board, move_generator, depth - 1, next_turn)
+        board.undo_move()
+    return counts
+
+
+def epd_positions(path):
+    """Yield (name, (fen, node counts)) from an EPD file with "D1 20; D2 400" style opcodes."""
+    for number, (fen, opcodes) in enumerate(read_epd(path), 1):
+        counts = []
+        while f'D{len(counts) + 1}' in opcodes:
+            counts.append(int(opcodes[f'D{len(counts) + 1}']))
+        if counts:
+            yield opcodes.get('id', f'line {number}'), (fen, counts)
+
+
+def run_suite(depth, backend='list', names=None, positions=None):
+    """Run every standard position (or the given (name, (fen, counts)) pairs) up to ``depth``.
+
+    Returns True if all counts match.
+    """
+    all_passed = True
+    total_nodes = 0
+    total_time = 0.0
+    for name, (fen, expected) in positions or POSITIONS.items():
+        if names and name not in names:
+            continue
+        position_depth = min(depth, len(expected))
+        board, move_generator = load_fen(fen, backend)
+        start = time.perf_counter()
+        nodes = perft(board, move_generator, position_depth)
+        elapsed = time.perf_counter() - start
+        total_nodes += nodes
+        total_time += elapsed
+        passed = nodes == expected[position_depth - 1]
+        all_passed = all_passed and passed
+        status = 'ok' if passed else f'FAIL (expected {expected[position_depth - 1]})'
+        print(f"{name:<24} depth {position_depth}  {nodes:>10} nodes  {elapsed:7.2f}s  "
+              f"{nodes / elapsed if elapsed else 0:>10,.0f} nodes/s  {status}")
+    if total_time:
+        print(f"{'total':<24}          {total_nodes:>10} nodes  {total_time:7.2f}s  "
+              f"{total_nodes / total_time:>10,.0f} nodes/s")
+    return all_passed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--backend', choices=sorted(BACKENDS), default='list')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    suite = subparsers.add_parser('suite', help="check node counts of the standard positions")
+    suite.add_argument('--depth', type=int, default=3)
+    suite.add_argument('--epd', help="read positions and D1, D2, ... node counts from an EPD file instead")
+    suite.add_argument('positions', nargs='*', help="position names (default: all)")
+
+    for command in ('perft', 'divide'):
+        sub = subparsers.add_parser(command, help=f"run {command} on one position")
+        sub.add_argument('depth', type=int)
+        sub.add_argument('--fen', default=START_FEN)
+
+    args = parser.parse_args()
+    if args.command == 'suite':
+        positions = epd_positions(args.epd) if args.epd else None
+        raise SystemExit(0 if run_suite(args.depth, args.backend, args.positions, positions) else 1)
+
+    board, move_generator = load_fen(args.fen, args.backend)
+    start = time.perf_counter()
+    if args.command == 'divide':
+        counts = divide(board, move_generator, args.depth)
+        for move, nodes in sorted(counts.items()):
+            print(f"{move}: {nodes}")
+        nodes = sum(counts.values())
+        print(f"\nMoves: {len(counts)}")
+    else:
+        nodes = perft(board, move_generator, args.depth)
+    elapsed = time.perf_counter() - start
+    print(f"Nodes: {nodes}")
+    print(f"Time: {elapsed:.2f}s ({nodes / elapsed if elapsed else 0:,.0f} nodes/s)")
+
+
+if __name__ == '__main__':
+    main()
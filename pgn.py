@@ -0,0 +1,236 @@
+"""Replay PGN archives to check that every game is legal.
+
+Games are read one at a time, handed to a process pool in chunks and
+replayed move by move: each SAN move is matched against the legal moves of
+``MoveGenerator`` and played with ``Board.make_move``. One JSON line per game
+(in archive order) records whether it was legal, its result, ply count and
+final FEN. Only a bounded number of chunks is in flight at once, so memory
+use does not grow with the archive.
+
+    python pgn.py games.pgn --output games.jsonl --workers 4
+    python pgn.py games.pgn.gz --chunk 200
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from epd import open_lines
+from perft import BACKENDS, START_FEN
+
+TAG = re.compile(r'\[\s*(\w+)\s+"((?:[^"\\]|\\.)*)"\s*\]')
+COMMENT = re.compile(r'\{[^}]*\}|;[^\n]*')
+VARIATION = re.compile(r'\([^()]*\)')
+NOISE = re.compile(r'\$\d+|\d+\.(?:\.\.)?|\be\.p\.')
+RESULTS = {'1-0', '0-1', '1/2-1/2', '*'}
+SAN = re.compile(r'([NBRQK])?([a-h])?([1-8])?x?([a-h])([1-8])(?:=?([NBRQ]))?')
+
+
+def read_games(source):
+    """Yield (headers, movetext) for every game in a PGN file path or iterable of lines."""
+    if isinstance(source, str) or hasattr(source, '__fspath__'):
+        with open_lines(source) as lines:
+            yield from read_games(lines)
+        return
+    headers = {}
+    movetext = []
+    for line in source:
+        if line.startswith('%'):
+            continue  # Escaped line
+        stripped = line.strip()
+        if stripped.startswith('['):
+            if movetext:
+                yield headers, ''.join(movetext)
+                headers, movetext = {}, []
+            match = TAG.match(stripped)
+            if match:
+                headers[match.group(1)] = match.group(2).replace('\\"', '"').replace('\\\\', '\\')
+        elif stripped:
+            movetext.append(line)
+    if headers or movetext:
+        yield headers, ''.join(movetext)
+
+
+def san_moves(movetext):
+    """Return the SAN moves of the main line, without comments, variations, NAGs or the result."""
+    text = COMMENT.sub(' ', movetext)
+    while '(' in text:
+        text, count = VARIATION.subn(' ', text)
+        if not count:
+            break  # Unbalanced parenthesis; leave the rest to fail as a bad move
+    return [token for token in NOISE.sub(' ', text).split() if token not in RESULTS]
+
+
+def san_to_move(board, san, moves):
+    """Find the move among ``moves`` (legal in ``board``) that the SAN text describes, or None."""
+    san = san.rstrip('+#!?')
+    if san.replace('0', 'O') in ('O-O', 'O-O-O'):
+        to_col = 6 if san.replace('0', 'O') == 'O-O' else 2
+        for move in moves:
+            from_row, from_col, to_row, col = move[:4]
+            if board.get_piece(from_row, from_col).lower() == 'k' and from_col == 4 and col == to_col:
+                return move
+        return None
+
+    match = SAN.fullmatch(san)
+    if match is None:
+        return None
+    kind, from_file, from_rank, to_file, to_rank, promotion = match.groups()
+    kind = (kind or 'P').lower()
+    to_row, to_col = 8 - int(to_rank), ord(to_file) - ord('a')
+    found = None
+    for move in moves:
+        if move[2] != to_row or move[3] != to_col:
+            continue
+        if board.get_piece(move[0], move[1]).lower() != kind:
+            continue
+        if from_file and move[1] != ord(from_file) - ord('a'):
+            continue
+        if from_rank and move[0] != 8 - int(from_rank):
+            continue
+        if (move[4].lower() if len(move) == 5 else None) != (promotion.lower() if promotion else None):
+            continue
+        if found is not None:
+            return None  # Ambiguous
+        found = move
+    return found
+
+
+def move_to_san(board, move_generator, move, moves):
+    """Format a legal move as SAN; ``moves`` are all legal moves of the side to move."""
+    from_row, from_col, to_row, to_col, *promotion = move
+    piece = board.get_piece(from_row, from_col).lower()
+    target = f"{'abcdefgh'[to_col]}{8 - to_row}"
+    if piece == 'k' and abs(to_col - from_col) == 2:
+        san = 'O-O' if to_col == 6 else 'O-O-O'
+    elif piece == 'p':
+        san = f"{'abcdefgh'[from_col]}x{target}" if from_col != to_col else target
+        if promotion:
+            san += '=' + promotion[0].upper()
+    else:
+        rivals = [other for other in moves if other[2:4] == (to_row, to_col) and other[:2] != (from_row, from_col)
+                  and board.get_piece(other[0], other[1]).lower() == piece]
+        prefix = ''
+        if rivals:
+            if all(other[1] != from_col for other in rivals):
+                prefix = 'abcdefgh'[from_col]
+            elif all(other[0] != from_row for other in rivals):
+                prefix = str(8 - from_row)
+            else:
+                prefix = f"{'abcdefgh'[from_col]}{8 - from_row}"
+        capture = 'x' if board.get_piece(to_row, to_col) != '.' else ''
+        san = f"{piece.upper()}{prefix}{capture}{target}"
+
+    board.make_move(move, move_generator)
+    if move_generator.is_check(board.turn):
+        san += '#' if not move_generator.generate_legal_moves(board.turn) else '+'
+    board.undo_move()
+    return san
+
+
+def replay_game(headers, movetext, backend='list'):
+    """Replay one game; return a dict describing it, with 'legal' False at the first bad move."""
+    board_cls, generator_cls = BACKENDS[backend]
+    board = board_cls.from_fen(headers.get('FEN', START_FEN))
+    move_generator = generator_cls(board)
+    record = {
+        'white': headers.get('White', '?'),
+        'black': headers.get('Black', '?'),
+        'result': headers.get('Result', '*'),
+        'legal': True,
+        'plies': 0,
+    }
+    for san in san_moves(movetext):
+        move = san_to_move(board, san, move_generator.generate_legal_moves(board.turn))
+        if move is None:
+            record['legal'] = False
+            record['error'] = f"illegal or ambiguous move {san!r} at ply {record['plies'] + 1}"
+            break
+        board.make_move(move, move_generator)
+        record['plies'] += 1
+    record['fen'] = board.to_fen()
+    record['state'] = board.check_game_state(board.turn, move_generator)
+    return record
+
+
+def replay_chunk(first_index, games, backend='list'):
+    """Replay a list of (headers, movetext) games in a worker; return their records."""
+    records = []
+    for index, (headers, movetext) in enumerate(games, first_index):
+        try:
+            record = replay_game(headers, movetext, backend)
+        except Exception as error:  # A broken FEN header, or a position the board cannot play from
+            # One bad game is recorded as illegal rather than ending the whole archive
+            record = {'legal': False, 'error': f"{type(error).__name__}: {error}"}
+        record['game'] = index
+        records.append(record)
+    return records
+
+
+def chunked(games, size):
+    """Group games into lists of ``size``, tagged with the index of their first game."""
+    chunk = []
+    first_index = 1
+    for game in games:
+        chunk.append(game)
+        if len(chunk) == size:
+            yield first_index, chunk
+            first_index += size
+            chunk = []
+    if chunk:
+        yield first_index, chunk
+
+
+def replay_archive(source, output, workers=None, chunk_size=100, backend='list'):
+    """Replay every game in ``source`` and write one JSON line per game to the ``output`` file object.
+
+    Returns (games, illegal games, seconds).
+    """
+    workers = workers or os.cpu_count() or 1
+    start = time.perf_counter()
+    games = illegal = 0
+    pending = deque()
+
+    def write(records):
+        nonlocal games, illegal
+        for record in records:
+            output.write(json.dumps(record) + '\n')
+            games += 1
+            illegal += not record['legal']
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for first_index, chunk in chunked(read_games(source), chunk_size):
+            pending.append(pool.submit(replay_chunk, first_index, chunk, backend))
+            # Keep every worker busy without reading ahead of them
+            if len(pending) >= 2 * workers:
+                write(pending.popleft().result())
+        while pending:
+            write(pending.popleft().result())
+    return games, illegal, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('pgn', help="PGN file, optionally .gz, .bz2 or .xz compressed")
+    parser.add_argument('--output', help="JSONL file to write (default: standard output)")
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--chunk', type=int, default=100, help="games per task sent to a worker")
+    parser.add_argument('--backend', choices=sorted(BACKENDS), default='list')
+    args = parser.parse_args()
+
+    output = open(args.output, 'w') if args.output else sys.stdout
+    try:
+        games, illegal, elapsed = replay_archive(args.pgn, output, args.workers, args.chunk, args.backend)
+    finally:
+        if args.output:
+            output.close()
+    print(f"{games} games ({illegal} illegal) in {elapsed:.2f}s ({games / elapsed if elapsed else 0:,.1f} games/s)",
+          file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
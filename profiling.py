@@ -0,0 +1,172 @@
+"""Opt-in call counters and timings for the board, move generator and engine.
+
+Modules register their hot methods with ``register``. While profiling is
+off nothing is wrapped, so the methods run exactly as written; turning it
+on replaces each registered method on its class with a wrapper that counts
+calls and accumulates wall time, both in total and excluding the other
+registered methods it calls. Nested calls are also recorded as stacks, so
+the results can be drawn as a flame graph.
+
+Switch it on for a whole run with an environment variable naming the output
+file (JSON for a .json name, collapsed stacks otherwise):
+
+    CHESS_PROFILE=profile.json python perft.py perft 4
+    CHESS_PROFILE=profile.folded python chess_ui.py
+    flamegraph.pl profile.folded > profile.svg
+
+or run a script under it, or call ``enable``/``disable``/``write_json`` from
+code:
+
+    python profiling.py --json profile.json perft.py suite
+"""
+import argparse
+import atexit
+import json
+import os
+import runpy
+import sys
+import time
+
+OUTPUT = os.environ.get('CHESS_PROFILE')
+ENABLED = False
+
+_registered = []  # (class, method name) pairs, in registration order
+_originals = {}  # (class, method name) -> method replaced by its wrapper while enabled
+_stack = []  # [stack path, time spent in registered callees] per active wrapped call
+stats = {}  # Name -> [calls, total ns, self ns]
+stacks = {}  # "outer;...;inner" path -> self ns, for collapsed-stack output
+
+
+def register(cls, *names):
+    """Make methods of a class profilable; they are wrapped at once if profiling is on."""
+    for name in names:
+        _registered.append((cls, name))
+        if ENABLED:
+            _wrap(cls, name)
+
+
+def _wrap(cls, name):
+    # A method shared by class-body assignment may already be another class's wrapper
+    method = getattr(cls.__dict__[name], '__wrapped__', cls.__dict__[name])
+    label = f"{cls.__name__}.{name}"
+    perf_counter_ns = time.perf_counter_ns
+
+    def wrapper(*args, **kwargs):
+        frame = [f"{_stack[-1][0]};{label}" if _stack else label, 0]
+        _stack.append(frame)
+        start = perf_counter_ns()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            elapsed = perf_counter_ns() - start
+            _stack.pop()
+            if _stack:
+                _stack[-1][1] += elapsed
+            own = elapsed - frame[1]
+            entry = stats.get(label)
+            if entry is None:
+                stats[label] = [1, elapsed, own]
+            else:
+                entry[0] += 1
+                entry[1] += elapsed
+                entry[2] += own
+            stacks[frame[0]] = stacks.get(frame[0], 0) + own
+
+    wrapper.__name__ = method.__name__
+    wrapper.__qualname__ = method.__qualname__
+    wrapper.__doc__ = method.__doc__
+    wrapper.__wrapped__ = method
+    _originals[(cls, name)] = method
+    setattr(cls, name, wrapper)
+
+
+def enable():
+    """Start counting: wrap every registered method."""
+    global ENABLED
+    if not ENABLED:
+        ENABLED = True
+        for cls, name in _registered:
+            _wrap(cls, name)
+
+
+def disable():
+    """Stop counting and put the original methods back; the results so far are kept."""
+    global ENABLED
+    ENABLED = False
+    for (cls, name), method in _originals.items():
+        setattr(cls, name, method)
+    _originals.clear()
+
+
+def reset():
+    stats.clear()
+    stacks.clear()
+
+
+def summary():
+    """Per method: calls, total and self time in ms, and mean time per call in µs; most self time first."""
+    rows = sorted(stats.items(), key=lambda item: item[1][2], reverse=True)
+    return {label: {'calls': calls, 'total_ms': total / 1e6, 'self_ms': own / 1e6, 'mean_us': total / calls / 1e3}
+            for label, (calls, total, own) in rows}
+
+
+def write_json(path):
+    with open(path, 'w') as output:
+        json.dump(summary(), output, indent=2)
+
+
+def write_collapsed(path):
+    """One "outer;...;inner microseconds" line per stack, the format flamegraph.pl and speedscope read."""
+    with open(path, 'w') as output:
+        for path_key, own in sorted(stacks.items()):
+            if own >= 1000:
+                output.write(f"{path_key} {own // 1000}\n")
+
+
+def write(path):
+    """JSON for a .json path, collapsed stacks otherwise."""
+    if path.endswith('.json'):
+        write_json(path)
+    else:
+        write_collapsed(path)
+
+
+def print_summary(limit=20, file=sys.stderr):
+    print(f"{'method':40} {'calls':>10} {'total ms':>10} {'self ms':>10} {'mean us':>9}", file=file)
+    for label, row in list(summary().items())[:limit]:
+        print(f"{label:40} {row['calls']:>10,} {row['total_ms']:>10.1f} {row['self_ms']:>10.1f} "
+              f"{row['mean_us']:>9.2f}", file=file)
+
+
+if OUTPUT:
+    ENABLED = True
+    atexit.register(lambda: write(OUTPUT))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a script with the board, move generator and engine profiled.")
+    parser.add_argument('--json', help="write per-method counts and times to this file")
+    parser.add_argument('--collapsed', help="write collapsed stacks for a flame graph to this file")
+    parser.add_argument('script')
+    parser.add_argument('arguments', nargs=argparse.REMAINDER)
+    args = parser.parse_args()
+
+    # The script's modules import this one as "profiling", which must not load a second copy
+    sys.modules['profiling'] = sys.modules[__name__]
+    # Wrapping happens as the script's imports register their methods
+    enable()
+    sys.argv = [args.script] + args.arguments
+    sys.path.insert(0, os.path.dirname(os.path.abspath(args.script)))
+    try:
+        runpy.run_path(args.script, run_name='__main__')
+    finally:
+        disable()
+        if args.json:
+            write_json(args.json)
+        if args.collapsed:
+            write_collapsed(args.collapsed)
+        print_summary()
+
+
+if __name__ == '__main__':
+    main()
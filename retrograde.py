@@ -0,0 +1,262 @@
+"""Build distance-to-mate tablebases by retrograde analysis.
+
+    python retrograde.py                          # KQK, KRK, KPK and KBNK into tablebases.bin
+    python retrograde.py KQK KRK --workers 2 --output small.bin
+
+Each table is solved generation by generation backwards from the mates.
+Positions are arrays indexed by the squares of the White king, the Black
+king and the White pieces (White is always the stronger side; see
+tablebase.py for the file layout). Black positions lost in n plies give the
+White positions won in n + 1 plies, those a move into any of them; Black
+positions are lost in n + 2 plies when every legal king move reaches a won
+White position. Moves follow the ``MoveGenerator`` directions, handled a
+(piece square, target square) pair at a time over the whole array with
+NumPy. Every table is built in its own process; KPK starts once KQK and KRK,
+which its promotions lead to, are done.
+
+Requires NumPy (``pip install numpy``).
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from move_generator import KNIGHT_OFFSETS, QUEEN_DIRECTIONS
+from tablebase import DEFAULT_PATH, DEPENDENCIES, ENDINGS, write_tablebases
+
+SLIDER_DIRECTIONS = {'Q': QUEEN_DIRECTIONS, 'R': QUEEN_DIRECTIONS[:4], 'B': QUEEN_DIRECTIONS[4:]}
+
+
+def _on_board(row, col):
+    return 0 <= row < 8 and 0 <= col < 8
+
+
+def piece_moves(kind, square):
+    """Yield (target, squares passed over) for a White piece on an otherwise empty board.
+
+    Pawn moves stop short of the last rank; promotions are handled apart.
+    """
+    row, col = divmod(square, 8)
+    if kind in SLIDER_DIRECTIONS:
+        for row_step, col_step in SLIDER_DIRECTIONS[kind]:
+            path = []
+            r, c = row + row_step, col + col_step
+            while _on_board(r, c):
+                yield r * 8 + c, tuple(path)
+                path.append(r * 8 + c)
+                r, c = r + row_step, c + col_step
+    elif kind in 'NK':
+        for row_step, col_step in KNIGHT_OFFSETS if kind == 'N' else QUEEN_DIRECTIONS:
+            if _on_board(row + row_step, col + col_step):
+                yield (row + row_step) * 8 + col + col_step, ()
+    elif kind == 'P' and row > 1:
+        yield square - 8, ()
+        if row == 6:
+            yield square - 16, (square - 8,)
+
+
+def piece_attacks(kind, square):
+    """Yield (target, squares passed over) for every square a White piece attacks."""
+    if kind != 'P':
+        yield from piece_moves(kind, square)
+        return
+    row, col = divmod(square, 8)
+    for col_step in (-1, 1):
+        if _on_board(row - 1, col + col_step):
+            yield square - 8 + col_step, ()
+
+
+def _index(ndim, fixed):
+    """Index selecting one square on each of the ``fixed`` axes, keeping every axis."""
+    index = [slice(None)] * ndim
+    for axis, square in fixed.items():
+        index[axis] = slice(square, square + 1)
+    return tuple(index)
+
+
+def _along(values, axis, ndim):
+    """A 64-entry vector shaped to broadcast along one axis of an ndim array."""
+    shape = [1] * ndim
+    shape[axis] = 64
+    return values.reshape(shape)
+
+
+def _clear(path, axes, ndim):
+    """True where no piece on ``axes`` stands on one of the ``path`` squares."""
+    if not path:
+        return True
+    empty = np.ones(64, dtype=bool)
+    empty[list(path)] = False
+    mask = True
+    for axis in axes:
+        mask = mask & _along(empty, axis, ndim)
+    return mask
+
+
+def _adjacent():
+    rows, cols = np.divmod(np.arange(64), 8)
+    return np.maximum(abs(rows[:, None] - rows[None, :]), abs(cols[:, None] - cols[None, :])) <= 1
+
+
+ADJACENT = _adjacent()  # Squares a king's length apart, or equal
+# Target square of a king step in each direction, 64 when it leaves the board
+KING_STEPS = [np.array([(row + row_step) * 8 + col + col_step if _on_board(row + row_step, col + col_step) else 64
+                        for row in range(8) for col in range(8)])
+              for row_step, col_step in QUEEN_DIRECTIONS]
+
+
+def _guarded(kind, axis, target, ndim):
+    """True where a White ``kind`` on ``axis`` attacks ``target``, with only the White king able to block."""
+    shape = [1] * ndim
+    shape[0] = shape[axis] = 64
+    guarded = np.zeros(shape, dtype=bool)
+    for square in range(64):
+        for attacked, path in piece_attacks(kind, square):
+            if attacked == target:
+                guarded[_index(ndim, {axis: square})] = _clear(path, [0], ndim)
+    return guarded
+
+
+def generate(name, promotions=None):
+    """Solve one ending; return (table bytes, longest mate in plies).
+
+    ``promotions`` maps each table a pawn can promote into (KQK, KRK) to
+    its bytes, for KPK.
+    """
+    pieces = ENDINGS[name]
+    ndim = 2 + len(pieces)
+    shape = (64,) * ndim
+    squares = [_along(np.arange(64), axis, ndim) for axis in range(ndim)]
+
+    # Pieces on distinct squares, kings apart, pawns off the first and last ranks
+    valid = ~ADJACENT[squares[0], squares[1]]
+    for first in range(ndim):
+        for second in range(first + 1, ndim):
+            valid = valid & (squares[first] != squares[second])
+    for axis, kind in enumerate(pieces, 2):
+        if kind == 'P':
+            valid = valid & (squares[axis] >= 8) & (squares[axis] < 56)
+    valid = np.broadcast_to(valid, shape).copy()
+
+    # Black king attacked: illegal with White to move, check with Black to move
+    attacked = np.zeros(shape, dtype=bool)
+    for axis, kind in enumerate(pieces, 2):
+        blockers = [other for other in range(ndim) if other not in (1, axis)]
+        for square in range(64):
+            for target, path in piece_attacks(kind, square):
+                attacked[_index(ndim, {axis: square, 1: target})] |= _clear(path, blockers, ndim)
+    white_legal = valid & ~attacked
+
+    # Black king takes a piece it can keep: too little material left, a draw
+    escape = np.zeros(shape, dtype=bool)
+    for axis, kind in enumerate(pieces, 2):
+        for target in range(64):
+            safe = _along(~ADJACENT[:, target], 0, ndim)
+            for other, other_kind in enumerate(pieces, 2):
+                if other != axis:
+                    safe = safe & ~_guarded(other_kind, other, target, ndim)
+            for steps in KING_STEPS:
+                for square in np.flatnonzero(steps == target):
+                    escape[_index(ndim, {1: square, axis: target})] |= safe
+    escape &= valid
+
+    def king_targets(positions, edge):
+        """positions[wk, target, ...] for each king step of Black, ``edge`` past the edge of the board."""
+        padded = np.concatenate([positions, np.full((64, 1) + shape[2:], edge)], axis=1)
+        return [np.take(padded, steps, axis=1) for steps in KING_STEPS]
+
+    # Plies to mate + 1 when won (White to move) or lost (Black to move), else 0
+    white = np.zeros(shape, dtype=np.uint8)
+    black = np.zeros(shape, dtype=np.uint8)
+
+    promoted = np.zeros(shape, dtype=np.uint8)  # Plies to mate + 1 of the best promotion
+    if promotions:
+        for table in promotions.values():
+            lost = np.frombuffer(table, dtype=np.uint8).reshape((2, 64, 64, 64))[1]
+            for square in range(8, 16):
+                reached = lost[:, :, square - 8].astype(np.int16)
+                best = promoted[:, :, square].astype(np.int16)
+                best = np.where((reached > 0) & ((best == 0) | (reached + 1 < best)), reached + 1, best)
+                promoted[:, :, square] = best
+
+    can_move = np.zeros(shape, dtype=bool)
+    for target in king_targets(white_legal, False):
+        can_move |= target
+    lost = valid & attacked & ~escape & ~can_move
+    black[lost] = 1
+    won = np.zeros(shape, dtype=bool)
+    moving = [(0, 'K')] + list(enumerate(pieces, 2))
+
+    plies = 1
+    while True:
+        # White to move: won when some move reaches a lost position
+        new = np.zeros(shape, dtype=bool)
+        for axis, kind in moving:
+            blockers = [other for other in range(ndim) if other != axis]
+            for square in range(64):
+                for target, path in piece_moves(kind, square):
+                    new[_index(ndim, {axis: square})] |= lost[_index(ndim, {axis: target})] & _clear(path, blockers,
+                                                                                                       ndim)
+        new |= promoted == plies + 1
+        new &= white_legal & ~won
+        if not new.any():
+            break
+        white[new] = plies + 1
+        won |= new
+        plies += 1
+
+        # Black to move: lost when every legal king move reaches a won position
+        new = valid & ~lost & ~escape & can_move
+        for target in king_targets(won | ~white_legal, True):
+            new &= target
+        if not new.any():
+            break
+        black[new] = plies + 1
+        lost |= new
+        plies += 1
+
+    return np.stack([white, black]).tobytes(), plies - 1
+
+
+def generate_all(names, workers=None):
+    """Build the named tables and those they depend on, one process per table; return name -> bytes."""
+    wanted = []
+    for name in names:
+        for needed in DEPENDENCIES.get(name, ()) + (name,):
+            if needed not in wanted:
+                wanted.append(needed)
+    tables = {}
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count() or 1) as pool:
+        futures = {name: pool.submit(generate, name) for name in wanted if name not in DEPENDENCIES}
+        for name in wanted:
+            if name in DEPENDENCIES:
+                promotions = {needed: futures[needed].result()[0] for needed in DEPENDENCIES[name]}
+                futures[name] = pool.submit(generate, name, promotions)
+        for name in wanted:
+            start = time.perf_counter()
+            tables[name], longest = futures[name].result()
+            print(f"{name:5} {len(tables[name]):>12,} bytes  longest mate {longest:3} plies  "
+                  f"(waited {time.perf_counter() - start:.1f}s)", flush=True)
+    return tables
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('endings', nargs='*', metavar='ENDING', help=f"any of {', '.join(ENDINGS)} (default: all)")
+    parser.add_argument('--output', default=DEFAULT_PATH)
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args()
+    unknown = set(args.endings) - set(ENDINGS)
+    if unknown:
+        parser.error(f"unknown endings: {', '.join(sorted(unknown))}")
+
+    start = time.perf_counter()
+    tables = generate_all(args.endings or list(ENDINGS), args.workers)
+    write_tablebases(args.output, tables)
+    print(f"wrote {len(tables)} tables to {args.output} in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
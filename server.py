@@ -0,0 +1,298 @@
+"""Headless game server: many games in one process over a JSON line protocol.
+
+Clients connect over TCP or a Unix socket and exchange one JSON object per
+line. Requests carry an ``op`` and may carry an ``id``, which is echoed in
+the reply so clients can match replies to requests:
+
+    {"op": "new", "colour": "white"}                 -> {"event": "created", "game": 1, ...}
+    {"op": "new", "colour": "white", "ai": true}     play against the engine
+    {"op": "join", "game": 1}                        -> "started" to both players
+    {"op": "move", "game": 1, "move": "e2e4"}        -> "moved" to both players
+    {"op": "resign", "game": 1}                      -> "ended" to both players
+
+Every "started" and "moved" event includes the FEN, the side to move, its
+legal moves in UCI and the game state from ``Board.check_game_state`` (null
+while the game goes on). Moves are checked against the legal move list
+inline; engine replies run in a process pool so the event loop never waits
+on a search. If a search fails (a worker process dies, or it returns no
+legal move) the game's clients get an "error" event and the game ends.
+A malformed request only gets its sender an "error" event. Replies to
+other clients are queued without waiting, and a client that stops reading
+is disconnected once ``MAX_WRITE_BUFFER`` bytes are waiting for it.
+Games use the memory-saving ``CompactBoard``.
+
+    python server.py --port 8765
+    python server.py --unix /tmp/chess.sock --ai-workers 4
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from compact import CompactBoard
+from engine import Engine
+from move_generator import MoveGenerator
+from moves import move_to_uci
+from parallel import deserialise_position, serialise_position
+
+COLOURS = ('white', 'black')
+MAX_WRITE_BUFFER = 1 << 20  # Bytes queued for a client that does not read before it is disconnected
+
+_worker_engine = None
+
+
+def _ai_move(position, time_limit):
+    """Search a serialised position in a pool worker; return the best move as UCI text."""
+    global _worker_engine
+    if _worker_engine is None:
+        _worker_engine = Engine()
+    board, move_generator = deserialise_position(position)
+    move = _worker_engine.search(board, move_generator, time_limit=time_limit)
+    return move_to_uci(move) if move else None
+
+
+class ProtocolError(Exception):
+    """A request the server cannot carry out; reported back to the client."""
+
+
+class Game:
+    def __init__(self, game_id, fen=None, ai_colour=None):
+        self.id = game_id
+        if fen is not None and not isinstance(fen, str):
+            raise ProtocolError("The FEN must be a string")
+        try:
+            self.board = CompactBoard.from_fen(fen) if fen else CompactBoard()
+        except ValueError as error:
+            raise ProtocolError(str(error)) from None
+        except (IndexError, KeyError) as error:
+            raise ProtocolError(f"Invalid FEN {fen}: {error!r}") from None
+        kings = [piece for colour in COLOURS for _, piece in self.board.pieces(colour) if piece in 'Kk']
+        if sorted(kings) != ['K', 'k']:
+            raise ProtocolError("Invalid FEN: each side needs exactly one king")
+        self.move_generator = MoveGenerator(self.board)
+        if self.move_generator.is_check(COLOURS[self.board.turn == 'white']):
+            raise ProtocolError("Invalid FEN: the side not to move is in check")
+        self.players = {'white': None, 'black': None}  # Colour -> client
+        self.ai_colour = ai_colour
+        self.state = None  # check_game_state result, or a resignation, once the game is over
+        self.legal_moves = {}
+        self.update_legal_moves()
+
+    def update_legal_moves(self):
+        moves = self.move_generator.generate_legal_moves(self.board.turn)
+        self.legal_moves = {move_to_uci(move): move for move in moves}
+
+    def play(self, uci):
+        move = self.legal_moves.get(uci)
+        if move is None:
+            raise ProtocolError(f"Illegal move {uci}")
+        self.board.make_move(move, self.move_generator)
+        self.update_legal_moves()
+        self.state = self.board.check_game_state(self.board.turn, self.move_generator)
+
+    def snapshot(self):
+        return {
+            'game': self.id,
+            'fen': self.board.to_fen(),
+            'turn': self.board.turn,
+            'moves': list(self.legal_moves) if self.state is None else [],
+            'state': self.state,
+        }
+
+
+class Client:
+    def __init__(self, writer):
+        self.writer = writer
+        self.games = set()
+
+    def send(self, message):
+        """Queue a message without waiting; a client that lets MAX_WRITE_BUFFER bytes pile up is dropped."""
+        if not self.writer.is_closing():
+            self.writer.write(json.dumps(message).encode() + b'\n')
+            if self.writer.transport.get_write_buffer_size() > MAX_WRITE_BUFFER:
+                # Its read loop then sees the connection end and ends its games
+                self.writer.transport.abort()
+
+
+class GameServer:
+    def __init__(self, ai_workers=None, ai_time=0.5):
+        self.games = {}
+        self.game_ids = itertools.count(1)
+        self.ai_time = ai_time
+        self.ai_workers = ai_workers
+        self.executor = ProcessPoolExecutor(max_workers=ai_workers)
+        self.ai_tasks = {}  # Game id -> task searching for the engine's move in that game
+        self.moves = 0
+
+    def close(self):
+        self.executor.shutdown(cancel_futures=True)
+
+    async def handle_client(self, reader, writer):
+        client = Client(writer)
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                request = {}
+                try:
+                    request = json.loads(line)
+                    self.dispatch(client, request)
+                except (ProtocolError, ValueError, KeyError, TypeError) as error:
+                    client.send({'event': 'error', 'id': request.get('id') if isinstance(request, dict) else None,
+                                 'message': str(error)})
+                except Exception as error:  # A bug must not cost the client its connection and games
+                    print(f"Request {request!r} failed: {error!r}", file=sys.stderr)
+                    client.send({'event': 'error', 'id': request.get('id') if isinstance(request, dict) else None,
+                                 'message': f"Internal error: {error}"})
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            for game_id in list(client.games):
+                game = self.games.get(game_id)
+                if game is not None:
+                    self.finish(game, f"{self.colour_of(game, client).title()} disconnected")
+            writer.close()
+
+    def dispatch(self, client, request):
+        op = request['op']
+        reply_id = request.get('id')
+        if op == 'new':
+            colour = request.get('colour', 'white')
+            if colour not in COLOURS:
+                raise ProtocolError(f"Unknown colour {colour}")
+            other = COLOURS[colour == 'white']
+            game = Game(next(self.game_ids), request.get('fen'), other if request.get('ai') else None)
+            self.games[game.id] = game
+            game.players[colour] = client
+            client.games.add(game.id)
+            client.send({'event': 'created', 'id': reply_id, 'colour': colour, **game.snapshot()})
+            if game.ai_colour:
+                self.start(game)
+        elif op == 'join':
+            game = self.find_game(request)
+            free = [colour for colour in COLOURS if game.players[colour] is None and colour != game.ai_colour]
+            if not free:
+                raise ProtocolError(f"Game {game.id} is full")
+            game.players[free[0]] = client
+            client.games.add(game.id)
+            client.send({'event': 'joined', 'id': reply_id, 'colour': free[0], 'game': game.id})
+            self.start(game)
+        elif op == 'move':
+            game = self.find_game(request)
+            if game.players.get(game.board.turn) is not client:
+                raise ProtocolError("Not your turn")
+            game.play(request['move'])
+            self.moves += 1
+            self.broadcast(game, {'event': 'moved', 'id': reply_id, 'move': request['move'], **game.snapshot()})
+            self.after_move(game)
+        elif op == 'resign':
+            game = self.find_game(request)
+            colour = self.colour_of(game, client)
+            self.finish(game, f"{COLOURS[colour == 'white'].title()} won by resignation")
+        else:
+            raise ProtocolError(f"Unknown op {op}")
+
+    def find_game(self, request):
+        game = self.games.get(request['game'])
+        if game is None or game.state is not None:
+            raise ProtocolError(f"No game {request['game']} in progress")
+        return game
+
+    def colour_of(self, game, client):
+        for colour in COLOURS:
+            if game.players[colour] is client:
+                return colour
+        raise ProtocolError(f"Not playing in game {game.id}")
+
+    def start(self, game):
+        self.broadcast(game, {'event': 'started', **game.snapshot()})
+        self.after_move(game)
+
+    def after_move(self, game):
+        if game.state is not None:
+            self.finish(game, game.state)
+        elif game.board.turn == game.ai_colour and game.id not in self.ai_tasks:
+            task = asyncio.get_running_loop().create_task(self.play_ai_move(game))
+            self.ai_tasks[game.id] = task
+            task.add_done_callback(lambda task: self.ai_move_done(game, task))
+
+    async def play_ai_move(self, game):
+        position = serialise_position(game.board, game.move_generator)
+        loop = asyncio.get_running_loop()
+        executor = self.executor
+        try:
+            uci = await loop.run_in_executor(executor, _ai_move, position, self.ai_time)
+        except BrokenProcessPool:
+            # A worker died; every search on this pool fails from now on, so start a new one
+            if executor is self.executor:
+                self.executor = ProcessPoolExecutor(max_workers=self.ai_workers)
+                executor.shutdown(wait=False)
+            raise
+        if game.state is not None:
+            return  # The game ended while the engine was thinking
+        if uci is None:
+            raise RuntimeError("the engine returned no move")
+        game.play(uci)
+        self.moves += 1
+        self.broadcast(game, {'event': 'moved', 'move': uci, **game.snapshot()})
+        self.after_move(game)
+
+    def ai_move_done(self, game, task):
+        if self.ai_tasks.get(game.id) is task:
+            del self.ai_tasks[game.id]
+        if task.cancelled() or task.exception() is None:
+            return
+        error = task.exception()
+        print(f"Engine move in game {game.id} failed: {error!r}", file=sys.stderr)
+        if game.state is None:
+            self.broadcast(game, {'event': 'error', 'game': game.id, 'message': f"Engine failed: {error}"})
+            self.finish(game, "Aborted: the engine failed")
+
+    def broadcast(self, game, message):
+        for client in set(game.players.values()):
+            if client is not None:
+                client.send(message)
+
+    def finish(self, game, state):
+        game.state = state
+        self.broadcast(game, {'event': 'ended', 'game': game.id, 'state': state})
+        for client in game.players.values():
+            if client is not None:
+                client.games.discard(game.id)
+        del self.games[game.id]
+
+    async def serve(self, host='127.0.0.1', port=8765, unix_path=None):
+        if unix_path:
+            server = await asyncio.start_unix_server(self.handle_client, path=unix_path)
+        else:
+            server = await asyncio.start_server(self.handle_client, host, port)
+        async with server:
+            print(f"Serving on {unix_path or f'{host}:{port}'}", flush=True)
+            await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--unix', help="listen on this Unix socket path instead of TCP")
+    parser.add_argument('--ai-workers', type=int, default=None, help="engine processes (default: one per core)")
+    parser.add_argument('--ai-time', type=float, default=0.5, help="seconds per engine move")
+    args = parser.parse_args()
+
+    server = GameServer(args.ai_workers, args.ai_time)
+    try:
+        asyncio.run(server.serve(args.host, args.port, args.unix))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""Piece sprites, scaled once per size and cached in memory and on disk.
+
+Scaling the piece PNGs with LANCZOS is the slow part of starting the UI and
+of opening the promotion dialog. ``SpriteCache`` keeps every scaled image in
+memory by (piece, size) and saves it to the cache directory with the
+source file's modification time in its name, so an edited PNG is scaled
+again and an unchanged one is only decoded. Resizable boards round their
+square size to SIZE_STEP pixels (see ``snap_size``), so dragging a window
+edge reuses a few sizes instead of resampling at every pixel.
+
+The cache lives in $CHESS_SPRITE_CACHE, or in chess-game/sprites under
+$XDG_CACHE_HOME (~/.cache by default).
+"""
+import os
+
+from PIL import Image, ImageTk
+
+PIECE_FILES = {
+    'K': 'white-king.png', 'Q': 'white-queen.png', 'R': 'white-rook.png',
+    'B': 'white-bishop.png', 'N': 'white-knight.png', 'P': 'white-pawn.png',
+    'k': 'black-king.png', 'q': 'black-queen.png', 'r': 'black-rook.png',
+    'b': 'black-bishop.png', 'n': 'black-knight.png', 'p': 'black-pawn.png',
+}
+SIZE_STEP = 10
+CACHE_DIR = os.environ.get('CHESS_SPRITE_CACHE') or os.path.join(
+    os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache'), 'chess-game', 'sprites')
+
+
+def snap_size(size):
+    """Round a size down to a multiple of SIZE_STEP so nearby sizes share sprites."""
+    return max(SIZE_STEP, size // SIZE_STEP * SIZE_STEP)
+
+
+class SpriteCache:
+    def __init__(self, image_folder='images', cache_dir=CACHE_DIR):
+        self.image_folder = image_folder
+        self.cache_dir = cache_dir
+        self.images = {}  # (piece, size) -> scaled PIL image
+        self.photos = {}  # (piece, size) -> PhotoImage, which must stay referenced while shown
+
+    def image(self, piece, size):
+        """The piece scaled to size x size pixels, or None when its PNG is missing."""
+        key = (piece, size)
+        if key in self.images:
+            return self.images[key]
+        source = os.path.join(self.image_folder, PIECE_FILES[piece])
+        try:
+            mtime = os.stat(source).st_mtime_ns
+        except FileNotFoundError:
+            print(f"Warning: Missing image for piece '{piece}' at {source}")
+            return None
+        stem = os.path.splitext(PIECE_FILES[piece])[0]
+        cached = os.path.join(self.cache_dir, f"{stem}-{size}-{mtime}.png")
+        try:
+            image = Image.open(cached)
+            image.load()
+        except OSError:  # Not cached at this size yet, or the source changed since
+            with Image.open(source) as original:
+                image = original.resize((size, size), Image.Resampling.LANCZOS)
+            self.store(image, f"{stem}-{size}-", cached)
+        self.images[key] = image
+        return image
+
+    def store(self, image, prefix, path):
+        """Save a scaled image, removing the copies scaled from older versions of its source."""
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            for name in os.listdir(self.cache_dir):
+                if name.startswith(prefix):
+                    os.remove(os.path.join(self.cache_dir, name))
+            temporary = f"{path}.{os.getpid()}.tmp"
+            image.save(temporary, format='PNG')
+            os.replace(temporary, path)
+        except OSError:
+            pass  # An unwritable cache only means scaling again next time
+
+    def photo(self, piece, size):
+        """Tk image of the piece at a size, or None when its PNG is missing; needs a Tk root."""
+        key = (piece, size)
+        if key not in self.photos:
+            image = self.image(piece, size)
+            if image is None:
+                return None
+            self.photos[key] = ImageTk.PhotoImage(image)
+        return self.photos[key]
+
+    def photos_for(self, size):
+        """Tk images of every piece whose PNG exists, by piece letter."""
+        photos = {}
+        for piece in PIECE_FILES:
+            photo = self.photo(piece, size)
+            if photo is not None:
+                photos[piece] = photo
+        return photos
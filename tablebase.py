@@ -0,0 +1,194 @@
+"""Endgame tablebase probing.
+
+The tables hold the distance to mate of every position of a lone king
+against K+Q, K+R, K+P and K+B+N (``retrograde.py`` builds them). They live
+in one file that is memory-mapped and read one byte per probe, so probing
+costs the same whatever the table size.
+
+    python tablebase.py --fen "8/8/8/4k3/8/8/8/3QK3 w - - 0 1"
+
+File layout (little-endian):
+    header   b'CHTB', number of tables (u32)
+    index    per table: name (8 bytes, NUL padded), offset (u64), length (u64)
+    tables   one byte per position, 0 for a draw (or an impossible position),
+             otherwise the number of plies to mate + 1
+
+The stronger side is White in the tables; positions where Black has the
+pieces are probed with the board mirrored. A table is indexed by
+``(((layer * 64 + strong king) * 64 + weak king) * 64 + piece) * 64 + piece``
+over squares ``row * 8 + col``, where layer 0 has the stronger side to move
+(the byte is its distance to mating) and layer 1 the weaker (the distance to
+being mated). The pieces come in the order of the table name.
+"""
+import argparse
+import mmap
+import os
+import struct
+
+import zobrist
+
+MAGIC = b'CHTB'
+HEADER = struct.Struct('<4sI')
+INDEX_ENTRY = struct.Struct('<8sQQ')
+
+# Table name -> pieces of the stronger side besides its king
+ENDINGS = {'KQK': 'Q', 'KRK': 'R', 'KPK': 'P', 'KBNK': 'BN'}
+# Tables needed to build another: a pawn promotes into KQK or KRK
+DEPENDENCIES = {'KPK': ('KQK', 'KRK')}
+PIECE_ORDER = 'QRBNP'
+
+# (right, king, king square, rook, rook square) for each castling right
+CASTLING_SQUARES = ((zobrist.WHITE_SHORT, 'K', 60, 'R', 63), (zobrist.WHITE_LONG, 'K', 60, 'R', 56),
+                    (zobrist.BLACK_SHORT, 'k', 4, 'r', 7), (zobrist.BLACK_LONG, 'k', 4, 'r', 0))
+
+DEFAULT_PATH = os.environ.get('CHESS_TABLEBASES', 'tablebases.bin')
+_default = None
+_default_opened = False
+
+
+def write_tablebases(path, tables):
+    """Write a dict of table name -> bytes in the layout above."""
+    offset = HEADER.size + INDEX_ENTRY.size * len(tables)
+    with open(path, 'wb') as output:
+        output.write(HEADER.pack(MAGIC, len(tables)))
+        for name, data in tables.items():
+            output.write(INDEX_ENTRY.pack(name.encode('ascii'), offset, len(data)))
+            offset += len(data)
+        for data in tables.values():
+            output.write(data)
+
+
+def open_default():
+    """The tablebases at DEFAULT_PATH, opened once per process; None when there is no such file."""
+    global _default, _default_opened
+    if not _default_opened:
+        _default_opened = True
+        if os.path.exists(DEFAULT_PATH):
+            _default = Tablebases(DEFAULT_PATH)
+    return _default
+
+
+def castling_possible(board):
+    """Whether a castling right is still backed by the king and rook on their home squares."""
+    rights = zobrist.castling_rights(board)
+    for right, king, king_square, rook, rook_square in CASTLING_SQUARES:
+        if rights & right and board.get_piece(*divmod(king_square, 8)) == king \
+                and board.get_piece(*divmod(rook_square, 8)) == rook:
+            return True
+    return False
+
+
+class Tablebases:
+    def __init__(self, path):
+        self.file = open(path, 'rb')
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, count = HEADER.unpack_from(self.data, 0)
+        if magic != MAGIC:
+            self.close()
+            raise ValueError(f"{path} is not a tablebase file")
+        self.tables = {}  # Name -> offset of the table in the file
+        for number in range(count):
+            name, offset, _ = INDEX_ENTRY.unpack_from(self.data, HEADER.size + number * INDEX_ENTRY.size)
+            self.tables[name.rstrip(b'\0').decode('ascii')] = offset
+
+    def close(self):
+        self.data.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def probe(self, board):
+        """Return (result, plies) for the side to move, or None when no table covers the position.
+
+        result is 1 if the side to move mates in ``plies`` plies, -1 if it is
+        mated in ``plies`` plies (0: it is checkmated) and 0 for a draw.
+        """
+        placed = board.pieces('white') + board.pieces('black')
+        if len(placed) > 4:
+            return None  # Two kings and at most two pieces
+        kings = {}
+        pieces = []
+        for square, piece in placed:
+            if piece in 'Kk':
+                kings[piece] = square
+            else:
+                pieces.append((piece, square))
+        if not pieces or len(kings) != 2:
+            return None
+        white_strong = pieces[0][0].isupper()
+        if any(piece.isupper() != white_strong for piece, _ in pieces):
+            return None
+        pieces.sort(key=lambda item: PIECE_ORDER.index(item[0].upper()))
+        name = 'K' + ''.join(piece.upper() for piece, _ in pieces) + 'K'
+        offset = self.tables.get(name)
+        if offset is None or ('R' in name and castling_possible(board)):
+            return None
+
+        strong_to_move = (board.turn == 'white') == white_strong
+        flip = 0 if white_strong else 56  # square ^ 56 mirrors the rows
+        index = 0 if strong_to_move else 1
+        for square in (kings['K'], kings['k']) if white_strong else (kings['k'], kings['K']):
+            index = index * 64 + (square ^ flip)
+        for _, square in pieces:
+            index = index * 64 + (square ^ flip)
+        value = self.data[offset + index]
+        if not value:
+            return (0, 0)
+        return (1 if strong_to_move else -1, value - 1)
+
+    def best_move(self, board, move_generator):
+        """The legal move with the best distance to mate, or None when the tables do not cover every reply."""
+        if self.probe(board) is None:
+            return None
+        best, best_score = None, None
+        for move in move_generator.generate_legal_moves(board.turn):
+            board.make_move(move, move_generator)
+            result = self.probe(board)
+            if result is None and board.has_insufficient_material():
+                result = (0, 0)
+            board.undo_move()
+            if result is None:
+                return None
+            # Mate soonest when winning, latest when losing
+            result, plies = result
+            score = -result * (256 - plies)
+            if best_score is None or score > best_score:
+                best, best_score = move, score
+        return best
+
+
+def main():
+    from moves import move_to_uci
+    from perft import BACKENDS, START_FEN, load_fen
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--fen', default=START_FEN)
+    parser.add_argument('--tablebases', default=DEFAULT_PATH)
+    parser.add_argument('--backend', choices=sorted(BACKENDS), default='list')
+    args = parser.parse_args()
+
+    board, move_generator = load_fen(args.fen, args.backend)
+    with Tablebases(args.tablebases) as tablebases:
+        result = tablebases.probe(board)
+        if result is None:
+            print("not in the tablebases")
+            return
+        outcome, plies = result
+        print({1: f"{board.turn} mates in {plies} plies", -1: f"{board.turn} is mated in {plies} plies",
+               0: "draw"}[outcome])
+        line = []
+        while outcome and len(line) < plies:
+            move = tablebases.best_move(board, move_generator)
+            if move is None:
+                break
+            line.append(move_to_uci(move))
+            board.make_move(move, move_generator)
+        print(' '.join(line))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,397 @@
+"""Self-play matches between two engine versions, with Elo and SPRT statistics.
+
+Every opening (FEN or EPD line) is played twice with colours reversed, and
+each such game pair is one task for a process pool. Both engines live in
+every worker, keep their own transposition tables and move under a clock;
+a side whose clock runs out loses, unless the opponent has only a king
+left. Games end when ``Board.check_game_state`` says so. Pairs are handed
+out a few at a time and their PGN is written as soon as they finish, so
+memory use stays the same however many games are played.
+
+The result is reported as an Elo difference of A over B with a 95% error
+bar, computed from the pair scores (pentanomial statistics). With
+``--sprt`` the match stops as soon as the sequential probability ratio
+test accepts either hypothesis: "A is ``elo0`` stronger" or "A is
+``elo1`` stronger".
+
+An engine is a module file or name that defines ``Engine``, optionally
+followed by constructor options. Only the module itself is loaded from the
+file; the modules it imports come from this tree.
+
+    python tournament.py engine.py baseline/engine.py --openings openings.epd --tc 10+0.1 --pgn match.pgn
+    python tournament.py engine.py engine.py:max_depth=3 --games 200 --tc 2+0.05
+    python tournament.py engine.py baseline/engine.py --openings openings.epd --sprt 0 5 --games 40000
+"""
+import argparse
+import importlib
+import importlib.util
+import itertools
+import math
+import os
+import sys
+import textwrap
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from epd import read_epd
+from pgn import move_to_san
+from perft import BACKENDS, START_FEN, load_fen
+
+MOVES_TO_GO = 20  # Share of the remaining time spent on each move, besides the increment
+CLOCK_MARGIN = 0.9  # Never plan to use more than this share of the remaining time on one move
+MIN_BUDGET_SHARE = 0.5  # Allowing for overruns never cuts a move's budget below this share of its plan
+
+
+def load_engine(spec, label):
+    """Return (Engine class, constructor options, name) for a "module_or_file.py[:option=value,...]" spec."""
+    path, _, option_text = spec.partition(':')
+    options = {}
+    for option in filter(None, option_text.split(',')):
+        key, _, value = option.partition('=')
+        for convert in (int, float):
+            try:
+                value = convert(value)
+                break
+            except ValueError:
+                pass
+        options[key.strip()] = value
+    if path.endswith('.py') or os.sep in path:
+        module_spec = importlib.util.spec_from_file_location(f"tournament_engine_{label}", path)
+        if module_spec is None:
+            raise ValueError(f"Cannot load an engine from {path!r}")
+        module = importlib.util.module_from_spec(module_spec)
+        module_spec.loader.exec_module(module)
+    else:
+        module = importlib.import_module(path)
+    return module.Engine, options, os.path.splitext(os.path.basename(path))[0] + (f":{option_text}" if option_text else '')
+
+
+def parse_time_control(text):
+    """"base+increment" in seconds, e.g. "10+0.1"; returns (base, increment)."""
+    base, _, increment = text.partition('+')
+    return float(base), float(increment or 0)
+
+
+def result_of(state):
+    """PGN result for a check_game_state message."""
+    if state.startswith('White won'):
+        return '1-0'
+    if state.startswith('Black won'):
+        return '0-1'
+    return '1/2-1/2'
+
+
+def play_game(fen, white, black, time_control, backend='list'):
+    """Play one game between two engines.
+
+    Returns (result, reason it ended, SAN moves, termination, depths), where
+    ``depths`` maps each colour to the depths of its completed searches
+    (book and tablebase moves have none).
+    """
+    board, move_generator = load_fen(fen, backend)
+    engines = {'white': white, 'black': black}
+    base, increment = time_control
+    clocks = {'white': base, 'black': base}
+    # The search polls its deadline every so many nodes, so it runs over; plan for the recent average overrun
+    overruns = {'white': 0.0, 'black': 0.0}
+    white.new_game()
+    black.new_game()
+    sans = []
+    depths = {'white': [], 'black': []}
+    while True:
+        state = board.check_game_state(board.turn, move_generator)
+        if state:
+            return result_of(state), state, sans, 'normal', depths
+        side = board.turn
+        moves = move_generator.generate_legal_moves(side)
+        planned = min(clocks[side] / MOVES_TO_GO + increment, clocks[side] * CLOCK_MARGIN)
+        budget = max(planned - overruns[side], planned * MIN_BUDGET_SHARE, 0.001)
+        start = time.perf_counter()
+        move = engines[side].search(board, move_generator, time_limit=budget)
+        elapsed = time.perf_counter() - start
+        iterations = getattr(engines[side], 'iterations', None)
+        if iterations:
+            depths[side].append(iterations[-1]['depth'])
+        # A single slow move (a long first iteration, a pause) fades out over the next few
+        overruns[side] = (overruns[side] + max(elapsed - budget, 0.0)) / 2
+        clocks[side] -= elapsed
+        if clocks[side] < 0:
+            opponent = 'black' if side == 'white' else 'white'
+            loser = side.capitalize()
+            if not board.material[opponent]:
+                return '1/2-1/2', f"{loser} lost on time, {opponent} cannot mate", sans, 'time forfeit', depths
+            return ('0-1' if side == 'white' else '1-0'), f"{loser} lost on time", sans, 'time forfeit', depths
+        clocks[side] += increment
+        sans.append(move_to_san(board, move_generator, move, moves))
+        board.make_move(move, move_generator)
+
+
+def format_game(headers, fen, sans, comment):
+    """Format a game as PGN text, ending in a blank line; ``headers`` must include Result."""
+    fields = fen.split()
+    number = int(fields[5])
+    white_to_move = fields[1] == 'w'
+    tokens = []
+    for san in sans:
+        if white_to_move:
+            tokens.append(f"{number}. {san}")
+        else:
+            tokens.append(san if tokens else f"{number}... {san}")
+            number += 1
+        white_to_move = not white_to_move
+    tokens.append(f"{{{comment}}} {headers['Result']}")
+    tags = ''.join(f'[{key} "{value}"]\n' for key, value in headers.items())
+    movetext = textwrap.fill(' '.join(tokens), width=79, break_long_words=False, break_on_hyphens=False)
+    return f"{tags}\n{movetext}\n\n"
+
+
+_worker_engines = None
+_worker_names = None
+_worker_time_control = None
+_worker_backend = 'list'
+
+
+def _init_worker(spec_a, spec_b, time_control, backend):
+    global _worker_engines, _worker_names, _worker_time_control, _worker_backend
+    engines, names = [], []
+    for label, spec in (('a', spec_a), ('b', spec_b)):
+        engine_cls, options, name = load_engine(spec, label)
+        engines.append(engine_cls(**options))
+        names.append(name)
+    if names[0] == names[1]:
+        names = [f"{names[0]} (A)", f"{names[1]} (B)"]
+    _worker_engines = engines
+    _worker_names = names
+    _worker_time_control = time_control
+    _worker_backend = backend
+
+
+def play_pair(round_number, fen):
+    """Play an opening with A as White, then with B as White, in a worker.
+
+    Returns (A's score in half points, 0 to 4, [(A's score, PGN text) for both games],
+    (search depths of A, search depths of B)).
+    """
+    engine_a, engine_b = _worker_engines
+    name_a, name_b = _worker_names
+    base, increment = _worker_time_control
+    games = []
+    pair_score = 0
+    depths_a, depths_b = [], []
+    for white, black, a_is_white in ((engine_a, engine_b, True), (engine_b, engine_a, False)):
+        result, comment, sans, termination, depths = play_game(fen, white, black, _worker_time_control,
+                                                               _worker_backend)
+        depths_a += depths['white' if a_is_white else 'black']
+        depths_b += depths['black' if a_is_white else 'white']
+        headers = {
+            'Event': 'Self-play match',
+            'Site': '?',
+            'Date': time.strftime('%Y.%m.%d'),
+            'Round': f"{round_number}.{len(games) + 1}",
+            'White': name_a if a_is_white else name_b,
+            'Black': name_b if a_is_white else name_a,
+            'Result': result,
+        }
+        if fen != START_FEN:
+            headers['SetUp'] = '1'
+            headers['FEN'] = fen
+        headers['TimeControl'] = f"{base:g}+{increment:g}"
+        headers['Termination'] = termination
+        score = {'1-0': 2, '0-1': 0}.get(result, 1) if a_is_white else {'1-0': 0, '0-1': 2}.get(result, 1)
+        pair_score += score
+        games.append((score, format_game(headers, fen, sans, comment)))
+    return pair_score, games, (depths_a, depths_b)
+
+
+def elo_from_score(score):
+    """Logistic Elo difference for an expected score between 0 and 1."""
+    score = min(max(score, 1e-6), 1 - 1e-6)
+    return 400 * math.log10(score / (1 - score))
+
+
+def score_from_elo(elo):
+    return 1 / (1 + 10 ** (-elo / 400))
+
+
+class MatchStats:
+    """Game and game-pair counts of engine A, with Elo estimate and SPRT log-likelihood ratio.
+
+    Pair scores (0, 1/4, ..., 1 of the two games' points) are the samples:
+    playing each opening with both colours cancels most of the opening's
+    bias, which is why the pentanomial variance is smaller than that of
+    single games.
+    """
+
+    def __init__(self):
+        self.pairs = [0] * 5  # Number of pairs by A's score in half points, 0 to 4
+        self.wins = self.draws = self.losses = 0
+        self.depths = [[0, 0], [0, 0]]  # [sum of search depths, searches] of A and of B
+
+    def add_pair(self, pair_score, game_scores, depths=((), ())):
+        self.pairs[pair_score] += 1
+        for totals, engine_depths in zip(self.depths, depths):
+            totals[0] += sum(engine_depths)
+            totals[1] += len(engine_depths)
+        for score in game_scores:
+            if score == 2:
+                self.wins += 1
+            elif score == 1:
+                self.draws += 1
+            else:
+                self.losses += 1
+
+    @property
+    def games(self):
+        return self.wins + self.draws + self.losses
+
+    def mean_depths(self):
+        """Mean search depth of A and of B, None for an engine that reported none."""
+        return tuple(total / searches if searches else None for total, searches in self.depths)
+
+    def mean_and_variance(self):
+        """Mean and variance of the pair score, as a fraction of the points available."""
+        count = sum(self.pairs)
+        mean = sum(index / 4 * pairs for index, pairs in enumerate(self.pairs)) / count
+        variance = sum((index / 4 - mean) ** 2 * pairs for index, pairs in enumerate(self.pairs)) / count
+        return mean, variance
+
+    def elo(self):
+        """(Elo difference, 95% lower bound, 95% upper bound), A over B.
+
+        The bounds are None while every pair has had the same score: a zero
+        variance says nothing about the error yet.
+        """
+        mean, variance = self.mean_and_variance()
+        if variance == 0:
+            return elo_from_score(mean), None, None
+        margin = 1.96 * math.sqrt(variance / sum(self.pairs))
+        return elo_from_score(mean), elo_from_score(mean - margin), elo_from_score(mean + margin)
+
+    def llr(self, elo0, elo1):
+        """Log-likelihood ratio of "A is elo1 stronger" against "A is elo0 stronger" (normal approximation)."""
+        mean, variance = self.mean_and_variance()
+        if variance == 0:
+            return 0.0
+        score0, score1 = score_from_elo(elo0), score_from_elo(elo1)
+        return sum(self.pairs) * (score1 - score0) * (2 * mean - score0 - score1) / (2 * variance)
+
+    def summary(self):
+        elo, lower, upper = self.elo()
+        mean, _ = self.mean_and_variance()
+        depths = '/'.join('-' if depth is None else f"{depth:.1f}" for depth in self.mean_depths())
+        interval = '[undefined]' if lower is None else f"[{lower:+.1f}, {upper:+.1f}]"
+        return (f"{self.games} games: +{self.wins} ={self.draws} -{self.losses}, score {mean:.1%}, "
+                f"Elo {elo:+.1f} {interval}, pairs {'/'.join(map(str, self.pairs))}, "
+                f"depth {depths}")
+
+
+def sprt_bounds(alpha, beta):
+    """LLR below the first bound accepts H0, above the second accepts H1."""
+    return math.log(beta / (1 - alpha)), math.log((1 - beta) / alpha)
+
+
+def openings(path):
+    """Opening FENs from an EPD/FEN file, over and over; the start position alone without a file."""
+    if path is None:
+        yield from itertools.repeat(START_FEN)
+        return
+    while True:
+        found = False
+        for fen, _ in read_epd(path):
+            found = True
+            yield fen
+        if not found:
+            raise ValueError(f"No positions in {path}")
+
+
+def run_match(spec_a, spec_b, output, openings_path=None, games=100, time_control=(10.0, 0.1), workers=None,
+              backend='list', sprt=None, report_every=50, log=sys.stderr):
+    """Play up to ``games`` games (rounded up to whole pairs) and write their PGN to the ``output`` file object.
+
+    ``sprt`` is None or (elo0, elo1, alpha, beta); the match then stops once
+    the test accepts a hypothesis. Returns (MatchStats, "H0", "H1" or None).
+    """
+    workers = workers or os.cpu_count() or 1
+    stats = MatchStats()
+    bounds = sprt_bounds(*sprt[2:]) if sprt else None
+    verdict = None
+    pending = deque()
+
+    def record(future):
+        nonlocal verdict
+        pair_score, pair_games, depths = future.result()
+        for _, text in pair_games:
+            output.write(text)
+        output.flush()
+        stats.add_pair(pair_score, [score for score, _ in pair_games], depths)
+        line = stats.summary()
+        if sprt:
+            llr = stats.llr(*sprt[:2])
+            line += f", LLR {llr:.2f} ({bounds[0]:.2f}, {bounds[1]:.2f})"
+            if verdict is None and llr <= bounds[0]:
+                verdict = 'H0'
+            elif verdict is None and llr >= bounds[1]:
+                verdict = 'H1'
+        if sum(stats.pairs) % max(report_every // 2, 1) == 0 or verdict:
+            print(line, file=log, flush=True)
+
+    pairs = itertools.islice(enumerate(openings(openings_path), 1), (games + 1) // 2)
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(spec_a, spec_b, time_control, backend)) as pool:
+        for round_number, fen in pairs:
+            pending.append(pool.submit(play_pair, round_number, fen))
+            # Keep every worker busy without queueing the whole match
+            if len(pending) >= 2 * workers:
+                record(pending.popleft())
+                if verdict:
+                    break
+        if verdict:
+            for future in pending:
+                future.cancel()
+        while pending:
+            future = pending.popleft()
+            if not future.cancelled():
+                record(future)
+    for name, depth in zip('AB', stats.mean_depths()):
+        if depth is not None and depth <= 1:
+            print(f"Warning: engine {name} averaged depth {depth:.1f}; the time control is too short for it",
+                  file=log)
+    return stats, verdict
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('engine_a', help="module or .py file defining Engine, optionally :option=value,...")
+    parser.add_argument('engine_b', help="the engine to compare against, in the same form")
+    parser.add_argument('--openings', help="EPD or FEN file of openings, each played with both colours "
+                                           "(default: the start position)")
+    parser.add_argument('--games', type=int, default=100, help="games to play at most")
+    parser.add_argument('--tc', default='10+0.1', help="time control per side: seconds+increment")
+    parser.add_argument('--workers', type=int, default=None, help="games played at once (default: one per core)")
+    parser.add_argument('--backend', choices=sorted(BACKENDS), default='list')
+    parser.add_argument('--pgn', help="PGN file to write (default: standard output)")
+    parser.add_argument('--sprt', type=float, nargs=2, metavar=('ELO0', 'ELO1'),
+                        help="stop once A is shown to be ELO0 or ELO1 stronger than B")
+    parser.add_argument('--alpha', type=float, default=0.05, help="SPRT false positive rate")
+    parser.add_argument('--beta', type=float, default=0.05, help="SPRT false negative rate")
+    parser.add_argument('--report', type=int, default=50, help="print the standings every so many games")
+    args = parser.parse_args()
+
+    sprt = (args.sprt[0], args.sprt[1], args.alpha, args.beta) if args.sprt else None
+    output = open(args.pgn, 'w') if args.pgn else sys.stdout
+    start = time.perf_counter()
+    try:
+        stats, verdict = run_match(args.engine_a, args.engine_b, output, args.openings, args.games,
+                                   parse_time_control(args.tc), args.workers, args.backend, sprt, args.report)
+    finally:
+        if args.pgn:
+            output.close()
+    elapsed = time.perf_counter() - start
+    print(f"{stats.summary()} in {elapsed:.0f}s", file=sys.stderr)
+    if sprt:
+        print(f"SPRT: {verdict + ' accepted' if verdict else 'no decision'}", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
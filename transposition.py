@@ -0,0 +1,112 @@
+"""Fixed-size transposition table keyed by 64-bit Zobrist keys.
+
+Entries live in two preallocated buffers of unsigned 64-bit words, one for
+the keys and one for the packed data, so the table never grows or
+reallocates. Each bucket holds two entries: the first is kept for the
+deepest search, the second is always overwritten.
+
+Packed data word layout (bit ranges):
+    0-15   best move (see moves.encode_move), 0 for none
+    16-47  score + 2**31
+    48-55  depth
+    56-57  bound (EXACT, LOWER or UPPER; 0 means empty)
+    58-63  search generation
+"""
+from moves import decode_move, encode_move
+
+EXACT, LOWER, UPPER = 1, 2, 3
+
+ENTRY_BYTES = 16  # 8 byte key + 8 byte data
+BUCKET_SIZE = 2
+SCORE_OFFSET = 1 << 31
+CLEAR_CHUNK = 1 << 16
+
+
+class TranspositionTable:
+    def __init__(self, size_mb=16):
+        self.size_mb = size_mb
+        self.buckets = max(1, (size_mb << 20) // (ENTRY_BYTES * BUCKET_SIZE))
+        self.entries = self.buckets * BUCKET_SIZE
+        self._key_buffer = bytearray(self.entries * 8)
+        self._data_buffer = bytearray(self.entries * 8)
+        self.keys = memoryview(self._key_buffer).cast('Q')
+        self.data = memoryview(self._data_buffer).cast('Q')
+        self.generation = 0
+        self.reset_stats()
+        self.used = 0
+
+    def reset_stats(self):
+        self.probes = 0
+        self.hits = 0
+        self.collisions = 0
+        self.stores = 0
+
+    def clear(self):
+        """Empty the table between games, reusing the same buffers."""
+        zeros = bytes(CLEAR_CHUNK)
+        for buffer in (self._key_buffer, self._data_buffer):
+            view = memoryview(buffer)
+            for start in range(0, len(buffer), CLEAR_CHUNK):
+                chunk = view[start:start + CLEAR_CHUNK]
+                chunk[:] = zeros[:len(chunk)]
+        self.generation = 0
+        self.used = 0
+        self.reset_stats()
+
+    def new_search(self):
+        """Age existing entries so they are replaced first by the next search."""
+        self.generation = (self.generation + 1) & 63
+
+    def probe(self, key):
+        """Return (depth, bound, score, move) for ``key``, or None on a miss."""
+        self.probes += 1
+        index = (key % self.buckets) * BUCKET_SIZE
+        keys = self.keys
+        for slot in (index, index + 1):
+            if keys[slot] == key:
+                word = self.data[slot]
+                if word:
+                    self.hits += 1
+                    return ((word >> 48) & 0xFF, (word >> 56) & 3,
+                            ((word >> 16) & 0xFFFFFFFF) - SCORE_OFFSET,
+                            decode_move(word & 0xFFFF) if word & 0xFFFF else None)
+        if self.data[index] or self.data[index + 1]:
+            self.collisions += 1  # The bucket holds other positions
+        return None
+
+    def store(self, key, depth, bound, score, move):
+        self.stores += 1
+        index = (key % self.buckets) * BUCKET_SIZE
+        keys = self.keys
+        data = self.data
+        word = ((encode_move(move) if move else 0) | (score + SCORE_OFFSET) << 16 | min(depth, 255) << 48
+                | bound << 56 | self.generation << 58)
+
+        if keys[index] == key or keys[index + 1] == key:
+            slot = index if keys[index] == key else index + 1
+        else:
+            # Depth-preferred slot: take it if it is empty, stale or shallower
+            old = data[index]
+            if not old or (old >> 58) != self.generation or (old >> 48) & 0xFF <= depth:
+                slot = index
+            else:
+                slot = index + 1  # Always-replace slot
+        if not data[slot]:
+            self.used += 1
+        keys[slot] = key
+        data[slot] = word
+
+    def stats(self):
+        probes = self.probes or 1
+        return {
+            'size_mb': self.size_mb,
+            'entries': self.entries,
+            'probes': self.probes,
+            'hit_rate': self.hits / probes,
+            'collision_rate': self.collisions / probes,
+            'fill': self.used / self.entries,
+        }
+
+    def hashfull(self):
+        """Fill in permille, as reported by UCI engines."""
+        return self.used * 1000 // self.entries
@@ -0,0 +1,52 @@
+"""Zobrist keys for 64-bit position hashing.
+
+Squares are numbered ``row * 8 + col`` like the rest of the code base.
+The tables are filled from a fixed seed so keys are stable between runs.
+"""
+import os
+import random
+
+_rng = random.Random(0x5EED_C0FFEE)
+
+PIECE_KEYS = {piece: [_rng.getrandbits(64) for _ in range(64)] for piece in 'PNBRQKpnbrqk'}
+# Indexed by the 4-bit castling rights value returned by castling_rights()
+CASTLING_KEYS = [_rng.getrandbits(64) for _ in range(16)]
+EN_PASSANT_KEYS = [_rng.getrandbits(64) for _ in range(8)]
+SIDE_KEY = _rng.getrandbits(64)  # XORed in when Black is to move
+
+# Set CHESS_ZOBRIST_DEBUG=1 to check every incremental update against a full recompute
+DEBUG = os.environ.get('CHESS_ZOBRIST_DEBUG') == '1'
+
+WHITE_SHORT, WHITE_LONG, BLACK_SHORT, BLACK_LONG = 1, 2, 4, 8
+
+
+def castling_rights(board):
+    """Pack the board's king/rook moved flags into 4 bits of castling rights."""
+    rights = 0
+    if not board.white_king_has_moved:
+        if not board.white_rook2_has_moved:
+            rights |= WHITE_SHORT
+        if not board.white_rook1_has_moved:
+            rights |= WHITE_LONG
+    if not board.black_king_has_moved:
+        if not board.black_rook2_has_moved:
+            rights |= BLACK_SHORT
+        if not board.black_rook1_has_moved:
+            rights |= BLACK_LONG
+    return rights
+
+
+def compute_key(board):
+    """Hash a position from scratch."""
+    key = 0
+    for row in range(8):
+        for col in range(8):
+            piece = board.get_piece(row, col)
+            if piece != '.':
+                key ^= PIECE_KEYS[piece][row * 8 + col]
+    key ^= CASTLING_KEYS[castling_rights(board)]
+    if board.en_passant is not None:
+        key ^= EN_PASSANT_KEYS[board.en_passant[1]]
+    if board.turn == 'black':
+        key ^= SIDE_KEY
+    return key